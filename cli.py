@@ -0,0 +1,286 @@
+"""Non-interactive command line for scripts, cron jobs and shell pipelines.
+
+    python3 cli.py bundles list --status co --format csv > completed.csv
+    python3 cli.py bundles send manifest.csv --workers 16 --journal send.journal
+    python3 cli.py bundles merge <template id> recipients.csv --label "NDA for {signer-1.name}"
+    python3 cli.py persons list | jq .name
+    python3 cli.py persons delete --ids-file ids.txt
+    python3 cli.py persons update desired.csv
+    python3 cli.py templates list
+
+Only argparse is imported up front. Each subcommand imports the modules it needs when it runs,
+so e.g. `templates list` never loads the bulk send or Person mirror code, and --help loads
+neither blueink nor munch.
+"""
+import argparse
+import sys
+
+
+def _client_and_policy(args, workers: int = 1):
+    """A Client retrying under one RetryPolicy (rate limited by --rate), and that policy, for
+    helpers that also take one: passing them the same policy keeps one token bucket per account.
+    """
+    from blueink import Client
+    from examples.rate_limit import TokenBucket
+    from examples.retry import RetryPolicy, use_retries
+
+    client = Client()
+    metrics = None
+    if workers > 1:
+        from examples.transport import use_pooled_transport
+        use_pooled_transport(client, pool_maxsize=workers)
+    if args.metrics:
+        from examples.instrumentation import instrument_client
+        metrics = instrument_client(client)
+    rate = getattr(args, "rate", None)
+    policy = RetryPolicy(limiter=TokenBucket(rate=rate) if rate else None, metrics=metrics)
+    use_retries(client, policy)
+    return client, policy
+
+
+def _client(args, workers: int = 1):
+    return _client_and_policy(args, workers)[0]
+
+
+class _Counted:
+    """Wraps an iterable, counting the items taken from it so far.
+    """
+    def __init__(self, items):
+        self._items = items
+        self.count = 0
+
+    def __iter__(self):
+        for item in self._items:
+            self.count += 1
+            yield item
+
+
+def _write(items, fmt: str, columns=None) -> int:
+    from examples.export import DEFAULT_BUNDLE_CSV_COLUMNS, export_csv, export_jsonl
+
+    if fmt == "csv":
+        return export_csv(items, sys.stdout, columns or DEFAULT_BUNDLE_CSV_COLUMNS)
+    return export_jsonl(items, sys.stdout)
+
+
+def _list_failed(what: str, count: int, error) -> int:
+    print(f"Listing {what} failed after {count} written, output is incomplete: {error}", file=sys.stderr)
+    return 1
+
+
+def bundles_list(args) -> int:
+    from requests import RequestException
+    from examples.export import iter_bundles
+
+    query = {"status": args.status} if args.status else {}
+    bundles = _Counted(iter_bundles(_client(args), per_page=args.per_page, window=args.window, **query))
+    try:
+        _write(bundles, args.format)
+    except RequestException as e:
+        return _list_failed("Bundles", bundles.count, e)
+    return 0
+
+
+def bundles_send(args) -> int:
+    from examples.bulk_send import BulkBundleSender, print_result, print_summary, read_manifest
+    from examples.job_journal import open_journal
+
+    client = _client(args, workers=args.workers)
+    journal = open_journal(args.journal)
+    try:
+        if args.pipeline:
+            from examples.bundle_pipeline import BundlePipeline, print_stage_stats
+            sender = BundlePipeline(client, document_workers=args.document_workers, send_workers=args.workers,
+                                    is_test=not args.live, journal=journal)
+        else:
+            sender = BulkBundleSender(client, max_workers=args.workers, is_test=not args.live, journal=journal)
+        summary = sender.send_all(read_manifest(args.manifest), on_result=print_result)
+    finally:
+        if journal:
+            journal.close()
+    print_summary(summary)
+    if args.pipeline:
+        print_stage_stats(summary.stages)
+    return 1 if summary.failed else 0
+
+
+def bundles_merge(args) -> int:
+    from examples.bulk_send import print_result, print_summary
+    from examples.job_journal import open_journal
+    from examples.template_merge import MailMergeSender, compile_template, parse_roles, read_recipients
+
+    client = _client(args, workers=args.workers)
+    compiled = compile_template(client, args.template_id, parse_roles(args.role),
+                                field_keys=args.field,
+                                defaults=dict(d.partition("=")[::2] for d in args.default),
+                                label=args.label,
+                                is_test=not args.live)
+    journal = open_journal(args.journal)
+    try:
+        summary = MailMergeSender(client, compiled, max_workers=args.workers, journal=journal).send_all(
+            read_recipients(args.recipients), on_result=print_result)
+    finally:
+        if journal:
+            journal.close()
+    print_summary(summary)
+    return 1 if summary.failed else 0
+
+
+def persons_list(args) -> int:
+    from requests import RequestException
+    from examples.pagination import PrefetchingPagedIterator, iter_items
+
+    client = _client(args)
+    pages = PrefetchingPagedIterator(client.persons.list, per_page=args.per_page, window=args.window,
+                                     raise_errors=True)
+    persons = _Counted(iter_items(pages))
+    try:
+        _write(persons, args.format, columns=("id", "name"))
+    except RequestException as e:
+        return _list_failed("Persons", persons.count, e)
+    return 0
+
+
+def persons_delete(args) -> int:
+    from examples.job_journal import open_journal
+    from examples.person_bulk import (bulk_delete_persons, print_delete_result, print_delete_summary,
+                                      select_person_ids)
+    from examples.person_mirror import PersonMirror
+
+    client, policy = _client_and_policy(args, workers=args.workers)
+    mirror = PersonMirror(client)
+
+    ids = list(args.ids)
+    if args.ids_file:
+        with open(args.ids_file) as fh:
+            ids.extend(line.strip() for line in fh if line.strip())
+    if args.name_contains or args.email_domain:
+        mirror.sync_if_stale()
+        ids.extend(select_person_ids(mirror, args.name_contains, args.email_domain))
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        print("No Persons selected", file=sys.stderr)
+        return 0
+
+    journal = open_journal(args.journal)
+    try:
+        summary = bulk_delete_persons(client, ids,
+                                      max_workers=args.workers,
+                                      policy=policy,
+                                      mirror=mirror,
+                                      on_result=print_delete_result,
+                                      journal=journal)
+    finally:
+        if journal:
+            journal.close()
+    print_delete_summary(summary)
+    return 1 if summary.failed else 0
+
+
+def persons_update(args) -> int:
+    from examples.person_bulk import (bulk_update_persons, print_update_result, print_update_summary,
+                                      read_desired_persons)
+    from examples.person_mirror import PersonMirror
+
+    client, policy = _client_and_policy(args, workers=args.workers)
+    mirror = PersonMirror(client)
+    mirror.sync_if_stale()
+
+    summary = bulk_update_persons(client, read_desired_persons(args.file),
+                                  max_workers=args.workers,
+                                  policy=policy,
+                                  mirror=mirror,
+                                  on_result=print_update_result)
+    print_update_summary(summary)
+    return 1 if summary.failed else 0
+
+
+def templates_list(args) -> int:
+    from examples.template_cache import TemplateCache
+
+    templates = TemplateCache(_client(args)).templates(force_refresh=args.refresh)
+    _write(templates, args.format, columns=("id", "name"))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="BlueInk Python Client examples, non-interactive")
+    parser.add_argument("--metrics", action="store_true", help="Print per-endpoint API call metrics at exit")
+    resources = parser.add_subparsers(dest="resource", required=True)
+
+    def add_list_options(command, per_page: int):
+        command.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+        command.add_argument("--per-page", type=int, default=per_page)
+        command.add_argument("--window", type=int, default=4, help="Pages fetched concurrently (default 4)")
+
+    def add_bulk_options(command):
+        command.add_argument("--workers", type=int, default=8)
+        command.add_argument("--rate", type=float, default=10.0, help="Max requests per second (default 10)")
+
+    def add_journal_option(command):
+        command.add_argument("--journal", help="Journal file; re-running with it skips work already done")
+
+    bundles = resources.add_parser("bundles").add_subparsers(dest="command", required=True)
+    command = bundles.add_parser("list", help="Write every Bundle to stdout")
+    command.add_argument("--status", help="Only Bundles with this status, e.g. co (comma separated for several)")
+    add_list_options(command, per_page=100)
+    command.set_defaults(handler=bundles_list)
+
+    command = bundles.add_parser("send", help="Send Bundles from a CSV / JSONL manifest")
+    command.add_argument("manifest")
+    command.add_argument("--live", action="store_true", help="Send as live bundles instead of test bundles")
+    command.add_argument("--pipeline", action="store_true",
+                         help="Prepare documents in a separate stage, overlapping with sends (--workers)")
+    command.add_argument("--document-workers", type=int, default=4, help="Document workers with --pipeline")
+    add_bulk_options(command)
+    add_journal_option(command)
+    command.set_defaults(handler=bundles_send)
+
+    command = bundles.add_parser("merge", help="Send one templated Bundle per recipient in a CSV / JSONL file")
+    command.add_argument("template_id")
+    command.add_argument("recipients")
+    command.add_argument("--role", action="append", default=[],
+                         help="role or role=phone, repeatable (default: every template role, by email)")
+    command.add_argument("--field", action="append", default=[], help="Template field key to fill, repeatable")
+    command.add_argument("--default", action="append", default=[], help="key=value default for a field")
+    command.add_argument("--label", help='Label format, e.g. "NDA for {signer-1.name}" (default: the label column)')
+    command.add_argument("--live", action="store_true", help="Send as live bundles instead of test bundles")
+    add_bulk_options(command)
+    add_journal_option(command)
+    command.set_defaults(handler=bundles_merge)
+
+    persons = resources.add_parser("persons").add_subparsers(dest="command", required=True)
+    command = persons.add_parser("list", help="Write every Person to stdout")
+    add_list_options(command, per_page=100)
+    command.set_defaults(handler=persons_list)
+
+    command = persons.add_parser("delete", help="Delete Persons by id, or by a query on the local mirror")
+    command.add_argument("--ids", nargs="*", default=[])
+    command.add_argument("--ids-file", help="File with one Person id per line")
+    command.add_argument("--name-contains")
+    command.add_argument("--email-domain")
+    add_bulk_options(command)
+    add_journal_option(command)
+    command.set_defaults(handler=persons_delete)
+
+    command = persons.add_parser("update", help="Apply desired Person states from a CSV / JSONL file")
+    command.add_argument("file")
+    add_bulk_options(command)
+    command.set_defaults(handler=persons_update)
+
+    templates = resources.add_parser("templates").add_subparsers(dest="command", required=True)
+    command = templates.add_parser("list", help="Write every template to stdout, from the local cache when fresh")
+    command.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    command.add_argument("--refresh", action="store_true", help="Bypass the cache")
+    command.set_defaults(handler=templates_list)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
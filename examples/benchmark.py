@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from munch import Munch
+from requests import RequestException
+
+from examples.mock_server import MockBlueInkServer
+from examples.pagination import PrefetchingPagedIterator
+from examples.retry import RetryPolicy
+from examples.transport import use_pooled_transport
+from blueink import Client, BundleHelper
+from blueink.person_helper import PersonHelper
+
+OPERATIONS = ("create", "list", "paginate", "update", "delete", "startup")
+CLI_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cli.py")
+# A cold start of the CLI: interpreter startup, imports, and one API call
+STARTUP_ARGS = ("templates", "list", "--refresh")
+DEFAULT_CONCURRENCY = (1, 4, 16)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def run_timed(fn: Callable[[int], None], count: int, concurrency: int) -> Munch:
+    """Call fn(i) for i in range(count) across `concurrency` threads, timing each call.
+    """
+    latencies = []
+    errors = 0
+
+    def timed(i):
+        started = time.perf_counter()
+        try:
+            fn(i)
+            return time.perf_counter() - started, None
+        except (RequestException, subprocess.CalledProcessError) as e:
+            # HTTP errors, and connection failures / timeouts such as the mock server's injected faults
+            return time.perf_counter() - started, e
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, error in pool.map(timed, range(count)):
+            latencies.append(latency)
+            errors += 1 if error else 0
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return Munch(ops=count,
+                 errors=errors,
+                 ops_per_sec=count / elapsed if elapsed else 0.0,
+                 p50=percentile(latencies, 50),
+                 p95=percentile(latencies, 95),
+                 p99=percentile(latencies, 99))
+
+
+class Benchmark:
+    def __init__(self, client: Client, ops: int = 200, page_size: int = 20, cli_env: dict = None):
+        """ Throughput / latency benchmarks for the calls the Bundle and Person examples make.
+
+        :param cli_env: environment for the CLI processes of the startup benchmark, pointing them
+            at the same server as the client
+        """
+        self._client = client
+        self.ops = ops
+        self.page_size = page_size
+        self.cli_env = cli_env
+        self.setup_policy = RetryPolicy(base_delay=0.05)
+        self.setup_failed = 0
+
+    def _bundle_helper(self, i: int) -> BundleHelper:
+        helper = BundleHelper(label=f"Benchmark Bundle {i}", is_test=True)
+        doc_key = helper.add_document_by_url("https://www.irs.gov/pub/irs-pdf/fw4.pdf")
+        signer_key = helper.add_signer(name="Homer Simpson", email="homer@example.com", deliver_via="email")
+        helper.add_field(doc_key, 10, 10, 20, 5, 1, "inp", editors=[signer_key])
+        return helper
+
+    def _create_persons(self, count: int) -> List[str]:
+        """Setup for the update / delete benchmarks, through a RetryPolicy. Creates that still fail
+        (e.g. injected server errors, which aren't retried for creates) are skipped and counted
+        in self.setup_failed, so the benchmark runs over the Persons that exist.
+        """
+        ids = []
+        self.setup_failed = 0
+        for i in range(count):
+            helper = PersonHelper(name=f"Benchmark Person {i}", phones=[], emails=[f"bench{i}@example.com"])
+            try:
+                response = self.setup_policy.call(self._client.persons.create_from_person_helper, helper,
+                                                  idempotent=False)
+                ids.append(response.data.id)
+            except RequestException:
+                self.setup_failed += 1
+        if self.setup_failed:
+            print(f"Setup: {self.setup_failed} of {count} Person creates failed and were skipped", file=sys.stderr)
+        return ids
+
+    def run(self, operation: str, concurrency: int) -> Munch:
+        if operation == "create":
+            return run_timed(lambda i: self._client.bundles.create_from_bundle_helper(self._bundle_helper(i)),
+                             self.ops, concurrency)
+        if operation == "list":
+            return run_timed(lambda i: self._client.bundles.list(per_page=self.page_size),
+                             self.ops, concurrency)
+        if operation == "paginate":
+            # One op is a full walk of every page, one page at a time as paged_list does. A failed page
+            # must fail the op rather than quietly end the walk, or it wouldn't count as an error
+            def walk(i):
+                pages = PrefetchingPagedIterator(self._client.bundles.list, per_page=self.page_size, window=1,
+                                                 raise_errors=True)
+                return sum(1 for _ in pages)
+            return run_timed(walk, max(1, self.ops // 10), concurrency)
+        if operation == "update":
+            ids = self._create_persons(min(self.ops, 50))
+            return run_timed(lambda i: self._client.persons.update(ids[i % len(ids)],
+                                                                   {"name": f"Updated {i}"},
+                                                                   partial=True),
+                             self.ops if ids else 0, concurrency)
+        if operation == "delete":
+            ids = self._create_persons(self.ops)
+            return run_timed(lambda i: self._client.persons.delete(ids[i]), len(ids), concurrency)
+        if operation == "startup":
+            # One op is a whole CLI process, so far fewer of them
+            return run_timed(lambda i: self._run_cli(*STARTUP_ARGS), max(1, self.ops // 20), concurrency)
+        raise ValueError(f"Unknown operation '{operation}'")
+
+    def _run_cli(self, *args):
+        subprocess.run([sys.executable, CLI_PATH, *args], env=self.cli_env, check=True,
+                       stdout=subprocess.DEVNULL)
+
+    def run_all(self, operations=OPERATIONS, concurrency_levels=DEFAULT_CONCURRENCY) -> Dict[str, Munch]:
+        results = {}
+        for operation in operations:
+            for concurrency in concurrency_levels:
+                results[f"{operation}@{concurrency}"] = self.run(operation, concurrency)
+        return results
+
+
+def print_results(results: Dict[str, Munch]):
+    print(f"{'operation':<14}{'ops/sec':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, r in results.items():
+        print(f"{name:<14}{r.ops_per_sec:>10.1f}{r.p50 * 1000:>10.1f}{r.p95 * 1000:>10.1f}"
+              f"{r.p99 * 1000:>10.1f}{r.errors:>8}")
+
+
+def find_regressions(results: Dict[str, Munch], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Operations whose ops/sec fell, or p95 rose, by more than `tolerance` (a fraction) vs. the baseline.
+    """
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if r.ops_per_sec < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {r.ops_per_sec:.1f} ops/sec vs {base['ops_per_sec']:.1f} baseline")
+        if r.p95 > base["p95"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {r.p95 * 1000:.1f} ms vs {base['p95'] * 1000:.1f} ms baseline")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark example API flows against a local mock BlueInk server")
+    parser.add_argument("--ops", type=int, default=200, help="Calls per operation and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(DEFAULT_CONCURRENCY))
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument("--latency", type=float, default=0.02, help="Mock server latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--seed-bundles", type=int, default=500)
+    parser.add_argument("--pooled", action="store_true", help="Use the pooled keep-alive transport")
+    parser.add_argument("--output", help="Write results as JSON, e.g. to use as a later --baseline")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed fractional slowdown vs. the baseline (default 0.15)")
+    args = parser.parse_args()
+
+    with MockBlueInkServer(latency=args.latency,
+                           error_rate=args.error_rate,
+                           throttle_rate=args.throttle_rate) as server:
+        server.state.seed(bundles=args.seed_bundles, templates=5)
+        client = Client(private_api_key="benchmark", base_url=server.url)
+        if args.pooled:
+            use_pooled_transport(client, pool_maxsize=max(args.concurrency), print_at_exit=True)
+        cli_env = dict(os.environ, BLUEINK_API_URL=server.url, BLUEINK_PRIVATE_API_KEY="benchmark")
+        benchmark = Benchmark(client, ops=args.ops, cli_env=cli_env)
+        results = benchmark.run_all(args.operations, args.concurrency)
+
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = find_regressions(results, json.load(fh), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,274 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, Iterator, Sequence
+from urllib.parse import urlparse
+
+import requests
+from munch import Munch, munchify
+from requests import HTTPError
+
+from examples.bundle_validator import DEFAULT_VALIDATOR, BundleValidator
+from examples.document_store import DocumentStore
+from examples.instrumentation import instrument_client
+from examples.job_journal import JobJournal, content_key, open_journal
+from examples.rate_limit import TokenBucket
+from examples.retry import RetryPolicy, use_retries
+from examples.transport import use_pooled_transport
+from examples.streaming_upload import send_bundle_streaming, STREAMING_THRESHOLD
+from blueink import Client, BundleHelper
+
+# Columns of a CSV manifest that hold a JSON encoded list, e.g.
+# signers: [{"key": "signer-1", "name": "Homer Simpson", "email": "homer@example.com"}]
+MANIFEST_LIST_COLUMNS = ("documents", "signers", "fields")
+
+
+def read_manifest(path: str) -> Iterator[Munch]:
+    """Lazily read a bulk send manifest, one Munch per bundle.
+
+    Files ending in .csv are read with csv.DictReader, where the documents, signers and
+    fields columns hold JSON lists. Anything else is treated as JSONL, one bundle object per line.
+
+    Each bundle looks like:
+        {"label": "...", "email_subject": "...", "email_message": "...",
+         "documents": [{"key": "doc-1", "url": "https://..."} or {"key": "doc-1", "path": "a.pdf"}],
+         "signers": [{"key": "signer-1", "name": "...", "email": "...", "phone": "...", "deliver_via": "email"}],
+         "fields": [{"doc_key": "doc-1", "x": 1, "y": 1, "w": 10, "h": 5, "page": 1, "kind": "inp",
+                     "label": "...", "editors": ["signer-1"]}]}
+
+    A line that isn't valid JSON (or a CSV cell that isn't) doesn't stop the read: it is yielded as
+    {"manifest_error": "Line <n>: ..."} (with the row's label, for CSV), which fails to build, so only that Bundle fails.
+    """
+    with open(path, newline="") as fh:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(fh)
+            for row in reader:
+                try:
+                    for column in MANIFEST_LIST_COLUMNS:
+                        row[column] = json.loads(row[column]) if row.get(column) else []
+                except ValueError as e:
+                    yield Munch(label=row.get("label"),
+                                manifest_error=f"Line {reader.line_num}: {column} is not valid JSON ({e})")
+                    continue
+                yield munchify(row)
+        else:
+            for number, line in enumerate(fh, start=1):
+                if line.strip():
+                    try:
+                        yield munchify(json.loads(line))
+                    except ValueError as e:
+                        yield Munch(manifest_error=f"Line {number}: not valid JSON ({e})")
+
+
+# Keys a manifest signer / field must have
+SIGNER_REQUIRED = ("name",)
+FIELD_REQUIRED = ("doc_key", "x", "y", "w", "h", "kind")
+
+
+def _require(item, keys: Sequence[str], what: str):
+    """Raise ValueError naming the keys a manifest item lacks, rather than failing on attribute access later.
+    """
+    if not isinstance(item, dict):
+        raise ValueError(f"{what} must be an object, not {item!r}")
+    missing = [key for key in keys if item.get(key) is None]
+    if missing:
+        raise ValueError(f"{what} is missing {', '.join(missing)}")
+
+
+class BulkBundleSender:
+    def __init__(self, client: Client, max_workers: int = 8, is_test: bool = True,
+                 document_store: DocumentStore = None, validator: BundleValidator = DEFAULT_VALIDATOR,
+                 journal: JobJournal = None):
+        """ Sends many Bundles concurrently through one shared Client.
+
+        At most max_workers requests are in flight, and at most 2 * max_workers manifest rows
+        are held in memory at a time, so manifests of any length can be streamed through.
+        Local documents go through a shared DocumentStore, so a file referenced by many rows is
+        read and encoded once. Files over STREAMING_THRESHOLD are instead streamed from disk on
+        each send, keeping memory bounded. Each Bundle is checked by `validator` (None to skip)
+        before it is sent, so a bad row fails without a request.
+
+        With a JobJournal, every send and its outcome are journaled under the row's key, and rows
+        already sent in an earlier, interrupted run of the same job are skipped.
+        """
+        self._client = client
+        self.max_workers = max_workers
+        self.is_test = is_test
+        self.document_store = document_store or DocumentStore()
+        self.validator = validator
+        self.journal = journal
+
+    @staticmethod
+    def journal_key(row: Munch) -> str:
+        """A row's idempotency key: its custom_key if it has one, otherwise a hash of its content.
+        """
+        return row.get("custom_key") or content_key(row)
+
+    def build_helper(self, row: Munch) -> BundleHelper:
+        """Build a BundleHelper from a single manifest row.
+        """
+        helper = self.new_helper(row)
+        self.add_documents(helper, row)
+        self.add_signers_and_fields(helper, row)
+        return helper
+
+    def new_helper(self, row: Munch) -> BundleHelper:
+        _require(row, (), "Manifest row")
+        if row.get("manifest_error"):
+            raise ValueError(row.manifest_error)
+        return BundleHelper(label=row.get("label"),
+                            email_subject=row.get("email_subject"),
+                            email_message=row.get("email_message"),
+                            is_test=row.get("is_test", self.is_test))
+
+    def add_documents(self, helper: BundleHelper, row: Munch, fetch_urls: bool = False):
+        """Attach a row's documents. With fetch_urls, documents given by URL are downloaded and
+        embedded here instead of being fetched by BlueInk.
+        """
+        for doc in row.get("documents", []):
+            _require(doc, (), "Document")
+            if not (doc.get("url") or doc.get("path")):
+                raise ValueError("Document has neither url nor path")
+            if doc.get("url") and fetch_urls:
+                response = requests.get(doc.url, timeout=60)
+                response.raise_for_status()
+                filename = os.path.basename(urlparse(doc.url).path) or "document.pdf"
+                document = self.document_store.put_bytes(response.content, filename)
+                self.document_store.attach(helper, document, key=doc.get("key"))
+            elif doc.get("url"):
+                helper.add_document_by_url(doc.url, key=doc.get("key"))
+            elif os.path.getsize(doc.path) > STREAMING_THRESHOLD:
+                helper.add_document_by_path(doc.path, key=doc.get("key"))
+            else:
+                document = self.document_store.put_path(doc.path)
+                self.document_store.attach(helper, document, key=doc.get("key"))
+
+    def add_signers_and_fields(self, helper: BundleHelper, row: Munch):
+        for signer in row.get("signers", []):
+            _require(signer, SIGNER_REQUIRED, "Signer")
+            helper.add_signer(key=signer.get("key"),
+                              name=signer.name,
+                              email=signer.get("email"),
+                              phone=signer.get("phone"),
+                              deliver_via=signer.get("deliver_via"))
+
+        for field in row.get("fields", []):
+            _require(field, FIELD_REQUIRED, "Field")
+            helper.add_field(field.doc_key, field.x, field.y, field.w, field.h,
+                             field.get("page", 1), field.kind,
+                             label=field.get("label"),
+                             editors=field.get("editors", []))
+
+    def send_one(self, row: Munch) -> Munch:
+        """Build and send a single Bundle. Never raises; the outcome is returned as a Munch.
+        """
+        result = Munch(label=row.get("label") if isinstance(row, dict) else None, ok=False, bundle_id=None,
+                       status=None, error=None)
+        started = time.perf_counter()
+        try:
+            helper = self.build_helper(row)
+            if self.validator:
+                self.validator.check(helper)
+            response = send_bundle_streaming(self._client, helper)
+            result.ok = True
+            result.status = response.status
+            result.bundle_id = response.data.get("id")
+        except HTTPError as e:
+            result.status = e.response.status_code if e.response is not None else None
+            result.error = e.response.text if e.response is not None else str(e)
+        except (ValueError, RuntimeError, OSError) as e:
+            # Bad manifest row (missing key, unreadable file, failed model or Bundle validation)
+            result.error = str(e)
+
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    def send_journaled(self, key: str, row: Munch) -> Munch:
+        self.journal.start(key)
+        result = self.send_one(row)
+        self.journal.finish(key, result.ok, bundle_id=result.bundle_id, status=result.status, error=result.error)
+        return result
+
+    def send_all(self, rows: Iterable[Munch], on_result: Callable[[Munch], None] = None) -> Munch:
+        """Send every row through a bounded thread pool.
+
+        Returns:
+            Munch with sent / failed counts, rows skipped as already sent by the journal, total
+            elapsed seconds, bundles_per_sec and the per-bundle results.
+        """
+        results = []
+        max_in_flight = self.max_workers * 2
+        started = time.perf_counter()
+
+        def collect(done):
+            for future in done:
+                result = future.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+        journal = self.journal
+        skipped_before = journal.skipped if journal else 0
+        work = journal.todo(rows, self.journal_key) if journal else ((None, row) for row in rows)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            in_flight = set()
+            for key, row in work:
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                if journal:
+                    in_flight.add(pool.submit(self.send_journaled, key, row))
+                else:
+                    in_flight.add(pool.submit(self.send_one, row))
+
+            collect(wait(in_flight).done)
+
+        elapsed = time.perf_counter() - started
+        sent = sum(1 for r in results if r.ok)
+        return Munch(sent=sent,
+                     failed=len(results) - sent,
+                     skipped=(journal.skipped - skipped_before) if journal else 0,
+                     elapsed=elapsed,
+                     bundles_per_sec=len(results) / elapsed if elapsed else 0.0,
+                     results=results)
+
+
+def print_result(result: Munch):
+    if result.ok:
+        print(f"  + Sent '{result.label}' as {result.bundle_id} ({result.elapsed:.2f}s)")
+    else:
+        print(f"  - Failed '{result.label}', HTTP {result.status}: {result.error}")
+
+
+def print_summary(summary: Munch):
+    skipped = f"Skipped (already sent): {summary.skipped}, " if summary.get("skipped") else ""
+    print(f"Sent: {summary.sent}, Failed: {summary.failed}, {skipped}"
+          f"Elapsed: {summary.elapsed:.1f}s, {summary.bundles_per_sec:.2f} bundles/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send Bundles in bulk from a CSV or JSONL manifest")
+    parser.add_argument("manifest", help="Path to a .csv or .jsonl manifest")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent sends (default 8)")
+    parser.add_argument("--rate", type=float, default=10.0, help="Max requests per second (default 10)")
+    parser.add_argument("--live", action="store_true", help="Send as live bundles instead of test bundles")
+    parser.add_argument("--metrics", action="store_true", help="Print per-endpoint API call metrics at exit")
+    parser.add_argument("--journal", help="Journal file; re-running with it skips Bundles already sent")
+    args = parser.parse_args()
+
+    client = Client()
+    use_pooled_transport(client, pool_maxsize=args.workers, print_at_exit=True)
+    metrics = instrument_client(client) if args.metrics else None
+    use_retries(client, RetryPolicy(limiter=TokenBucket(rate=args.rate), metrics=metrics))
+
+    journal = open_journal(args.journal)
+    try:
+        sender = BulkBundleSender(client, max_workers=args.workers, is_test=not args.live, journal=journal)
+        summary = sender.send_all(read_manifest(args.manifest), on_result=print_result)
+    finally:
+        if journal:
+            journal.close()
+    print_summary(summary)
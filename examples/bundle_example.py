@@ -1,13 +1,28 @@
-from pprint import pprint
+import os
+import sys
+import time
 
 from munch import Munch
 from random import choice as random_choice
 from random import randint
 
-from requests import HTTPError
-
-from examples.example_utils import interactive_text_input, interactive_yes_no_input, \
-    input_choices, BaseExample
+from requests import HTTPError, RequestException
+
+from examples.bulk_send import BulkBundleSender, read_manifest, print_result, print_summary
+from examples.bundle_index import BundleIndex, print_bundles
+from examples.bundle_pipeline import BundlePipeline, print_stage_stats
+from examples.bundle_serializer import print_bundle_sizes, save_bundle, write_bundle
+from examples.bundle_validator import ERROR, print_problems, validate_bundle
+from examples.document_store import DocumentStore
+from examples.field_layout import FieldLayout
+from examples.export import export_bundles, iter_bundles
+from examples.job_journal import open_journal
+from examples.example_utils import interactive_text_input, interactive_yes_no_input, interactive_int_input, \
+    interactive_list_entry, input_choices, BaseExample, EXIT
+from examples.pagination import PrefetchingPagedIterator
+from examples.streaming_upload import send_bundle_streaming, STREAMING_THRESHOLD
+from examples.template_cache import TemplateCache
+from examples.webhooks import BundleStatusStore
 from blueink import Client, BundleHelper
 from blueink.endpoints import BUNDLES as BUNDLE_ENDPOINTS
 from blueink.constants import BUNDLE_STATUS
@@ -17,24 +32,35 @@ LNAMES = ["SIMPSON", "FLANDERS", "FREEMAN", "CALHOUN", "VANCE"]
 
 
 class BundleExampleModel:
-    def __init__(self, client: Client):
+    def __init__(self, client: Client, bundle_status: BundleStatusStore = None):
         """ Examples of using BundleHelper and some simple calls to list Bundles using the Client.
+
+        :param bundle_status: store fed by a webhook receiver, to follow sent Bundles without polling
         """
         self._client = client
+        self.template_cache = TemplateCache(client)
+        self.document_store = DocumentStore()
+        self.bundle_status = bundle_status
+        self.bundle_index = BundleIndex(client)
+        if bundle_status is not None:
+            self.bundle_index.follow(bundle_status)
 
     def call_list_bundles(self):
-        """Demonstration of listing of bundles. Non-paginated.
+        """Demonstration of listing of bundles. Bundles are streamed page by page, so printing
+        starts right away and memory use doesn't grow with the size of the account.
         """
-        resp = self._client.bundles.list()
-
-        if resp.status == 200:
-            print(f"Total Bundles: {len(resp.data)}")
-        else:
-            print(f"Response Code: {resp.status}: {resp.data}")
+        total = 0
+        try:
+            for bundle in iter_bundles(self._client):
+                print(f"  - Bundle {bundle.id}: {bundle.label};"
+                      f" status: {bundle.status}")
+                total += 1
+        except HTTPError as e:
+            print(f"Failed to list Bundles after {total}... Response Code: {e.response.status_code}: "
+                  f"{e.response.content}")
+            return
 
-        for bundle in resp.data:
-            print(f"  - Bundle {bundle.id}: {bundle.label};"
-                  f" status: {bundle.status}")
+        print(f"Total Bundles: {total}")
 
     def call_list_bundles_paginated(self):
         """Demonstration of using paginated calls to list Bundles.
@@ -56,48 +82,168 @@ class BundleExampleModel:
             if not keep_going:
                 break
 
+    def call_list_bundles_prefetched(self, per_page: int = 50, window: int = 4):
+        """Demonstration of listing all Bundles, fetching up to `window` pages concurrently.
+        """
+        print(f"A prefetching paginated call to '{BUNDLE_ENDPOINTS.LIST}', "
+              f"{per_page} per page, {window} pages in flight...")
+        iterator = PrefetchingPagedIterator(self._client.bundles.list,
+                                            per_page=per_page,
+                                            window=window)
+
+        for resp in iterator:
+            print(f"Page {resp.pagination.page_number} of {resp.pagination.total_pages}:")
+            for bundle in resp.data:
+                print(f"  - Bundle {bundle.id}: {bundle.label};"
+                      f" status: {bundle.status}")
+
     def call_list_bundles_filtered(self, status):
         """Demonstration of listing of Bundles, using a query parameter.
         """
         # Also note, singular status can be queried as well:
-        resp = self._client.bundles.list(status=status)
-        print(f"Response Code: {resp.status}")
+        total = 0
+        try:
+            for bundle in iter_bundles(self._client, status=status):
+                print(f"  - Bundle {bundle.id}: {bundle.label};"
+                      f" status: {bundle.status}")
+                total += 1
+        except HTTPError as e:
+            print(f"Failed to list Bundles after {total}... Response Code: {e.response.status_code}: "
+                  f"{e.response.content}")
+            return
+
+        print(f"Total Bundles with status '{status}': {total}")
 
-        if resp.status == 200:
-            print(f"Total Bundles with status '{status}': {len(resp.data)}")
+    def call_query_bundles(self, statuses=None, label_prefix: str = None, created_after: str = None,
+                           created_before: str = None, max_age: float = 60):
+        """Demonstration of answering compound Bundle queries from a local BundleIndex.
 
-        for bundle in resp.data:
-            print(f"  - Bundle {bundle.id}: {bundle.label};"
-                  f" status: {bundle.status}")
+        The index is refreshed incrementally when older than max_age seconds; the query itself
+        never goes to the network.
+        """
+        try:
+            stats = self.bundle_index.refresh_if_stale(max_age)
+        except RequestException as e:
+            # Answer from what is already indexed rather than not at all
+            stats = None
+            print(f"Failed to refresh the Bundle index, results may be out of date... {e}")
+        if stats:
+            print(f"Refreshed the Bundle index in {stats.elapsed:.2f}s, {stats.requests} requests "
+                  f"(+{stats.added} ~{stats.updated} -{stats.removed})")
+
+        started = time.perf_counter()
+        bundles = self.bundle_index.query(statuses=statuses, label_prefix=label_prefix,
+                                          created_after=created_after, created_before=created_before)
+        elapsed = time.perf_counter() - started
+        print_bundles(bundles)
+        print(f"Queried {len(self.bundle_index)} indexed Bundles in {elapsed * 1000:.3f} ms")
+        return bundles
+
+    def call_export_bundles(self, path: str, status: str = None):
+        """Demonstration of streaming every Bundle to a JSONL or CSV file, one Bundle at a time.
+        """
+        query_params = {"status": status} if status else {}
+        try:
+            count = export_bundles(self._client, path, **query_params)
+        except HTTPError as e:
+            print(f"Export to '{path}' failed and is incomplete... Response Code: {e.response.status_code}: "
+                  f"{e.response.content}")
+            return
+        print(f"Exported {count} Bundles to '{path}'")
 
-    def call_list_templates(self, print_templates: bool = True):
+    def call_list_templates(self, print_templates: bool = True, force_refresh: bool = False):
         """Demonstration of listing of document templates. Non-paginated.
+
+        Served from the local TemplateCache, which only goes to the network once its TTL expires
+        (or when force_refresh is set).
         """
-        resp = self._client.templates.list()
+        try:
+            templates = self.template_cache.templates(force_refresh=force_refresh)
+        except HTTPError as e:
+            print(f"Failed to get Templates... Response Code: {e.response.status_code}: {e.response.content}")
+            return []
 
-        if resp.status == 200:
-            print(f"Total Templates: {len(resp.data)}")
-        else:
-            print(f"Failed to get Templates... Response Code: {resp.status}: {resp.data}")
+        print(f"Total Templates: {len(templates)}")
 
         if print_templates:
-            for template in resp.data:
+            for template in templates:
                 print(f"  - Template {template.id}: {template.name}")
                 for role in template.roles:
                     print(f"     o Role: {role}")
 
-        return resp.data
+        return templates
+
+    def call_validate_bundle(self, helper: BundleHelper) -> bool:
+        """Demonstration of checking a Bundle locally before sending it, so mistakes such as a field
+        editor that isn't a signer don't cost a failed request. Prints any problems found.
+        """
+        problems = validate_bundle(helper)
+        print_problems(problems)
+        return not any(p.severity == ERROR for p in problems)
 
-    def call_send_bundle(self, helper: BundleHelper):
+    def call_send_bundle(self, helper: BundleHelper, validate: bool = True):
         """
         """
+        if validate and not self.call_validate_bundle(helper):
+            print("Bundle not sent, it has errors")
+            return None
+
         try:
-            response = self._client.bundles.create_from_bundle_helper(helper)
+            response = send_bundle_streaming(self._client, helper)
             print(f"Successfully sent bundle '{response.data['label']}'")
             print(response.data)
+            return response
         except HTTPError as e:
             print(f"Response Status: {e.errno}: {e.response.content}")
 
+    def call_await_bundle(self, bundle_id: str, timeout: float = None):
+        """Demonstration of following a Bundle through webhook events instead of polling its status.
+        """
+        statuses = {value: name for name, value in BUNDLE_STATUS.items()}
+        unsubscribe = self.bundle_status.subscribe(
+            lambda entry: print(f"Bundle {entry.bundle_id} is now {statuses.get(entry.status, entry.status)}"),
+            bundle_ids=[bundle_id])
+        try:
+            status = self.bundle_status.wait_for(bundle_id, timeout=timeout)
+        finally:
+            unsubscribe()
+        if status is None:
+            print(f"Bundle {bundle_id} didn't finish within {timeout} seconds")
+        return status
+
+    def call_send_bundles_from_manifest(self, manifest_path: str, max_workers: int = 8, journal_path: str = None):
+        """Demonstration of sending many Bundles concurrently from a CSV / JSONL manifest.
+
+        With a journal_path, calling again after an interruption only sends the Bundles not sent yet
+        """
+        journal = open_journal(journal_path)
+        try:
+            sender = BulkBundleSender(self._client, max_workers=max_workers, journal=journal)
+            summary = sender.send_all(read_manifest(manifest_path), on_result=print_result)
+        finally:
+            if journal:
+                journal.close()
+        print_summary(summary)
+        return summary
+
+    def call_send_bundles_pipelined(self, manifest_path: str, document_workers: int = 4, send_workers: int = 8,
+                                    journal_path: str = None):
+        """Demonstration of sending Bundles from a manifest through a staged pipeline, where reading
+        and encoding documents for later Bundles overlaps with sending earlier ones.
+        """
+        journal = open_journal(journal_path)
+        try:
+            bundle_pipeline = BundlePipeline(self._client, document_workers=document_workers,
+                                             send_workers=send_workers, document_store=self.document_store,
+                                             journal=journal)
+            summary = bundle_pipeline.send_all(read_manifest(manifest_path), on_result=print_result)
+        finally:
+            if journal:
+                journal.close()
+        print_summary(summary)
+        print_stage_stats(summary.stages)
+        return summary
+
     def helper_setup(self, label: str, email_subject: str, email_message: str) -> BundleHelper:
         helper = BundleHelper(label=label,
                               email_subject=email_subject,
@@ -117,13 +263,25 @@ class BundleExampleModel:
         return helper.add_document_by_url(url)
 
     def helper_add_document_filepath(self, helper: BundleHelper, path: str):
-        return helper.add_document_by_path(path)
+        # Large files are left on disk and streamed when the Bundle is sent
+        if os.path.getsize(path) > STREAMING_THRESHOLD:
+            return helper.add_document_by_path(path)
+
+        document = self.document_store.put_path(path)
+        return self.document_store.attach(helper, document)
 
     def helper_add_field(self, helper: BundleHelper, doc_key, x, y, w, h, p, kind, label, assigned_editors):
         return helper.add_field(doc_key, x, y, w, h, p, kind,
                                 label=label,
                                 editors=assigned_editors)
 
+    def helper_add_fields(self, helper: BundleHelper, layout: FieldLayout, doc_key, spec: dict,
+                          strict: bool = True) -> list:
+        """Add a whole column-oriented field spec to a document in one pass, checking it for
+        overlapping and out-of-bounds fields first. See FieldLayout.add_fields.
+        """
+        return layout.add_fields(helper, doc_key, spec, strict=strict).field_keys
+
 
 class ClientBundleExample(BaseExample, BundleExampleModel):
     MAIN_CHOICES = Munch(
@@ -137,6 +295,8 @@ class ClientBundleExample(BaseExample, BundleExampleModel):
         lba="List all Bundles",
         lbf="List Bundles, filtered",
         lta="List all Templates",
+        exp="Export Bundles to File",
+        qry="Query Bundles (local index)",
     )
     DOC_CHOICES = Munch(
         file="Add Document by File Path",
@@ -149,15 +309,16 @@ class ClientBundleExample(BaseExample, BundleExampleModel):
     LIST_CHOICES = Munch(
         reg="Regularly",
         pag="Paginated",
+        pre="Paginated, prefetching",
     )
 
-    def __init__(self, client: Client):
+    def __init__(self, client: Client, bundle_status: BundleStatusStore = None):
         """ CLI UI Controller for Bundle Example.
 
         For network calls / interactions with the Bundle Helper, see above BundleExampleModel
         """
         BaseExample.__init__(self)
-        BundleExampleModel.__init__(self, client)
+        BundleExampleModel.__init__(self, client, bundle_status)
 
         self.bundle_helper: BundleHelper = None
 
@@ -165,12 +326,13 @@ class ClientBundleExample(BaseExample, BundleExampleModel):
         self.template_keys = set()
         self.signer_keys = set()
         self.field_keys = set()
+        self.field_layout = FieldLayout()
 
     def start(self):
         print("BlueInk API Client Example: Bundle Helper")
         print("(C) BlueInk 2022")
         print("\n")
-        self.main_router()
+        self.run_menu()
 
     def suggested_main_option(self):
         if not self.bundle_helper:
@@ -195,31 +357,26 @@ class ClientBundleExample(BaseExample, BundleExampleModel):
             default=self.suggested_main_option()
         )
         print("Your choice: `" + choice + "`")
-
-        if choice == self.MAIN_CHOICES.bdl:
-            self.setup_bundle_helper()
-        elif choice == self.MAIN_CHOICES.doc:
-            self.add_document_interactive()
-        elif choice == self.MAIN_CHOICES.sig:
-            self.add_signer_interactive()
-        elif choice == self.MAIN_CHOICES.fld:
-            self.add_field_interactive()
-        elif choice == self.MAIN_CHOICES.sum:
-            self.summary()
-        elif choice == self.MAIN_CHOICES.prn:
-            self.print_bundle_json()
-        elif choice == self.MAIN_CHOICES.sen:
-            self.send_bundle()
-        elif choice == self.MAIN_CHOICES.lba:
-            self.list_all_bundles()
-        elif choice == self.MAIN_CHOICES.lbf:
-            self.list_filtered_bundles()
-        elif choice == self.MAIN_CHOICES.lta:
-            self.list_all_templates()
+        return choice
+
+    def menu_states(self):
+        return {
+            self.MAIN_CHOICES.bdl: self.setup_bundle_helper,
+            self.MAIN_CHOICES.doc: self.add_document_interactive,
+            self.MAIN_CHOICES.sig: self.add_signer_interactive,
+            self.MAIN_CHOICES.fld: self.add_field_interactive,
+            self.MAIN_CHOICES.sum: self.summary,
+            self.MAIN_CHOICES.prn: self.print_bundle_json,
+            self.MAIN_CHOICES.sen: self.send_bundle,
+            self.MAIN_CHOICES.lba: self.list_all_bundles,
+            self.MAIN_CHOICES.lbf: self.list_filtered_bundles,
+            self.MAIN_CHOICES.lta: self.list_all_templates,
+            self.MAIN_CHOICES.exp: self.export_bundles,
+            self.MAIN_CHOICES.qry: self.query_bundles,
+        }
 
     def list_all_templates(self):
         self.call_list_templates(print_templates=True)
-        self.main_router()
 
     def list_all_bundles(self):
         choice = input_choices("~~List all Bundles~~",
@@ -228,10 +385,24 @@ class ClientBundleExample(BaseExample, BundleExampleModel):
                                1)
         if choice == self.LIST_CHOICES.reg:
             self.call_list_bundles()
-        else:
+        elif choice == self.LIST_CHOICES.pag:
             self.call_list_bundles_paginated()
-
-        self.main_router()
+        else:
+            window = interactive_int_input("Pages in flight", 4, minimum=1)
+            self.call_list_bundles_prefetched(window=window)
+
+    def export_bundles(self):
+        print("~~Export Bundles~~")
+        path = interactive_text_input("Export file (.jsonl or .csv)", "bundles.jsonl", allow_blank=False)
+        status = None
+        if interactive_yes_no_input("Filter by status", "n"):
+            status = input_choices("Status Codes",
+                                   "Your Selection",
+                                   BUNDLE_STATUS,
+                                   1
+                                   )
+
+        self.call_export_bundles(path, status)
 
     def list_filtered_bundles(self):
         print("~~List Bundles, filtered by status~~")
@@ -243,7 +414,19 @@ class ClientBundleExample(BaseExample, BundleExampleModel):
 
         self.call_list_bundles_filtered(status)
 
-        self.main_router()
+    def query_bundles(self):
+        print("~~Query Bundles (local index)~~")
+        statuses = None
+        if interactive_yes_no_input("Filter by status", "n"):
+            statuses = interactive_list_entry("Status code", "Add another status", BUNDLE_STATUS.SENT)
+        label_prefix = interactive_text_input("Label starts with (blank for any)", None)
+        created_after = interactive_text_input("Created on or after, e.g. 2024-01-31 (blank for any)", None)
+        created_before = interactive_text_input("Created before (blank for any)", None)
+
+        try:
+            self.call_query_bundles(statuses, label_prefix, created_after, created_before)
+        except ValueError as e:
+            print(f"** Invalid date: {e} **")
 
     def summary(self):
         print("Documents Added:")
@@ -262,12 +445,10 @@ class ClientBundleExample(BaseExample, BundleExampleModel):
         for key in list(self.field_keys):
             print(key)
 
-        self.main_router()
-
     def setup_bundle_helper(self):
         if self.bundle_helper is not None:
             print("** Bundle already setup. Please pick another option **")
-            self.main_router()
+            return
 
         print("~~Bundle Initial Setup~~")
         label = interactive_text_input("Bundle Label", "Test_Bundle", False)
@@ -277,12 +458,11 @@ class ClientBundleExample(BaseExample, BundleExampleModel):
         self.bundle_helper = self.helper_setup(label, email_subject, email_message)
 
         print("Bundle Configured!")
-        self.main_router()
 
     def add_signer_interactive(self):
         if self.bundle_helper is None:
             print("** Bundle not yet configured. Please pick option 1**")
-            self.main_router()
+            return
 
         print("~~Add a Signer~~")
         suggested_key = f"signer-{len(self.signer_keys) + 1}"
@@ -313,12 +493,11 @@ class ClientBundleExample(BaseExample, BundleExampleModel):
         self.signer_keys.add(packet_key)
 
         print("Signer Added!")
-        self.main_router()
 
     def add_document_interactive(self):
         if self.bundle_helper is None:
             print("** Bundle not yet configured. Please pick option 1**")
-            self.main_router()
+            return
 
         choice = input_choices(
             header="~~Add a Document~~",
@@ -340,20 +519,19 @@ class ClientBundleExample(BaseExample, BundleExampleModel):
         self.doc_keys.add(doc_key)
 
         print("Document Added!")
-        self.main_router()
 
     def add_field_interactive(self):
         if self.bundle_helper is None:
             print("** Bundle not yet configured. Please pick option 1**")
-            self.main_router()
+            return
 
         if len(self.doc_keys.difference(self.template_keys)) == 0:
             print("** non-template documents not yet added. Please add one or more documents via URL or path **")
-            self.main_router()
+            return
 
         if len(self.signer_keys) == 0:
             print("** Signers not yet added. Please add one or more Signers **")
-            self.main_router()
+            return
 
         print("~~Add a Field~~")
         ordered_doc_keys = list(self.doc_keys.difference(self.template_keys))
@@ -369,10 +547,14 @@ class ClientBundleExample(BaseExample, BundleExampleModel):
             1
         )
         label = interactive_text_input("Label", "An Input Field", allow_blank=True)
-        x = int(interactive_text_input("x loc", randint(0, 100), allow_blank=False))
-        y = int(interactive_text_input("y loc", randint(0, 100), allow_blank=False))
-        w = int(interactive_text_input("width", randint(0, 100), allow_blank=False))
-        h = int(interactive_text_input("height", randint(0, 100), allow_blank=False))
+        # Default to a random field that fits on the page, so taking the defaults gives a sendable Bundle
+        page_width, page_height = int(self.field_layout.page_width), int(self.field_layout.page_height)
+        default_w = randint(1, max(page_width // 4, 1))
+        default_h = randint(1, max(page_height // 10, 1))
+        x = int(interactive_text_input("x loc", randint(0, page_width - default_w), allow_blank=False))
+        y = int(interactive_text_input("y loc", randint(0, page_height - default_h), allow_blank=False))
+        w = int(interactive_text_input("width", default_w, allow_blank=False))
+        h = int(interactive_text_input("height", default_h, allow_blank=False))
         p = int(interactive_text_input("page", "1", allow_blank=False))
 
         assigned_editors = set()
@@ -393,29 +575,57 @@ class ClientBundleExample(BaseExample, BundleExampleModel):
             assigned_editors.add(additional_editor)
             editor_choices.remove(additional_editor)
 
-        key = self.helper_add_field(self.bundle_helper, doc_key, x, y, w, h, p, kind,
-                                    label=label,
-                                    assigned_editors=assigned_editors)
-        self.field_keys.add(key)
+        spec = dict(x=[x], y=[y], w=[w], h=[h], page=[p], kind=[kind],
+                    label=[label], editors=[sorted(assigned_editors)])
+        report = self.field_layout.check(doc_key, spec)
+        if report.invalid or report.out_of_bounds:
+            # The validator rejects these when sending, so don't let them into the Bundle
+            if report.invalid:
+                print("** Field width and height must be positive **")
+            if report.out_of_bounds:
+                print("** Field extends past the edge of the page **")
+            print("** Field not added **")
+            return
+        if report.overlaps:
+            for _, other_key in report.overlaps:
+                print(f"** Field overlaps field '{other_key}' **")
+            if not interactive_yes_no_input("Add the field anyway", "n"):
+                return
+
+        keys = self.helper_add_fields(self.bundle_helper, self.field_layout, doc_key, spec, strict=False)
+        self.field_keys.update(keys)
 
         print("Field Added!")
-        self.main_router()
 
     def print_bundle_json(self):
         if self.bundle_helper is None:
             print("** Bundle not yet configured. Please pick option 1**")
-            self.main_router()
+            return
 
-        pprint(self.bundle_helper.as_json())
-
-        self.main_router()
+        path = interactive_text_input("Write JSON to file (blank prints it)", allow_blank=True)
+        if path:
+            sizes = save_bundle(self.bundle_helper, path)
+            print(f"Bundle JSON written to {path}")
+        else:
+            sizes = write_bundle(self.bundle_helper, sys.stdout)
+            print()
+        print("Payload size by section:")
+        print_bundle_sizes(sizes)
 
     def send_bundle(self):
         if self.bundle_helper is None:
             print("** Bundle not yet configured. Please pick option 1**")
-            self.main_router()
+            return
+
+        if not self.call_validate_bundle(self.bundle_helper):
+            print("** Bundle has errors, not sent. Fix them and pick Send again **")
+            return
 
-        self.call_send_bundle(self.bundle_helper)
+        response = self.call_send_bundle(self.bundle_helper, validate=False)
+        if (response is not None and self.bundle_status is not None and
+                interactive_yes_no_input("Wait for the Bundle to finish (via webhooks)", "n")):
+            timeout = float(interactive_text_input("Give up after how many seconds", "600", allow_blank=False))
+            self.call_await_bundle(response.data.id, timeout=timeout)
 
         print("Example Concluded. To create a new bundle, start the example script again.")
-        exit()
+        return EXIT
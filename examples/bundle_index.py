@@ -0,0 +1,376 @@
+import argparse
+import bisect
+import heapq
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from munch import Munch, munchify
+from requests import HTTPError
+
+from examples.example_utils import DEFAULT_CACHE_DIR, account_key
+from examples.pagination import PrefetchingPagedIterator, iter_items
+from examples.webhooks import TERMINAL_STATUSES, BundleStatusStore
+from blueink import Client
+from blueink.constants import BUNDLE_ORDER, BUNDLE_STATUS
+
+# Statuses a Bundle can still move on from; only these are re-listed by an incremental refresh
+OPEN_STATUSES = tuple(status for status in BUNDLE_STATUS.values() if status not in TERMINAL_STATUSES)
+
+# Below 1 / CHECK_RATIO of a condition's matches, remaining ids are checked one by one
+# rather than intersected with all of them
+CHECK_RATIO = 8
+
+Timestamp = Union[datetime, str, float, int, None]
+
+
+def to_timestamp(value: Timestamp) -> Optional[float]:
+    """Seconds since the epoch from a datetime, an ISO 8601 string or a number. Naive values are UTC.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class BundleIndex:
+    def __init__(self, client: Client, cache_dir: str = None, persist: bool = True):
+        """ Local, in-memory index over the account's Bundles for dashboard-style queries.
+
+        Bundles are indexed by status (a set of ids per status), by lower-cased label and by
+        creation time (both sorted lists searched with bisect), so a compound query such as
+        "status in {sent, started}, label starting with 'Q3', created last week" never touches
+        the network and runs in well under a millisecond on tens of thousands of Bundles.
+
+        refresh() keeps the index current from the list endpoint: the first call lists every
+        Bundle, later ones only fetch Bundles created since, plus those still in an open status.
+        With `persist`, the index is saved per account under cache_dir so the next process starts
+        incrementally too. Safe to share between threads.
+        """
+        self._client = client
+        self.path = os.path.join(cache_dir or DEFAULT_CACHE_DIR, f"bundle-index-{account_key(client)}.json") \
+            if persist else None
+
+        self._lock = threading.RLock()
+        self._reset()
+
+        if self.path:
+            self._load()
+
+    def _reset(self):
+        self._bundles: Dict[str, Munch] = {}
+        self._by_status: Dict[str, Set[str]] = {}
+        # Sorted (key, id) tuples, with the ids alone alongside for slicing
+        self._label_keys: List[tuple] = []
+        self._label_ids: List[str] = []
+        self._created_keys: List[tuple] = []
+        self._created_ids: List[str] = []
+        self._created_at: Dict[str, float] = {}
+        self._labels: Dict[str, str] = {}
+        self.refreshed_at: Optional[float] = None
+
+    def __len__(self):
+        return len(self._bundles)
+
+    def get(self, bundle_id: str) -> Optional[Munch]:
+        return self._bundles.get(bundle_id)
+
+    # Queries
+    def query(self, statuses: Iterable[str] = None, label_prefix: str = None,
+              created_after: Timestamp = None, created_before: Timestamp = None,
+              limit: int = None) -> List[Munch]:
+        """Bundles matching every given condition, newest first.
+
+        :param statuses: any of these statuses
+        :param label_prefix: label starts with this, ignoring case
+        :param created_after: created at or after this time (datetime, ISO 8601 string or epoch seconds)
+        :param created_before: created before this time
+        """
+        with self._lock:
+            ids = self._match(statuses, label_prefix, created_after, created_before)
+            newest = lambda bundle_id: self._created_at.get(bundle_id) or 0.0
+            if limit is not None:
+                ids = heapq.nlargest(limit, ids, key=newest)
+            else:
+                ids = sorted(ids, key=newest, reverse=True)
+            return [self._bundles[bundle_id] for bundle_id in ids]
+
+    def count(self, statuses: Iterable[str] = None, label_prefix: str = None,
+              created_after: Timestamp = None, created_before: Timestamp = None) -> int:
+        with self._lock:
+            return len(self._match(statuses, label_prefix, created_after, created_before))
+
+    def status_counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {status: len(ids) for status, ids in self._by_status.items() if ids}
+
+    def _match(self, statuses, label_prefix, created_after, created_before) -> Set[str]:
+        # Each condition narrows to a set / slice of ids straight from its index, as
+        # (size, ids, check). Starting from the smallest, the others are either intersected
+        # in C or, once few ids are left, checked id by id.
+        conditions = []
+
+        if statuses is not None:
+            statuses = set(statuses)
+            id_sets = [self._by_status.get(status, set()) for status in statuses]
+            conditions.append((sum(len(ids) for ids in id_sets), id_sets,
+                               lambda bundle_id: self._bundles[bundle_id].status in statuses))
+
+        if label_prefix:
+            prefix = label_prefix.lower()
+            lo = bisect.bisect_left(self._label_keys, (prefix,))
+            # Every label starting with prefix sorts below prefix + the highest code point
+            hi = bisect.bisect_left(self._label_keys, (prefix + "\U0010ffff",), lo)
+            conditions.append((hi - lo, [self._label_ids[lo:hi]],
+                               lambda bundle_id: self._labels[bundle_id].startswith(prefix)))
+
+        if created_after is not None or created_before is not None:
+            start, end = to_timestamp(created_after), to_timestamp(created_before)
+            lo = bisect.bisect_left(self._created_keys, (start,)) if start is not None else 0
+            hi = bisect.bisect_left(self._created_keys, (end,)) if end is not None else len(self._created_keys)
+            conditions.append((max(hi - lo, 0), [self._created_ids[lo:hi]],
+                               lambda bundle_id: self._in_range(self._created_at.get(bundle_id), start, end)))
+
+        if not conditions:
+            return set(self._bundles)
+
+        conditions.sort(key=lambda condition: condition[0])
+        ids = set().union(*conditions[0][1])
+        for size, id_lists, check in conditions[1:]:
+            if len(ids) * CHECK_RATIO < size:
+                ids = {bundle_id for bundle_id in ids if check(bundle_id)}
+            else:
+                ids.intersection_update(set().union(*id_lists) if len(id_lists) > 1 else id_lists[0])
+        return ids
+
+    @staticmethod
+    def _in_range(created: Optional[float], start: Optional[float], end: Optional[float]) -> bool:
+        return created is not None and (start is None or created >= start) and (end is None or created < end)
+
+    # Maintenance
+    def upsert(self, bundle: dict) -> bool:
+        """Add or replace one Bundle, e.g. as returned by the list / retrieve / create calls.
+        Returns True if it was new or changed.
+        """
+        bundle = munchify(bundle)
+        with self._lock:
+            current = self._bundles.get(bundle.id)
+            if current == bundle:
+                return False
+            if current is not None:
+                self._unindex(current)
+            self._bundles[bundle.id] = bundle
+            self._by_status.setdefault(bundle.get("status"), set()).add(bundle.id)
+            label_key = self._label_key(bundle)
+            self._labels[bundle.id] = label_key[0]
+            self._insert_sorted(self._label_keys, self._label_ids, label_key)
+            created = to_timestamp(bundle.get("created"))
+            if created is not None:
+                self._created_at[bundle.id] = created
+                self._insert_sorted(self._created_keys, self._created_ids, (created, bundle.id))
+            return True
+
+    def remove(self, bundle_id: str) -> bool:
+        with self._lock:
+            bundle = self._bundles.pop(bundle_id, None)
+            if bundle is None:
+                return False
+            self._unindex(bundle)
+            return True
+
+    def set_status(self, bundle_id: str, status: str) -> bool:
+        """Move a known Bundle to another status, e.g. from a webhook event. Unknown ids are
+        ignored; the next refresh() picks those up.
+        """
+        with self._lock:
+            bundle = self._bundles.get(bundle_id)
+            if bundle is None or bundle.status == status:
+                return False
+            self._by_status[bundle.status].discard(bundle_id)
+            bundle.status = status
+            self._by_status.setdefault(status, set()).add(bundle_id)
+            return True
+
+    def follow(self, store: BundleStatusStore):
+        """Apply every status change recorded in a BundleStatusStore (i.e. webhook events) as it
+        arrives, so the index stays current between refreshes. Returns a function that stops it.
+        """
+        return store.subscribe(lambda entry: self.set_status(entry.bundle_id, entry.status))
+
+    def _unindex(self, bundle: Munch):
+        self._by_status.get(bundle.get("status"), set()).discard(bundle.id)
+        self._labels.pop(bundle.id, None)
+        self._remove_sorted(self._label_keys, self._label_ids, self._label_key(bundle))
+        created = self._created_at.pop(bundle.id, None)
+        if created is not None:
+            self._remove_sorted(self._created_keys, self._created_ids, (created, bundle.id))
+
+    @staticmethod
+    def _label_key(bundle: Munch) -> tuple:
+        return (bundle.get("label") or "").lower(), bundle.id
+
+    @staticmethod
+    def _insert_sorted(keys: List[tuple], ids: List[str], entry: tuple):
+        i = bisect.bisect_left(keys, entry)
+        keys.insert(i, entry)
+        ids.insert(i, entry[1])
+
+    @staticmethod
+    def _remove_sorted(keys: List[tuple], ids: List[str], entry: tuple):
+        i = bisect.bisect_left(keys, entry)
+        if i < len(keys) and keys[i] == entry:
+            del keys[i]
+            del ids[i]
+
+    # Syncing with the server
+    def refresh(self, full: bool = False, per_page: int = 100, window: int = 4, max_workers: int = 8) -> Munch:
+        """Bring the index up to date with the server.
+
+        A full refresh (the first one, or when `full` is set) lists every Bundle and drops the
+        ones that are gone. An incremental one lists Bundles newest first until it reaches one
+        already indexed, re-lists each open status, and retrieves the indexed open Bundles that
+        no longer show up there, i.e. the ones that have since completed, been cancelled, etc.
+
+        Returns:
+            Munch of added / updated / removed counts, requests made and elapsed seconds
+        """
+        started = time.perf_counter()
+        stats = Munch(full=full or self.refreshed_at is None, added=0, updated=0, removed=0, requests=0)
+
+        def count_requests(paged_function):
+            def counted(*args, **kwargs):
+                stats.requests += 1
+                return paged_function(*args, **kwargs)
+            return counted
+
+        def apply(bundle: dict):
+            is_new = bundle["id"] not in self._bundles
+            if self.upsert(bundle):
+                stats["added" if is_new else "updated"] += 1
+
+        if stats.full:
+            seen = set()
+            for bundle in iter_items(PrefetchingPagedIterator(count_requests(self._client.bundles.list),
+                                                              per_page=per_page, window=window,
+                                                              raise_errors=True)):
+                seen.add(bundle["id"])
+                apply(bundle)
+            with self._lock:
+                for bundle_id in set(self._bundles) - seen:
+                    stats.removed += self.remove(bundle_id)
+        else:
+            with self._lock:
+                was_open = {bundle_id for status in OPEN_STATUSES for bundle_id in self._by_status.get(status, ())}
+
+            # Newest first: everything past the first already indexed Bundle is already indexed
+            newest_first = PrefetchingPagedIterator(count_requests(self._client.bundles.list), per_page=per_page,
+                                                    window=1, raise_errors=True,
+                                                    ordering=f"-{BUNDLE_ORDER.CREATED}")
+            for bundle in iter_items(newest_first):
+                if bundle["id"] in self._bundles:
+                    break
+                apply(bundle)
+
+            still_open = set()
+            for status in OPEN_STATUSES:
+                pages = PrefetchingPagedIterator(count_requests(self._client.bundles.list), per_page=per_page,
+                                                 window=window, raise_errors=True, status=status)
+                for bundle in iter_items(pages):
+                    still_open.add(bundle["id"])
+                    apply(bundle)
+
+            moved_on = was_open - still_open
+            if moved_on:
+                with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                    for bundle_id, bundle in zip(moved_on, pool.map(self._retrieve, moved_on)):
+                        stats.requests += 1
+                        if bundle is None:
+                            stats.removed += self.remove(bundle_id)
+                        else:
+                            apply(bundle)
+
+        self.refreshed_at = time.time()
+        if self.path:
+            self._save()
+        stats.elapsed = time.perf_counter() - started
+        return stats
+
+    def refresh_if_stale(self, max_age: float = 60) -> Optional[Munch]:
+        if self.refreshed_at is None or time.time() - self.refreshed_at >= max_age:
+            return self.refresh()
+        return None
+
+    def _retrieve(self, bundle_id: str) -> Optional[Munch]:
+        try:
+            return self._client.bundles.retrieve(bundle_id).data
+        except HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+
+    def _load(self):
+        try:
+            with open(self.path) as fh:
+                entry = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return
+        # A truncated or old-format cache is discarded; the next refresh is then a full one
+        try:
+            for bundle in entry["bundles"]:
+                self.upsert(bundle)
+            refreshed_at = entry["refreshed_at"]
+            if not isinstance(refreshed_at, (int, float)):
+                raise TypeError(f"refreshed_at is {refreshed_at!r}")
+        except (KeyError, TypeError, AttributeError, ValueError):
+            self._reset()
+            return
+        self.refreshed_at = refreshed_at
+
+    def _save(self):
+        with self._lock:
+            entry = {"refreshed_at": self.refreshed_at, "bundles": list(self._bundles.values())}
+            # Write then rename, so a concurrent reader never sees a half-written file
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as fh:
+                json.dump(entry, fh)
+            os.replace(tmp_path, self.path)
+
+
+def print_bundles(bundles: List[Munch]):
+    for bundle in bundles:
+        print(f"  - Bundle {bundle.id}: {bundle.label}; status: {bundle.status}; created: {bundle.get('created')}")
+    print(f"Total Bundles: {len(bundles)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query a local index of the account's Bundles")
+    parser.add_argument("--status", action="append", choices=sorted(BUNDLE_STATUS.values()),
+                        help="Match this status; repeat for several")
+    parser.add_argument("--label", help="Label prefix, case-insensitive")
+    parser.add_argument("--created-after", help="ISO 8601 date / time")
+    parser.add_argument("--created-before", help="ISO 8601 date / time")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--full", action="store_true", help="Re-list every Bundle instead of refreshing incrementally")
+    args = parser.parse_args()
+
+    index = BundleIndex(Client())
+    stats = index.refresh(full=args.full)
+    print(f"Refreshed {len(index)} Bundles in {stats.elapsed:.2f}s with {stats.requests} requests "
+          f"(+{stats.added} ~{stats.updated} -{stats.removed})")
+
+    started = time.perf_counter()
+    results = index.query(statuses=args.status, label_prefix=args.label, created_after=args.created_after,
+                          created_before=args.created_before, limit=args.limit)
+    elapsed = time.perf_counter() - started
+    print_bundles(results)
+    print(f"Query took {elapsed * 1000:.3f} ms")
@@ -0,0 +1,336 @@
+import argparse
+import queue
+import threading
+import time
+from typing import Callable, Iterable, List
+
+from munch import Munch
+from requests import HTTPError
+
+from examples.bulk_send import BulkBundleSender, print_result, print_summary, read_manifest
+from examples.bundle_validator import DEFAULT_VALIDATOR, BundleValidator
+from examples.document_store import DocumentStore
+from examples.instrumentation import instrument_client
+from examples.job_journal import JobJournal, open_journal
+from examples.rate_limit import TokenBucket
+from examples.retry import RetryPolicy, use_retries
+from examples.streaming_upload import send_bundle_streaming
+from examples.transport import use_pooled_transport
+from blueink import Client
+
+# Seconds between queue depth samples
+SAMPLE_INTERVAL = 0.05
+
+# End of stream marker, passed down once per worker of the next stage
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable, workers: int = 1, queue_size: int = None):
+        """ One step of a Pipeline: `workers` threads applying fn(value) -> value to every item.
+
+        Items come from a queue holding at most queue_size items (default 2 * workers). When a
+        stage falls behind, its queue fills up and the stage before it blocks, so no stage runs
+        more than a queue ahead of the next one.
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size or 2 * workers)
+
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._running = self.workers
+        self.processed = 0
+        self.failed = 0
+        # Seconds, summed over workers: running fn / waiting for input / waiting on a full next queue
+        self.busy = 0.0
+        self.idle = 0.0
+        self.blocked = 0.0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.max_depth = 0
+
+    def sample(self):
+        depth = self.queue.qsize()
+        self.depth_samples += 1
+        self.depth_total += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def stats(self, elapsed: float) -> Munch:
+        return Munch(stage=self.name,
+                     workers=self.workers,
+                     processed=self.processed,
+                     failed=self.failed,
+                     per_sec=self.processed / elapsed if elapsed else 0.0,
+                     utilization=self.busy / (self.workers * elapsed) if elapsed else 0.0,
+                     blocked=self.blocked,
+                     queue_size=self.queue.maxsize,
+                     avg_depth=self.depth_total / self.depth_samples if self.depth_samples else 0.0,
+                     max_depth=self.max_depth)
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage], report_every: float = None):
+        """ Runs items through a chain of Stages connected by bounded queues.
+
+        Every stage works concurrently with the others at its own concurrency level, so e.g.
+        slow document downloads for later items overlap with the sends of earlier ones. An item
+        whose stage raises skips the rest of the pipeline and is returned with the error.
+
+        Per-stage stats tell where to add workers: a stage with high utilization and a full input
+        queue is the bottleneck, while a stage spending its time blocked is waiting on the next one.
+
+        :param report_every: print progress (items processed and queue depth per stage) this often, in seconds
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.report_every = report_every
+
+    def run(self, items: Iterable, on_result: Callable[[Munch], None] = None) -> Munch:
+        """Push every item through the pipeline.
+
+        Each result is a Munch with the item's number (from 1), the item, the last stage's
+        value, ok, the stage that failed and its exception, and elapsed seconds.
+
+        Returns:
+            Munch with ok / failed counts, elapsed seconds, items_per_sec, per-stage stats and
+            the results, in completion order
+        """
+        for stage in self.stages:
+            stage.reset()
+        results_queue = queue.Queue()
+        finished = threading.Event()
+        threads = [threading.Thread(target=self._produce, args=(items, results_queue), daemon=True,
+                                    name="pipeline-producer"),
+                   threading.Thread(target=self._sample, args=(finished,), daemon=True, name="pipeline-sampler")]
+        for i, stage in enumerate(self.stages):
+            next_queue = self.stages[i + 1].queue if i + 1 < len(self.stages) else results_queue
+            next_workers = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            for n in range(stage.workers):
+                threads.append(threading.Thread(target=self._work,
+                                                args=(stage, next_queue, next_workers, results_queue),
+                                                daemon=True, name=f"pipeline-{stage.name}-{n}"))
+
+        results = []
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                result = results_queue.get()
+                if result is _DONE:
+                    break
+                result.elapsed = time.perf_counter() - result.pop("_started")
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        finally:
+            finished.set()
+        elapsed = time.perf_counter() - started
+
+        ok = sum(1 for r in results if r.ok)
+        return Munch(ok=ok,
+                     failed=len(results) - ok,
+                     elapsed=elapsed,
+                     items_per_sec=len(results) / elapsed if elapsed else 0.0,
+                     stages=[stage.stats(elapsed) for stage in self.stages],
+                     results=results)
+
+    def _produce(self, items: Iterable, results_queue: queue.Queue):
+        first = self.stages[0]
+        try:
+            for number, item in enumerate(items, start=1):
+                first.queue.put(Munch(number=number, item=item, value=item, ok=True, stage=None, error=None,
+                                      _started=time.perf_counter()))
+        except Exception as e:
+            # The items themselves failed (e.g. a malformed manifest line); report it and stop feeding
+            results_queue.put(Munch(number=None, item=None, value=None, ok=False, stage="input", error=e,
+                                    _started=time.perf_counter()))
+        for _ in range(first.workers):
+            first.queue.put(_DONE)
+
+    def _work(self, stage: Stage, next_queue: queue.Queue, next_workers: int, results_queue: queue.Queue):
+        while True:
+            waited = time.perf_counter()
+            envelope = stage.queue.get()
+            started = time.perf_counter()
+            if envelope is _DONE:
+                with stage._lock:
+                    stage.idle += started - waited
+                    stage._running -= 1
+                    last = stage._running == 0
+                if last:
+                    for _ in range(next_workers):
+                        next_queue.put(_DONE)
+                return
+
+            try:
+                envelope.value = stage.fn(envelope.value)
+            except Exception as e:
+                # Any error fails this item only; the worker has to keep going for the rest
+                envelope.update(ok=False, stage=stage.name, error=e)
+            done = time.perf_counter()
+
+            (next_queue if envelope.ok else results_queue).put(envelope)
+            with stage._lock:
+                stage.idle += started - waited
+                stage.busy += done - started
+                stage.blocked += time.perf_counter() - done
+                stage.processed += 1
+                stage.failed += 0 if envelope.ok else 1
+
+    def _sample(self, finished: threading.Event):
+        next_report = time.perf_counter() + self.report_every if self.report_every else None
+        while not finished.wait(SAMPLE_INTERVAL):
+            for stage in self.stages:
+                stage.sample()
+            if next_report and time.perf_counter() >= next_report:
+                next_report += self.report_every
+                print("  " + " | ".join(f"{stage.name}: {stage.processed} done, {stage.queue.qsize()} queued"
+                                        for stage in self.stages))
+
+
+def print_stage_stats(stages: List[Munch]):
+    print(f"{'stage':<12}{'workers':>8}{'done':>8}{'failed':>8}{'per sec':>9}{'busy':>7}{'blocked s':>11}"
+          f"{'queue':>7}{'avg':>7}{'max':>6}")
+    for s in stages:
+        print(f"{s.stage:<12}{s.workers:>8}{s.processed:>8}{s.failed:>8}{s.per_sec:>9.1f}{s.utilization:>7.0%}"
+              f"{s.blocked:>11.1f}{s.queue_size:>7}{s.avg_depth:>7.1f}{s.max_depth:>6}")
+
+
+class BundlePipeline:
+    def __init__(self, client: Client, document_workers: int = 4, layout_workers: int = 1,
+                 validate_workers: int = 1, send_workers: int = 8, queue_size: int = None,
+                 fetch_urls: bool = False, is_test: bool = True, document_store: DocumentStore = None,
+                 validator: BundleValidator = DEFAULT_VALIDATOR, report_every: float = None,
+                 journal: JobJournal = None):
+        """ Builds and sends Bundles from manifest rows in four stages, each with its own workers:
+
+        documents: create the BundleHelper and fetch / read and encode its documents
+        layout: add signers and fields
+        validate: check the Bundle with a BundleValidator, so a bad row fails before it costs a request
+        send: send the Bundle
+
+        :param fetch_urls: download documents given by URL in the documents stage, instead of
+            leaving them for BlueInk to fetch
+        :param queue_size: items each stage's queue holds (default 2 * its workers)
+        :param journal: journal sends and their outcomes, skipping rows already sent by an
+            interrupted run, as BulkBundleSender does
+        """
+        self._client = client
+        self.fetch_urls = fetch_urls
+        self.validator = validator
+        self.journal = journal
+        # id(row) -> journal key, for rows in the pipeline
+        self._keys = {}
+        self.builder = BulkBundleSender(client, is_test=is_test, document_store=document_store, validator=None)
+        self.pipeline = Pipeline([
+            Stage("documents", self.documents, document_workers, queue_size),
+            Stage("layout", self.layout, layout_workers, queue_size),
+            Stage("validate", self.validate, validate_workers, queue_size),
+            Stage("send", self.send, send_workers, queue_size),
+        ], report_every=report_every)
+
+    def documents(self, row: Munch) -> tuple:
+        helper = self.builder.new_helper(row)
+        self.builder.add_documents(helper, row, fetch_urls=self.fetch_urls)
+        return row, helper
+
+    def layout(self, value: tuple) -> tuple:
+        row, helper = value
+        self.builder.add_signers_and_fields(helper, row)
+        return row, helper
+
+    def validate(self, value: tuple) -> tuple:
+        _, helper = value
+        self.validator.check(helper)
+        return value
+
+    def send(self, value: tuple):
+        row, helper = value
+        if self.journal:
+            self.journal.start(self._keys[id(row)])
+        return send_bundle_streaming(self._client, helper)
+
+    def send_all(self, rows: Iterable[Munch], on_result: Callable[[Munch], None] = None) -> Munch:
+        """Send every row. Results and the summary are shaped as for BulkBundleSender.send_all,
+        with per-stage stats added.
+        """
+        def bundle_result(result: Munch) -> Munch:
+            label = result.item.get("label") if isinstance(result.item, dict) else None
+            bundle = Munch(label=label, ok=result.ok, bundle_id=None, status=None, error=None,
+                           stage=result.stage, elapsed=result.elapsed)
+            if result.ok:
+                bundle.status = result.value.status
+                bundle.bundle_id = result.value.data.get("id")
+            elif isinstance(result.error, HTTPError) and result.error.response is not None:
+                bundle.status = result.error.response.status_code
+                bundle.error = result.error.response.text
+            else:
+                bundle.error = f"{result.stage}: {result.error}"
+            if self.journal and result.item is not None:
+                self.journal.finish(self._keys.pop(id(result.item)), bundle.ok, bundle_id=bundle.bundle_id,
+                                    status=bundle.status, error=bundle.error)
+            if on_result:
+                on_result(bundle)
+            return bundle
+
+        def unsent(journal: JobJournal):
+            for key, row in journal.todo(rows, self.builder.journal_key):
+                self._keys[id(row)] = key
+                yield row
+
+        journal = self.journal
+        skipped_before = journal.skipped if journal else 0
+        results = []
+        summary = self.pipeline.run(unsent(journal) if journal else rows,
+                                    on_result=lambda r: results.append(bundle_result(r)))
+        return Munch(sent=summary.ok,
+                     failed=summary.failed,
+                     skipped=(journal.skipped - skipped_before) if journal else 0,
+                     elapsed=summary.elapsed,
+                     bundles_per_sec=summary.items_per_sec,
+                     stages=summary.stages,
+                     results=results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send Bundles from a manifest through a staged pipeline")
+    parser.add_argument("manifest", help="Path to a .csv or .jsonl manifest")
+    parser.add_argument("--document-workers", type=int, default=4)
+    parser.add_argument("--layout-workers", type=int, default=1)
+    parser.add_argument("--validate-workers", type=int, default=1)
+    parser.add_argument("--send-workers", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, help="Items per stage queue (default 2 * the stage's workers)")
+    parser.add_argument("--fetch-urls", action="store_true", help="Download URL documents locally")
+    parser.add_argument("--rate", type=float, default=10.0, help="Max requests per second (default 10)")
+    parser.add_argument("--live", action="store_true", help="Send as live bundles instead of test bundles")
+    parser.add_argument("--report-every", type=float, default=5.0, help="Seconds between progress lines")
+    parser.add_argument("--metrics", action="store_true", help="Print per-endpoint API call metrics at exit")
+    parser.add_argument("--journal", help="Journal file; re-running with it skips Bundles already sent")
+    args = parser.parse_args()
+
+    client = Client()
+    use_pooled_transport(client, pool_maxsize=args.send_workers, print_at_exit=True)
+    metrics = instrument_client(client) if args.metrics else None
+    use_retries(client, RetryPolicy(limiter=TokenBucket(rate=args.rate), metrics=metrics))
+
+    journal = open_journal(args.journal)
+    try:
+        bundle_pipeline = BundlePipeline(client, document_workers=args.document_workers,
+                                         layout_workers=args.layout_workers, validate_workers=args.validate_workers,
+                                         send_workers=args.send_workers, queue_size=args.queue_size,
+                                         fetch_urls=args.fetch_urls, is_test=not args.live,
+                                         report_every=args.report_every, journal=journal)
+        summary = bundle_pipeline.send_all(read_manifest(args.manifest), on_result=print_result)
+    finally:
+        if journal:
+            journal.close()
+    print_summary(summary)
+    print_stage_stats(summary.stages)
@@ -0,0 +1,122 @@
+import io
+import json
+from typing import IO, Union
+
+from munch import Munch
+
+from blueink import BundleHelper
+
+try:
+    import orjson
+except ImportError:  # optional, pip install orjson
+    orjson = None
+
+# Bundle attributes kept by BundleHelper, as (payload key, BundleHelper attribute)
+_BUNDLE_ATTRIBUTES = (
+    ("label", "_label"),
+    ("in_order", "_in_order"),
+    ("email_subject", "_email_subj"),
+    ("email_message", "_email_msg"),
+    ("is_test", "_is_test"),
+    ("cc_emails", "_cc_emails"),
+    ("custom_key", "_custom_key"),
+    ("team", "_team"),
+)
+SECTIONS = ("packets", "documents", "fields", "other")
+
+
+def dumps(obj) -> bytes:
+    """Compact JSON, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class _SectionWriter:
+    def __init__(self, fh: IO):
+        """ Writes to a binary or text stream, counting the bytes written for each payload section.
+        """
+        self._write = fh.write
+        self._text = isinstance(fh, io.TextIOBase)
+        self.sizes = Munch({section: 0 for section in SECTIONS})
+
+    def write(self, data: bytes, section: str = "other"):
+        self.sizes[section] += len(data)
+        self._write(data.decode() if self._text else data)
+
+
+def _model_data(model, **kwargs) -> dict:
+    return model.dict(exclude_unset=True, exclude_none=True, **kwargs)
+
+
+def write_bundle(helper: BundleHelper, fh: IO, **additional_data) -> Munch:
+    """Write a BundleHelper's payload, as in helper.as_data(), to a stream as compact JSON.
+
+    The payload is encoded one document at a time instead of being built as one nested dict
+    first, so memory stays at about one document (i.e. its embedded file) on top of the helper
+    itself. The Bundle is not validated as a whole, as helper.as_json() does.
+
+    Returns:
+        Munch of bytes written per section: packets, documents (excluding their fields), fields
+        and other (Bundle attributes and JSON punctuation), plus the total
+    """
+    out = _SectionWriter(fh)
+
+    out.write(b'{"packets":')
+    out.write(dumps([_model_data(packet) for packet in helper._packets.values()]), "packets")
+
+    out.write(b',"documents":[')
+    for i, document in enumerate(helper._documents.values()):
+        if i:
+            out.write(b",", "documents")
+        data = _model_data(document, exclude={"fields"})
+        fields = document.fields if "fields" in document.__fields_set__ else None
+        if fields is None:
+            out.write(dumps(data), "documents")
+            continue
+
+        # The document's own keys, then its fields array in place of the closing brace
+        encoded = dumps(data)
+        out.write(encoded[:-1] + (b',"fields":' if len(encoded) > 2 else b'"fields":'), "documents")
+        out.write(dumps([_model_data(field) for field in fields]), "fields")
+        out.write(b"}", "documents")
+    out.write(b"]")
+
+    attributes = {key: getattr(helper, attr, None) for key, attr in _BUNDLE_ATTRIBUTES}
+    attributes.update(additional_data)
+    for key, value in attributes.items():
+        if value is not None:
+            out.write(b"," + dumps(key) + b":" + dumps(value))
+    out.write(b"}")
+
+    out.sizes.total = sum(out.sizes[section] for section in SECTIONS)
+    return out.sizes
+
+
+def save_bundle(helper: BundleHelper, path: str, **additional_data) -> Munch:
+    """Write a BundleHelper's payload to a file. Returns the per-section sizes, see write_bundle.
+    """
+    with open(path, "wb") as fh:
+        return write_bundle(helper, fh, **additional_data)
+
+
+class _NullStream(io.RawIOBase):
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return len(data)
+
+
+def bundle_sizes(helper: BundleHelper) -> Munch:
+    """Payload bytes per section, without keeping the payload.
+    """
+    return write_bundle(helper, _NullStream())
+
+
+def print_bundle_sizes(sizes: Union[Munch, dict]):
+    for section in SECTIONS:
+        share = sizes[section] / sizes["total"] if sizes["total"] else 0.0
+        print(f"  {section:<10}{sizes[section]:>12,} bytes {share:>7.1%}")
+    print(f"  {'total':<10}{sizes['total']:>12,} bytes")
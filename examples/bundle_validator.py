@@ -0,0 +1,202 @@
+import re
+import time
+from typing import Iterable, List
+
+from munch import Munch
+
+from examples.field_layout import DEFAULT_PAGE_HEIGHT, DEFAULT_PAGE_WIDTH
+from blueink import BundleHelper
+from blueink.constants import DELIVER_VIA
+
+ERROR = "error"
+WARNING = "warning"
+
+# Loose on purpose: only catches what the API would reject outright
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def valid_email(email: str) -> bool:
+    return bool(_EMAIL.match(email or ""))
+
+
+class BundleValidationError(ValueError):
+    def __init__(self, problems: List[Munch]):
+        errors = [p for p in problems if p.severity == ERROR]
+        super(BundleValidationError, self).__init__(
+            f"{len(errors)} problems: " + "; ".join(f"{p.where}: {p.message}" for p in errors[:5])
+            + ("; ..." if len(errors) > 5 else ""))
+        self.problems = problems
+
+
+class BundleValidator:
+    def __init__(self, page_width: float = DEFAULT_PAGE_WIDTH, page_height: float = DEFAULT_PAGE_HEIGHT):
+        """ Checks a BundleHelper locally, in one pass over its signers, documents and fields, for
+        mistakes the API would otherwise only report with an HTTP 400 after the upload:
+
+        - no documents or no signers, documents without content, file indexes without a file
+        - fields with unknown or no editors, zero / negative size, off the page, duplicate keys
+        - signers delivered by email without an email, or by phone without a phone
+        - template role assignments to unknown signers, malformed cc emails
+
+        Pure Python over the helper's state, with no I/O, so batches of thousands of Bundles a
+        second can be checked before anything is sent. Warnings (e.g. a signer with no fields)
+        don't fail a Bundle.
+        """
+        self.page_width = page_width
+        self.page_height = page_height
+
+    def problems(self, helper: BundleHelper) -> List[Munch]:
+        problems = []
+
+        def problem(where: str, code: str, message: str, severity: str = ERROR):
+            problems.append(Munch(severity=severity, code=code, where=where, message=message))
+
+        packets = helper._packets
+        if not helper._documents:
+            problem("bundle", "no_documents", "Bundle has no documents")
+        if not packets:
+            problem("bundle", "no_signers", "Bundle has no signers")
+
+        for email in helper._cc_emails or ():
+            if not valid_email(email):
+                problem("bundle", "cc_email_invalid", f"cc email '{email}' is not a valid email")
+
+        for key, packet in packets.items():
+            if packet.deliver_via == DELIVER_VIA.EMAIL and not packet.email:
+                problem(f"signer {key}", "signer_no_email", "Delivered by email but has no email")
+            elif packet.deliver_via == DELIVER_VIA.SMS and not packet.phone:
+                problem(f"signer {key}", "signer_no_phone", "Delivered by phone but has no phone")
+
+        assigned = set()
+        field_keys = set()
+        file_count = len(helper.files)
+        for doc_key, document in helper._documents.items():
+            where = f"document {doc_key}"
+            if getattr(document, "template_id", None):
+                for assignment in document.assignments or ():
+                    if assignment.signer not in packets:
+                        problem(where, "template_unknown_signer",
+                                f"Role '{assignment.role}' is assigned to unknown signer '{assignment.signer}'")
+                    assigned.add(assignment.signer)
+                continue
+
+            file_index = getattr(document, "file_index", None)
+            if file_index is not None:
+                if not 0 <= file_index < file_count:
+                    problem(where, "file_index_out_of_range", f"file_index {file_index} has no file attached")
+            elif not (getattr(document, "file_url", None) or getattr(document, "file_b64", None)):
+                problem(where, "document_no_content", "Document has no file, URL or base64 content")
+
+            for field in getattr(document, "fields", None) or ():
+                field_where = f"{where} field {field.key}"
+                if field.key in field_keys:
+                    problem(field_where, "field_duplicate_key", "Field key is used more than once")
+                field_keys.add(field.key)
+
+                if field.w <= 0 or field.h <= 0:
+                    problem(field_where, "field_zero_size", f"Field size {field.w}x{field.h} is empty")
+                elif (field.x < 0 or field.y < 0 or field.x + field.w > self.page_width
+                      or field.y + field.h > self.page_height):
+                    problem(field_where, "field_off_page",
+                            f"Field at ({field.x}, {field.y}) size {field.w}x{field.h} is off the page")
+                if field.page is not None and field.page < 1:
+                    problem(field_where, "field_bad_page", f"Page {field.page} does not exist, pages start at 1")
+                if field.v_min is not None and field.v_max is not None and field.v_min > field.v_max:
+                    problem(field_where, "field_bad_range", f"v_min {field.v_min} is above v_max {field.v_max}")
+
+                if not field.editors:
+                    problem(field_where, "field_no_editors", "Field has no editors", WARNING)
+                for editor in field.editors or ():
+                    if editor not in packets:
+                        problem(field_where, "field_unknown_editor", f"Editor '{editor}' is not a signer")
+                    assigned.add(editor)
+
+        for key in packets.keys() - assigned:
+            problem(f"signer {key}", "signer_no_fields", "Signer has no fields to fill in", WARNING)
+
+        return problems
+
+    def errors(self, helper: BundleHelper) -> List[Munch]:
+        return [p for p in self.problems(helper) if p.severity == ERROR]
+
+    def check(self, helper: BundleHelper) -> List[Munch]:
+        """Raise BundleValidationError if the Bundle has errors, otherwise return its warnings.
+        """
+        problems = self.problems(helper)
+        if any(p.severity == ERROR for p in problems):
+            raise BundleValidationError(problems)
+        return problems
+
+    def validate_all(self, helpers: Iterable[BundleHelper]) -> Munch:
+        """Batch mode: check many Bundles.
+
+        Returns:
+            Munch with valid / invalid counts, elapsed seconds, bundles_per_sec, a problem code
+            -> count histogram and (index, errors) for each invalid Bundle
+        """
+        started = time.perf_counter()
+        invalid = []
+        codes = {}
+        count = 0
+        for i, helper in enumerate(helpers):
+            count += 1
+            errors = self.errors(helper)
+            for p in errors:
+                codes[p.code] = codes.get(p.code, 0) + 1
+            if errors:
+                invalid.append((i, errors))
+        elapsed = time.perf_counter() - started
+        return Munch(valid=count - len(invalid),
+                     invalid=len(invalid),
+                     elapsed=elapsed,
+                     bundles_per_sec=count / elapsed if elapsed else 0.0,
+                     codes=codes,
+                     failures=invalid)
+
+
+DEFAULT_VALIDATOR = BundleValidator()
+
+
+def validate_bundle(helper: BundleHelper) -> List[Munch]:
+    """All problems (errors and warnings) with a BundleHelper, using the default 100 x 100 page.
+    """
+    return DEFAULT_VALIDATOR.problems(helper)
+
+
+def check_bundle(helper: BundleHelper) -> List[Munch]:
+    """Raise BundleValidationError if the BundleHelper has errors, otherwise return its warnings.
+    """
+    return DEFAULT_VALIDATOR.check(helper)
+
+
+def print_problems(problems: List[Munch]):
+    for p in problems:
+        marker = "-" if p.severity == ERROR else "!"
+        print(f"  {marker} {p.where}: {p.message} ({p.code})")
+
+
+if __name__ == "__main__":
+    import argparse
+    from examples.bulk_send import BulkBundleSender, read_manifest
+    from blueink import Client
+
+    parser = argparse.ArgumentParser(description="Check every Bundle of a manifest locally, without sending anything")
+    parser.add_argument("manifest", help="Path to a .csv or .jsonl manifest")
+    args = parser.parse_args()
+
+    builder = BulkBundleSender(Client(private_api_key="validate-only"), validator=None)
+    helpers, build_errors = [], []
+    for number, row in enumerate(read_manifest(args.manifest), start=1):
+        try:
+            helpers.append((number, builder.build_helper(row)))
+        except (ValueError, RuntimeError, OSError) as e:
+            build_errors.append((number, e))
+
+    summary = DEFAULT_VALIDATOR.validate_all(helper for _, helper in helpers)
+    for number, error in build_errors:
+        print(f"Row {number} can't be built: {error}")
+    for i, errors in summary.failures:
+        print(f"Row {helpers[i][0]} ({helpers[i][1]._label}):")
+        print_problems(errors)
+    print(f"Valid: {summary.valid}, Invalid: {summary.invalid + len(build_errors)}, "
+          f"{summary.bundles_per_sec:,.0f} Bundles/sec, problems: {summary.codes}")
@@ -0,0 +1,139 @@
+import base64
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from typing import Union
+
+from munch import Munch
+
+from blueink import BundleHelper
+from blueink.model.bundles import Document
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class DocumentStore:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        """ Content-addressed, in-memory store of document payloads, keyed by SHA-256.
+
+        Each file is read and base64 encoded once; every BundleHelper the document is attached to
+        then references the same payload. Entries are evicted least-recently-used once the total
+        size (raw + encoded) exceeds max_bytes. Safe to share between threads.
+
+        put_bytes / put_path return the entry itself, and attach / b64 / open take it, so a
+        document added by one worker stays usable by it even if another worker's put evicts it
+        from the store in between.
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        # (path, mtime, size) -> digest, so re-adding an unchanged file doesn't even re-hash it
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    def put_bytes(self, data: bytes, filename: str, mime_type: str = None) -> Munch:
+        """Add a document's content, returning its entry (with its SHA-256 digest).
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            entry = self._entries[digest] = Munch(digest=digest,
+                                                  data=bytes(data),
+                                                  b64=None,
+                                                  filename=filename,
+                                                  mime_type=mime_type or mimetypes.guess_type(filename)[0],
+                                                  size=len(data))
+            self.size += len(data)
+            self._evict(keep=digest)
+        return entry
+
+    def put_path(self, path: str, mime_type: str = None) -> Munch:
+        """Add a local file, reading it only if this path / version hasn't been seen before.
+        """
+        stat = os.stat(path)
+        path_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(self._paths.get(path_key))
+            if entry is not None:
+                self._entries.move_to_end(entry.digest)
+                self.hits += 1
+                return entry
+
+        with open(path, "rb") as fh:
+            entry = self.put_bytes(fh.read(), os.path.basename(path), mime_type)
+
+        with self._lock:
+            self._paths[path_key] = entry.digest
+        return entry
+
+    def entry(self, document: Union[str, Munch]) -> Munch:
+        """The entry for a digest (KeyError once evicted), or the given entry itself.
+        """
+        if isinstance(document, Munch):
+            return document
+        with self._lock:
+            entry = self._entries[document]
+            self._entries.move_to_end(document)
+            return entry
+
+    def b64(self, document: Union[str, Munch]) -> str:
+        """The base64 payload for a document, encoded on first use and cached from then on.
+        """
+        entry = self.entry(document)
+        if entry.b64 is None:
+            encoded = base64.b64encode(entry.data).decode("ascii")
+            with self._lock:
+                if entry.b64 is None:
+                    entry.b64 = encoded
+                    entry.size += len(encoded)
+                    # An entry evicted meanwhile no longer counts towards the store's size
+                    if self._entries.get(entry.digest) is entry:
+                        self.size += len(encoded)
+                        self._evict(keep=entry.digest)
+        return entry.b64
+
+    def open(self, document: Union[str, Munch]) -> io.BufferedReader:
+        """A fresh file handle over the cached bytes (no copy), e.g. for a multipart upload.
+        """
+        data = self.entry(document).data
+        return io.BufferedReader(io.BytesIO(data), max(1, len(data)))
+
+    def attach(self, helper: BundleHelper, document: Union[str, Munch], key: str = None,
+               **additional_data) -> str:
+        """Add a stored document (an entry from put_*, or a digest) to a BundleHelper as an embedded
+        base64 payload, returning its doc key.
+
+        The payload string is shared, not copied, between all helpers it is attached to.
+        """
+        entry = self.entry(document)
+        document = Document.create(key=key,
+                                   file_b64=self.b64(entry),
+                                   filename=entry.filename,
+                                   **additional_data)
+        # BundleHelper (v0.9.3) has no public method for base64 documents
+        helper._documents[document.key] = document
+        return document.key
+
+    def _evict(self, keep: str = None):
+        # Caller holds the lock
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            digest, entry = next(iter(self._entries.items()))
+            if digest == keep:
+                self._entries.move_to_end(digest)
+                continue
+            del self._entries[digest]
+            self.size -= entry.size
+            self.evictions += 1
@@ -1,7 +1,38 @@
+import hashlib
+import os
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Callable, Dict, List, Optional
 from munch import Munch
 
+from examples.input_source import ask
+
+# Where examples keep local caches / mirrors of account data
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "blueink-examples")
+
+# Menu states every example has
+MENU = "menu"
+EXIT = "exit"
+
+
+class MenuStateMachine:
+    def __init__(self, states: Dict[str, Callable[[], Optional[str]]], initial: str = MENU):
+        """ Runs an interactive menu as a loop over explicit states.
+
+        Each state is a callable that does its work and returns the name of the next state;
+        returning None goes back to the initial state, and EXIT ends the session. No state calls
+        another, so the stack stays flat however long the session runs.
+        """
+        self.states = states
+        self.initial = initial
+
+    def run(self):
+        state = self.initial
+        while state != EXIT:
+            handler = self.states.get(state)
+            if handler is None:
+                raise ValueError(f"Unknown menu state '{state}'")
+            state = handler() or self.initial
+
 
 class BaseExample(ABC):
     @abstractmethod
@@ -11,28 +42,37 @@ class BaseExample(ABC):
         raise RuntimeError("Unimplemented 'start' method on example")
 
     @abstractmethod
-    def main_router(self):
+    def main_router(self) -> str:
         """Main Menu of the example
-        :return:
+        :return: the next state, i.e. the chosen option
         """
         raise RuntimeError("Unimplemented 'main_router' method on example")
 
+    @abstractmethod
+    def menu_states(self) -> Dict[str, Callable[[], Optional[str]]]:
+        """Menu state name -> handler, for every state besides MENU
+        """
+        raise RuntimeError("Unimplemented 'menu_states' method on example")
+
+    def run_menu(self):
+        MenuStateMachine({MENU: self.main_router, **self.menu_states()}).run()
+
 
 def interactive_text_input(prompt: str, default: str = None, allow_blank=True) -> str:
-    value = input(f"{prompt} [{default}]: ")
+    while True:
+        value = ask(prompt, default)
 
-    if not value or value == "":
-        value = default
+        if not value or value == "":
+            value = default
 
-    if not allow_blank and (value is None or value == ""):
-        print("** Blank value is NOT allowed **")
-        return interactive_text_input(prompt, default, allow_blank)
+        if allow_blank or (value is not None and value != ""):
+            return value
 
-    return value
+        print("** Blank value is NOT allowed **")
 
 
 def interactive_yes_no_input(prompt: str, default: str = "n") -> bool:
-    value = input(f"{prompt} [{default}]: ")
+    value = ask(prompt, default)
 
     if not value or value == "":
         value = default
@@ -47,30 +87,44 @@ def input_choices(header: str, end_prompt: str, choices, default: int):
     # Choices can either be a straight list or dict. If a dict,
     # displayed by key but returns value. If a list, returns whatever
     # list element is chosen
-    print(header)
     if type(choices) == dict or type(choices) == Munch:
-        ordered_keys = list(choices.keys())
-        answers = list([choices[key] for key in ordered_keys])
-        for i, key in enumerate(ordered_keys):
-            print(f"{i + 1}) {answers[i]}")
+        answers = list(choices.values())
     else:
-        answers = choices
+        answers = list(choices)
+
+    while True:
+        print(header)
         for i, choice in enumerate(answers):
             print(f"{i + 1}) {choice}")
 
-    print(f"To pick, enter a number of a selection above, from 1 to {len(choices)}")
+        print(f"To pick, enter a number of a selection above, from 1 to {len(answers)}")
+
+        try:
+            value = int(interactive_text_input(end_prompt, default))
+        except (TypeError, ValueError):
+            print(f"** Invalid Selection, must be a number. Try again **")
+            continue
+
+        if value < 1 or value > len(answers):
+            print(f"** Invalid Selection. Try again **")
+            continue
+
+        return answers[value - 1]
+
 
-    try:
-        value = int(interactive_text_input(end_prompt, default))
-    except ValueError:
-        print(f"** Invalid Selection, must be a number. Try again **")
-        return input_choices(header, end_prompt, choices, default)
+def interactive_int_input(prompt: str, default: int, minimum: int = None) -> int:
+    while True:
+        try:
+            value = int(interactive_text_input(prompt, default, allow_blank=False))
+        except (TypeError, ValueError):
+            print(f"** Invalid value, must be a whole number. Try again **")
+            continue
 
-    if value < 1 or value > (len(choices) + 1):
-        print(f"** Invalid Selection. Try again **")
-        return input_choices(header, end_prompt, choices, default)
+        if minimum is not None and value < minimum:
+            print(f"** Invalid value, must be at least {minimum}. Try again **")
+            continue
 
-    return list(answers)[int(value - 1)]
+        return value
 
 
 def interactive_list_entry(init_message: str, additional_msg: str, default: str) -> \
@@ -115,3 +169,23 @@ def interactive_dict_entry(init_message: str, additional_msg: str, default: str)
         map[add_key] = add_val
 
     return map
+
+
+def account_key(client) -> str:
+    """Stable, non-reversible key for the account (API key + base URL) a Client talks to.
+
+    Used to keep local caches of different accounts apart.
+    """
+    private_api_key = client._request_helper._private_api_key
+    base_url = client.bundles._base_url
+    return hashlib.sha256(f"{base_url}|{private_api_key}".encode()).hexdigest()[:16]
+
+
+def install_request_helper(client, request_helper):
+    """Swap the RequestHelper a Client (and each of its sub-clients) sends requests through.
+
+    Used to layer pooling, retries and instrumentation over the stock transport.
+    """
+    client._request_helper = request_helper
+    for sub_client in (client.bundles, client.persons, client.packets, client.templates):
+        sub_client._requests = request_helper
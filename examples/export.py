@@ -0,0 +1,65 @@
+import csv
+import json
+from typing import IO, Iterable, Sequence
+
+from blueink import Client
+from examples.pagination import PrefetchingPagedIterator, iter_items
+
+DEFAULT_BUNDLE_CSV_COLUMNS = ("id", "label", "status", "created", "sent", "completed_at",
+                              "custom_key", "is_test")
+EXPORT_FORMATS = ("jsonl", "csv")
+
+
+def export_jsonl(items: Iterable[dict], fh: IO[str]) -> int:
+    """Write each item as one compact JSON line. Returns the number of items written.
+    """
+    count = 0
+    for item in items:
+        fh.write(json.dumps(item, separators=(",", ":"), default=str))
+        fh.write("\n")
+        count += 1
+    return count
+
+
+def export_csv(items: Iterable[dict], fh: IO[str],
+               columns: Sequence[str] = DEFAULT_BUNDLE_CSV_COLUMNS) -> int:
+    """Write the given columns of each item as a CSV row. Returns the number of items written.
+    """
+    writer = csv.DictWriter(fh, fieldnames=columns, extrasaction="ignore", restval="")
+    writer.writeheader()
+    count = 0
+    for item in items:
+        writer.writerow(item)
+        count += 1
+    return count
+
+
+def iter_bundles(client: Client, per_page: int = 100, window: int = 1, **query_params):
+    """Yield every Bundle on the account, one at a time, across all pages.
+
+    With window > 1 the following pages are prefetched concurrently. A page that fails raises
+    its HTTPError, rather than quietly ending the listing early.
+    """
+    pages = PrefetchingPagedIterator(client.bundles.list,
+                                     per_page=per_page,
+                                     window=window,
+                                     raise_errors=True,
+                                     **query_params)
+    return iter_items(pages)
+
+
+def export_bundles(client: Client, path: str, fmt: str = None, window: int = 4, **query_params) -> int:
+    """Stream every Bundle (optionally filtered by query params, e.g. status) to a JSONL or CSV file.
+
+    The format is taken from the file extension unless given. Returns the number of Bundles written.
+    Raises HTTPError if a page fails, leaving a partial file behind.
+    """
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', must be one of {EXPORT_FORMATS}")
+
+    bundles = iter_bundles(client, window=window, **query_params)
+    with open(path, "w", newline="") as fh:
+        if fmt == "csv":
+            return export_csv(bundles, fh)
+        return export_jsonl(bundles, fh)
@@ -0,0 +1,192 @@
+import math
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from munch import Munch
+
+from blueink import BundleHelper
+
+# BlueInk field positions / sizes are percentages of the page
+DEFAULT_PAGE_WIDTH = 100
+DEFAULT_PAGE_HEIGHT = 100
+DEFAULT_CELL_SIZE = 10
+
+SPEC_COLUMNS = ("x", "y", "w", "h", "page", "kind", "editors", "label", "key")
+REQUIRED_SPEC_COLUMNS = ("x", "y", "w", "h", "kind")
+
+
+class LayoutError(ValueError):
+    def __init__(self, report: Munch):
+        super(LayoutError, self).__init__(
+            f"{len(report.invalid)} invalid fields, {len(report.out_of_bounds)} fields out of bounds, "
+            f"{len(report.overlaps)} overlapping pairs")
+        self.report = report
+
+
+class SpatialIndex:
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE, page_width: float = DEFAULT_PAGE_WIDTH,
+                 page_height: float = DEFAULT_PAGE_HEIGHT):
+        """ Uniform grid over a page: each rectangle is bucketed into every cell it touches, so an
+        overlap query only compares against rectangles sharing a cell instead of the whole page.
+
+        Cell ranges are clamped to the page's grid, so a rectangle hanging off the page (or with a
+        huge size) lands in the edge cells instead of spanning an unbounded number of them.
+        """
+        self.cell_size = cell_size
+        self._last_cx = max(int(page_width // cell_size), 0)
+        self._last_cy = max(int(page_height // cell_size), 0)
+        self._cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._rects: Dict[int, Tuple[float, float, float, float]] = {}
+
+    def _cells_for(self, x, y, w, h):
+        size, last_cx, last_cy = self.cell_size, self._last_cx, self._last_cy
+        first_x = min(max(int(x // size), 0), last_cx)
+        first_y = min(max(int(y // size), 0), last_cy)
+        for cx in range(first_x, min(max(int((x + w) // size), 0), last_cx) + 1):
+            for cy in range(first_y, min(max(int((y + h) // size), 0), last_cy) + 1):
+                yield cx, cy
+
+    def query(self, x, y, w, h) -> List[int]:
+        """Ids of indexed rectangles overlapping this one (edges merely touching don't count).
+        """
+        found = set()
+        for cell in self._cells_for(x, y, w, h):
+            for rect_id in self._cells.get(cell, ()):
+                if rect_id in found:
+                    continue
+                ox, oy, ow, oh = self._rects[rect_id]
+                if x < ox + ow and ox < x + w and y < oy + oh and oy < y + h:
+                    found.add(rect_id)
+        return sorted(found)
+
+    def insert(self, rect_id: int, x, y, w, h):
+        self._rects[rect_id] = (x, y, w, h)
+        for cell in self._cells_for(x, y, w, h):
+            self._cells[cell].append(rect_id)
+
+
+def _columns(spec: dict) -> Munch:
+    """Validate a column-oriented field spec and broadcast scalar columns to its length.
+
+    Any column may be a scalar, applying to every field (a spec of only scalars is one field).
+    editors is a list per field, so its column is a list of lists; a single string is one editor
+    for every field. A flat list of strings would be ambiguous, and is rejected.
+    """
+    missing = [c for c in REQUIRED_SPEC_COLUMNS if c not in spec]
+    if missing:
+        raise ValueError(f"Field spec is missing columns: {missing}")
+
+    unknown = set(spec) - set(SPEC_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown field spec columns: {sorted(unknown)}")
+
+    columns = Munch(page=1, editors=[], label=None, key=None)
+    columns.update(spec)
+    editors = columns.editors
+    if isinstance(editors, (list, tuple)) and editors and all(isinstance(e, str) for e in editors):
+        raise ValueError(f"Field spec editors {list(editors)} is ambiguous: give one editor for every "
+                         f"field as a string, or a list of editors per field, e.g. [{list(editors)}]")
+
+    is_column = {name: isinstance(columns[name], (list, tuple)) for name in SPEC_COLUMNS}
+    # A string, or no editors at all, applies to every field
+    is_column["editors"] = isinstance(editors, (list, tuple)) and bool(editors)
+    if isinstance(editors, str):
+        columns.editors = [editors]
+    length = next((len(columns[name]) for name in SPEC_COLUMNS if is_column[name]), 1)
+    for name in SPEC_COLUMNS:
+        value = columns[name]
+        if not is_column[name]:
+            columns[name] = [value] * length
+        elif len(value) != length:
+            raise ValueError(f"Field spec column '{name}' has {len(value)} entries, expected {length}")
+    return columns
+
+
+class FieldLayout:
+    def __init__(self, page_width: float = DEFAULT_PAGE_WIDTH, page_height: float = DEFAULT_PAGE_HEIGHT,
+                 cell_size: float = DEFAULT_CELL_SIZE):
+        """ Places many fields at once, checking them against a per-document, per-page spatial index.
+
+        The layout remembers every field it has placed, so later batches (or single fields) are
+        checked against earlier ones too. Use one FieldLayout per BundleHelper.
+        """
+        self.page_width = page_width
+        self.page_height = page_height
+        self.cell_size = cell_size
+
+        self._indexes: Dict[Tuple[str, int], SpatialIndex] = {}
+        # rect id -> key of the placed field
+        self._placed: List[str] = []
+
+    def check(self, doc_key: str, spec: dict) -> Munch:
+        """Report problems with a field spec without placing anything.
+
+        Returns:
+            Munch with out_of_bounds (spec row numbers), overlaps ((row, other) pairs, where
+            other is a row number in this spec or the key of an already placed field) and
+            invalid (row, message) pairs for zero / negative sizes.
+        """
+        return self._check(doc_key, _columns(spec))
+
+    def add_fields(self, helper: BundleHelper, doc_key: str, spec: dict, strict: bool = True) -> Munch:
+        """Add every field of a column-oriented spec to a document in one pass.
+
+        spec = {"x": [10, 10, 60], "y": [80, 85, 80], "w": 30, "h": 4, "page": [1, 1, 2],
+                "kind": ["sig", "sdt", "ini"], "editors": "signer-1"}
+
+        Scalar columns (and an editors string) apply to every field. With strict=True nothing is
+        added if any field is invalid, out of bounds or overlapping, and a LayoutError is raised.
+
+        Returns:
+            The check report, plus `field_keys`: the field keys in spec order
+        """
+        columns = _columns(spec)
+        report = self._check(doc_key, columns)
+        if strict and (report.out_of_bounds or report.overlaps or report.invalid):
+            raise LayoutError(report)
+
+        report.field_keys = []
+        for x, y, w, h, page, kind, editors, label, key in zip(*(columns[c] for c in SPEC_COLUMNS)):
+            report.field_keys.append(helper.add_field(doc_key, x, y, w, h, page, kind,
+                                                editors=list(editors), label=label, key=key))
+
+        self._commit(doc_key, columns, report.field_keys)
+        return report
+
+    def _check(self, doc_key: str, columns: Munch) -> Munch:
+        report = Munch(out_of_bounds=[], overlaps=[], invalid=[])
+        # Rows of this batch go into their own per-page index, so they are checked against each
+        # other as well as against the fields placed earlier
+        batch: Dict[int, SpatialIndex] = {}
+
+        for row, (x, y, w, h, page) in enumerate(zip(columns.x, columns.y, columns.w, columns.h, columns.page)):
+            if not all(math.isfinite(v) for v in (x, y, w, h)):
+                report.invalid.append((row, "position and size must be finite numbers"))
+                continue
+            if w <= 0 or h <= 0:
+                report.invalid.append((row, "width and height must be positive"))
+                continue
+            if x < 0 or y < 0 or x + w > self.page_width or y + h > self.page_height or page < 1:
+                report.out_of_bounds.append(row)
+
+            placed = self._indexes.get((doc_key, page))
+            if placed is not None:
+                report.overlaps.extend((row, self._placed[other]) for other in placed.query(x, y, w, h))
+
+            page_batch = batch.get(page)
+            if page_batch is None:
+                page_batch = batch[page] = SpatialIndex(self.cell_size, self.page_width, self.page_height)
+            report.overlaps.extend((row, other) for other in page_batch.query(x, y, w, h))
+            page_batch.insert(row, x, y, w, h)
+
+        return report
+
+    def _commit(self, doc_key: str, columns: Munch, keys: List[str]):
+        for x, y, w, h, page, key in zip(columns.x, columns.y, columns.w, columns.h, columns.page, keys):
+            self._placed.append(key)
+            if w > 0 and h > 0 and all(math.isfinite(v) for v in (x, y, w, h)):
+                index = self._indexes.get((doc_key, page))
+                if index is None:
+                    index = self._indexes[(doc_key, page)] = SpatialIndex(self.cell_size, self.page_width,
+                                                                          self.page_height)
+                index.insert(len(self._placed) - 1, x, y, w, h)
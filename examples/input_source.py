@@ -0,0 +1,142 @@
+import contextlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, List, Optional
+
+from munch import Munch
+
+
+class ScriptExhausted(EOFError):
+    """A scripted input source has no answers left."""
+
+
+class ReplayMismatch(RuntimeError):
+    """A replayed answer was recorded for a different prompt than the one being asked."""
+
+
+class InputSource(ABC):
+    @abstractmethod
+    def ask(self, prompt: str, default=None) -> str:
+        """Answer one prompt. A blank answer means "use the default", as at the console.
+        """
+        raise NotImplementedError
+
+
+class ConsoleInput(InputSource):
+    def ask(self, prompt: str, default=None) -> str:
+        return input(f"{prompt} [{default}]: ")
+
+
+class ReplayInput(InputSource):
+    def __init__(self, answers: Iterable[dict], check_prompts: bool = True, echo: bool = False):
+        """ Answers prompts from a recorded script of {"prompt": ..., "answer": ...} steps.
+
+        :param check_prompts: raise ReplayMismatch when a step was recorded for another prompt,
+            i.e. the flow has diverged from the recording
+        :param echo: print each prompt and answer, like a console session
+        """
+        self._steps = iter(answers)
+        self.check_prompts = check_prompts
+        self.echo = echo
+
+    def ask(self, prompt: str, default=None) -> str:
+        step = next(self._steps, None)
+        if step is None:
+            raise ScriptExhausted(f"No recorded answer left for '{prompt}'")
+        if self.check_prompts and step.get("prompt") not in (None, prompt):
+            raise ReplayMismatch(f"Expected prompt '{step['prompt']}', got '{prompt}'")
+        if self.echo:
+            print(f"{prompt} [{default}]: {step['answer']}")
+        return step["answer"]
+
+
+class GeneratedInput(InputSource):
+    def __init__(self, answer: Callable[[str, object, int], str], max_steps: int = 1000):
+        """ Answers prompts with answer(prompt, default, step), e.g. to fuzz or randomly walk the menus.
+
+        Raises ScriptExhausted after max_steps answers, so a walk that never exits still ends.
+        """
+        self._answer = answer
+        self.max_steps = max_steps
+        self._step = 0
+
+    def ask(self, prompt: str, default=None) -> str:
+        if self._step >= self.max_steps:
+            raise ScriptExhausted(f"Generated {self.max_steps} answers")
+        self._step += 1
+        return self._answer(prompt, default, self._step)
+
+
+class RecordingInput(InputSource):
+    def __init__(self, inner: InputSource):
+        """ Records every prompt and answer passing through another InputSource, with timings.
+
+        Each step gets `wait`, the seconds spent waiting for the answer, and `work`, the seconds
+        from the answer until the next prompt (or finish()), i.e. the time the example spent
+        acting on it.
+        """
+        self._inner = inner
+        self.steps: List[Munch] = []
+        self._answered_at: Optional[float] = None
+
+    def ask(self, prompt: str, default=None) -> str:
+        asked_at = time.perf_counter()
+        self._close_step(asked_at)
+        answer = self._inner.ask(prompt, default)
+        self._answered_at = time.perf_counter()
+        self.steps.append(Munch(step=len(self.steps) + 1, prompt=prompt, answer=answer,
+                                wait=self._answered_at - asked_at, work=None))
+        return answer
+
+    def finish(self):
+        """Close the timing of the last step, at the end of the session.
+        """
+        self._close_step(time.perf_counter())
+
+    def _close_step(self, now: float):
+        if self._answered_at is not None:
+            self.steps[-1].work = now - self._answered_at
+            self._answered_at = None
+
+    def save(self, path: str):
+        save_script(self.steps, path)
+
+
+def save_script(steps: Iterable[dict], path: str):
+    """Write recorded steps as a JSONL script for ReplayInput.
+    """
+    with open(path, "w") as fh:
+        for step in steps:
+            fh.write(json.dumps({"prompt": step["prompt"], "answer": step["answer"]}) + "\n")
+
+
+def load_script(path: str) -> List[dict]:
+    with open(path) as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+_CONSOLE = ConsoleInput()
+# Per thread, so concurrent sessions can each be driven by their own source
+_current = threading.local()
+
+
+def current_input_source() -> InputSource:
+    return getattr(_current, "source", None) or _CONSOLE
+
+
+@contextlib.contextmanager
+def use_input_source(source: InputSource):
+    """Answer the interactive prompts of this thread from `source` within the block.
+    """
+    previous = getattr(_current, "source", None)
+    _current.source = source
+    try:
+        yield source
+    finally:
+        _current.source = previous
+
+
+def ask(prompt: str, default=None) -> str:
+    return current_input_source().ask(prompt, default)
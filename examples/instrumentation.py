@@ -0,0 +1,236 @@
+import atexit
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+from urllib.parse import urlparse
+
+from munch import Munch
+from requests import HTTPError, RequestException
+
+from examples.example_utils import install_request_helper
+from blueink import Client, endpoints
+from blueink.request_helper import NormalizedResponse, RequestHelper
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ENDPOINT_NAMESPACES = (endpoints.BUNDLES, endpoints.PERSONS, endpoints.PACKETS, endpoints.TEMPLATES)
+# Endpoint names that only make sense for a given HTTP method; anything else is a GET
+METHOD_ENDPOINT_NAMES = {
+    "post": ("CREATE", "EMBED_URL"),
+    "put": ("UPDATE", "CANCEL", "REMIND"),
+    "patch": ("UPDATE",),
+    "delete": ("DELETE",),
+}
+
+
+def _endpoint_patterns():
+    patterns = []
+    for namespace in ENDPOINT_NAMESPACES:
+        for name, template in vars(namespace).items():
+            if name.isupper() and isinstance(template, str):
+                regex = re.sub(r"\\\$\\\{\w+\\\}", "[^/]+", re.escape(template))
+                patterns.append((re.compile(regex + "$"), f"{namespace.__name__}.{name}", template))
+    # Most specific (longest) templates first, so /bundles/x/events/ isn't taken for /bundles/x/
+    patterns.sort(key=lambda p: len(p[2]), reverse=True)
+    return patterns
+
+
+ENDPOINT_PATTERNS = _endpoint_patterns()
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """Name of the blueink.endpoints entry a request is for, e.g. 'BUNDLES.LIST' or 'PERSONS.UPDATE'.
+    """
+    method = method.lower()
+    path = urlparse(url).path
+    candidates = [name for regex, name, _ in ENDPOINT_PATTERNS if regex.search(path)]
+    method_names = METHOD_ENDPOINT_NAMES.get(method)
+    all_method_names = {n for names in METHOD_ENDPOINT_NAMES.values() for n in names}
+    for name in candidates:
+        short_name = name.split(".", 1)[1]
+        if method_names and short_name in method_names:
+            return name
+        if not method_names and short_name not in all_method_names:
+            return name
+    return candidates[0] if candidates else f"{method.upper()} {path}"
+
+
+class EndpointStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.statuses = Counter()
+
+
+class ClientMetrics:
+    def __init__(self):
+        """ Per-endpoint latency histograms, byte counts, retries and status codes for Client calls.
+
+        Observers added with add_observer() are called with a Munch for every request, so other
+        sinks (logs, StatsD, ...) can be plugged in. Safe to share between threads.
+        """
+        self._lock = threading.Lock()
+        self._endpoints = defaultdict(EndpointStats)
+        self._observers: List[Callable[[Munch], None]] = []
+
+    def add_observer(self, observer: Callable[[Munch], None]):
+        self._observers.append(observer)
+
+    def observe(self, endpoint: str, status, latency: float, bytes_out: int = 0, bytes_in: int = 0):
+        with self._lock:
+            stats = self._endpoints[endpoint]
+            stats.count += 1
+            stats.latency_sum += latency
+            stats.latency_max = max(stats.latency_max, latency)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    stats.buckets[i] += 1
+                    break
+            stats.bytes_out += bytes_out
+            stats.bytes_in += bytes_in
+            stats.statuses[str(status)] += 1
+            if not isinstance(status, int) or status >= 400:
+                stats.errors += 1
+
+        for observer in self._observers:
+            observer(Munch(endpoint=endpoint, status=status, latency=latency,
+                           bytes_out=bytes_out, bytes_in=bytes_in))
+
+    def record_retry(self, endpoint: str):
+        with self._lock:
+            self._endpoints[endpoint].retries += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: stats for name, stats in sorted(self._endpoints.items())}
+
+    def to_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP blueink_client_request_duration_seconds BlueInk API request latency",
+            "# TYPE blueink_client_request_duration_seconds histogram",
+        ]
+        snapshot = self.snapshot()
+        for name, stats in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(f'blueink_client_request_duration_seconds_bucket{{endpoint="{name}",le="{bound}"}} '
+                             f'{cumulative}')
+            lines.append(f'blueink_client_request_duration_seconds_bucket{{endpoint="{name}",le="+Inf"}} {stats.count}')
+            lines.append(f'blueink_client_request_duration_seconds_sum{{endpoint="{name}"}} {stats.latency_sum}')
+            lines.append(f'blueink_client_request_duration_seconds_count{{endpoint="{name}"}} {stats.count}')
+
+        lines += ["# HELP blueink_client_requests_total BlueInk API requests by status code",
+                  "# TYPE blueink_client_requests_total counter"]
+        for name, stats in snapshot.items():
+            for status, count in sorted(stats.statuses.items()):
+                lines.append(f'blueink_client_requests_total{{endpoint="{name}",status="{status}"}} {count}')
+
+        lines += ["# HELP blueink_client_bytes_total BlueInk API request / response body bytes",
+                  "# TYPE blueink_client_bytes_total counter"]
+        for name, stats in snapshot.items():
+            lines.append(f'blueink_client_bytes_total{{endpoint="{name}",direction="out"}} {stats.bytes_out}')
+            lines.append(f'blueink_client_bytes_total{{endpoint="{name}",direction="in"}} {stats.bytes_in}')
+
+        lines += ["# HELP blueink_client_retries_total BlueInk API request retries",
+                  "# TYPE blueink_client_retries_total counter"]
+        for name, stats in snapshot.items():
+            lines.append(f'blueink_client_retries_total{{endpoint="{name}"}} {stats.retries}')
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Human readable table, slowest endpoints (by total time) first.
+        """
+        rows = sorted(self.snapshot().items(), key=lambda item: item[1].latency_sum, reverse=True)
+        lines = [f"{'endpoint':<24}{'calls':>7}{'errors':>7}{'retries':>8}{'total s':>9}{'avg ms':>9}"
+                 f"{'max ms':>9}{'KB out':>9}{'KB in':>9}"]
+        for name, s in rows:
+            lines.append(f"{name:<24}{s.count:>7}{s.errors:>7}{s.retries:>8}{s.latency_sum:>9.2f}"
+                         f"{s.latency_sum / s.count * 1000 if s.count else 0:>9.1f}{s.latency_max * 1000:>9.1f}"
+                         f"{s.bytes_out / 1024:>9.1f}{s.bytes_in / 1024:>9.1f}")
+        return "\n".join(lines)
+
+    def print_summary(self):
+        if self.snapshot():
+            print("\nBlueInk API calls:")
+            print(self.summary())
+
+
+def _body_size(body) -> int:
+    if body is None:
+        return 0
+    try:
+        return len(body)
+    except TypeError:
+        return 0
+
+
+class InstrumentedRequestHelper(RequestHelper):
+    def __init__(self, inner: RequestHelper, metrics: ClientMetrics):
+        """ RequestHelper that times every request made through an inner RequestHelper.
+        """
+        super().__init__(inner._private_api_key)
+        self._inner = inner
+        self.metrics = metrics
+
+    def _make_request(self, method, url, **kwargs) -> NormalizedResponse:
+        endpoint = endpoint_name(method, url)
+        started = time.perf_counter()
+        try:
+            response = self._inner._make_request(method, url, **kwargs)
+        except HTTPError as e:
+            latency = time.perf_counter() - started
+            sent = _body_size(e.request.body) if e.request is not None else 0
+            received = len(e.response.content) if e.response is not None else 0
+            self.metrics.observe(endpoint, e.response.status_code if e.response is not None else "error",
+                                 latency, sent, received)
+            raise
+        except RequestException:
+            self.metrics.observe(endpoint, "error", time.perf_counter() - started)
+            raise
+
+        latency = time.perf_counter() - started
+        self.metrics.observe(endpoint, response.status, latency,
+                             _body_size(response.request.body), len(response.original_response.content))
+        return response
+
+
+def instrument_client(client: Client, metrics: ClientMetrics = None, print_at_exit: bool = True) -> ClientMetrics:
+    """Record metrics for every call the Client makes from now on. Returns the ClientMetrics.
+    """
+    metrics = metrics or ClientMetrics()
+    install_request_helper(client, InstrumentedRequestHelper(client._request_helper, metrics))
+    if print_at_exit:
+        atexit.register(metrics.print_summary)
+    return metrics
+
+
+def start_metrics_server(metrics: ClientMetrics, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve metrics.to_prometheus() at http://host:port/metrics from a background thread.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,192 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from munch import Munch
+
+STARTED = "started"
+DONE = "done"
+FAILED = "failed"
+# Rewrite the journal on open once it has this many lines per key it tracks (a finished
+# operation leaves two: started and its outcome)
+COMPACT_RATIO = 1.5
+
+
+def content_key(item) -> str:
+    """Stable idempotency key for a manifest row or record: the hash of its canonical JSON.
+    """
+    return hashlib.sha1(json.dumps(item, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class JobJournal:
+    def __init__(self, path: str, fsync: bool = False):
+        """ Append-only, crash-safe record of a bulk job's operations, one JSON line per event,
+        keyed by an idempotency key (a Person id, a manifest row's content hash, ...).
+
+        Opening an existing journal replays it, so a restarted job skips keys that are done and
+        retries only failed ones and ones that were started but have no outcome (in doubt: the
+        process died while the request was in flight). Each line is a single write to an
+        O_APPEND file, so a crash leaves at most a torn last line, which is dropped on replay.
+        Lines reach the OS as they are written and survive the process dying; with fsync they
+        are also flushed to disk, surviving power loss, at the cost of a sync per line.
+        """
+        self.path = path
+        self.fsync = fsync
+        self.skipped = 0
+        self._entries: Dict[str, Munch] = {}
+        self._lock = threading.Lock()
+        self._fd = None
+        lines = self._replay()
+        if lines > COMPACT_RATIO * max(len(self._entries), 1000):
+            self.compact()
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def _replay(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, "rb") as fh:
+            data = fh.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            # Torn last line from a crash mid-write; cut it so the next line starts clean
+            os.truncate(self.path, end)
+
+        lines = 0
+        entries = self._entries
+        for line in data[:end].splitlines():
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            lines += 1
+            key = event.pop("key")
+            entry = entries.get(key)
+            if entry is None:
+                entry = entries[key] = Munch(key=key, state=None, attempts=0)
+            if event.get("state") == STARTED:
+                entry.attempts += 1
+            entry.update(event)
+        return lines
+
+    def _append(self, event: dict):
+        line = json.dumps(event, default=str).encode() + b"\n"
+        with self._lock:
+            os.write(self._fd, line)
+            if self.fsync:
+                os.fsync(self._fd)
+
+    def start(self, key: str, **info):
+        """Record that the operation for key is about to be attempted.
+        """
+        entry = self._entries.setdefault(key, Munch(key=key, state=None, attempts=0))
+        entry.attempts += 1
+        entry.state = STARTED
+        self._append({"key": key, "state": STARTED, "at": time.time(), **info})
+
+    def finish(self, key: str, ok: bool, **info):
+        """Record the operation's outcome, with any details (a Bundle id, an error) to keep.
+        """
+        event = {"key": key, "state": DONE if ok else FAILED, "at": time.time(), **info}
+        entry = self._entries.setdefault(key, Munch(key=key, state=None, attempts=0))
+        entry.update(event)
+        self._append(event)
+
+    def entry(self, key: str) -> Optional[Munch]:
+        return self._entries.get(key)
+
+    def state(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        return entry.state if entry else None
+
+    def done(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry.state == DONE
+
+    def keys(self, state: str) -> List[str]:
+        return [key for key, entry in self._entries.items() if entry.state == state]
+
+    def counts(self) -> Dict[str, int]:
+        counts = {DONE: 0, FAILED: 0, STARTED: 0}
+        for entry in self._entries.values():
+            counts[entry.state] = counts.get(entry.state, 0) + 1
+        return counts
+
+    def todo(self, items: Iterable, key: Callable = content_key) -> Iterator[Tuple[str, object]]:
+        """(key, item) for every item that isn't done yet; done ones only add to self.skipped.
+
+        Repeated keys, e.g. identical manifest rows, get a #<n> suffix so each occurrence is
+        journaled on its own.
+        """
+        seen = {}
+        for item in items:
+            item_key = key(item)
+            n = seen.get(item_key, 0)
+            seen[item_key] = n + 1
+            if n:
+                item_key = f"{item_key}#{n}"
+            if self.done(item_key):
+                self.skipped += 1
+                continue
+            yield item_key, item
+
+    def compact(self):
+        """Rewrite the journal with one line per key, its latest state. Atomic: a crash leaves
+        either the old or the new file.
+        """
+        tmp_path = f"{self.path}.tmp"
+        with self._lock, open(tmp_path, "w") as fh:
+            for entry in self._entries.values():
+                fh.write(json.dumps(dict(entry), default=str) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.path)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_journal(path: Optional[str], fsync: bool = False) -> Optional[JobJournal]:
+    """A JobJournal at path, reporting what a resumed job will skip and retry. None without a path.
+    """
+    if not path:
+        return None
+    journal = JobJournal(path, fsync=fsync)
+    counts = journal.counts()
+    if any(counts.values()):
+        print(f"Resuming from {path}: {counts[DONE]} done, {counts[FAILED]} failed, "
+              f"{counts[STARTED]} in doubt")
+    return journal
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show what a bulk job's journal recorded")
+    parser.add_argument("journal")
+    parser.add_argument("--show", choices=(FAILED, STARTED), help="List the failed or in doubt keys")
+    parser.add_argument("--compact", action="store_true", help="Rewrite with one line per key")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with JobJournal(args.journal) as journal:
+        loaded = time.perf_counter() - started
+        print(f"{journal.counts()}, replayed in {loaded * 1000:.0f}ms")
+        if args.show:
+            for key in journal.keys(args.show):
+                entry = journal.entry(key)
+                print(f"  {key}: attempts {entry.attempts}" + (f", {entry.error}" if entry.get("error") else ""))
+        if args.compact:
+            journal.compact()
@@ -0,0 +1,290 @@
+import argparse
+import email.parser
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from blueink.constants import BLUEINK_PAGINATION_HEADER, BUNDLE_STATUS
+
+API_PREFIX = "/api/v2"
+DEFAULT_PER_PAGE = 50
+
+ROUTES = [
+    ("bundles", re.compile(r"^/bundles/$")),
+    ("bundle", re.compile(r"^/bundles/(?P<id>[^/]+)/$")),
+    ("persons", re.compile(r"^/persons/$")),
+    ("person", re.compile(r"^/persons/(?P<id>[^/]+)/$")),
+    ("templates", re.compile(r"^/templates/$")),
+    ("template", re.compile(r"^/templates/(?P<id>[^/]+)/$")),
+]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class MockState:
+    def __init__(self):
+        """ In-memory bundles, persons and templates, shared by all request handler threads.
+        """
+        self.lock = threading.Lock()
+        self.bundles = {}
+        self.persons = {}
+        self.templates = {}
+
+    def seed(self, bundles: int = 0, persons: int = 0, templates: int = 0):
+        statuses = list(BUNDLE_STATUS.values())
+        with self.lock:
+            for i in range(bundles):
+                bundle_id = uuid.uuid4().hex[:10]
+                self.bundles[bundle_id] = {"id": bundle_id, "label": f"Seeded Bundle {i}",
+                                           "status": statuses[i % len(statuses)], "created": _now(),
+                                           "is_test": True, "packets": [], "documents": []}
+            for i in range(persons):
+                person_id = uuid.uuid4().hex[:10]
+                self.persons[person_id] = {"id": person_id, "name": f"Seeded Person {i}", "metadata": {},
+                                           "channels": [{"email": f"person{i}@example.com", "kind": "em"}]}
+            for i in range(templates):
+                template_id = uuid.uuid4().hex[:10]
+                self.templates[template_id] = {"id": template_id, "name": f"Seeded Template {i}",
+                                               "roles": ["signer-1", "signer-2"]}
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    server: "MockBlueInkServer"
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, keep-alive clients stall ~40ms per request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str):
+        url = urlparse(self.path)
+        path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        if not self.headers.get("Authorization", "").startswith("Token "):
+            return self._send(401, {"detail": "Authentication credentials were not provided."})
+
+        server = self.server
+        if server.latency:
+            time.sleep(max(0.0, random.gauss(server.latency, server.latency * server.jitter)))
+        if server.throttle_rate and random.random() < server.throttle_rate:
+            return self._send(429, {"detail": "Request was throttled."},
+                              headers={"Retry-After": str(server.retry_after)})
+        if server.error_rate and random.random() < server.error_rate:
+            return self._send(500, {"detail": "Injected server error."})
+
+        for name, pattern in ROUTES:
+            match = pattern.match(path)
+            if match:
+                handler = getattr(self, f"_{method.lower()}_{name}", None)
+                if handler is None:
+                    return self._send(405, {"detail": f'Method "{method}" not allowed.'})
+                return handler(parse_qs(url.query), body, **match.groupdict())
+
+        self._send(404, {"detail": "Not found."})
+
+    def _send(self, status: int, payload=None, headers: dict = None):
+        data = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        if payload is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_page(self, query: dict, items: list):
+        page = int(query.get("page", ["1"])[0])
+        per_page = int(query.get("per_page", [str(DEFAULT_PER_PAGE)])[0])
+        total_pages = max(1, -(-len(items) // per_page))
+        pagination = f"{page},{total_pages},{per_page},{len(items)}"
+        self._send(200, items[(page - 1) * per_page:page * per_page],
+                   headers={BLUEINK_PAGINATION_HEADER: pagination})
+
+    def _json_body(self, body: bytes) -> dict:
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            message = email.parser.BytesParser().parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+            for part in message.get_payload():
+                if part.get_param("name", header="content-disposition") == "bundle_request":
+                    return json.loads(part.get_payload(decode=True))
+            return {}
+        return json.loads(body or b"{}")
+
+    # Bundles
+    def _get_bundles(self, query, body):
+        with self.server.state.lock:
+            bundles = list(self.server.state.bundles.values())
+        if "status" in query:
+            bundles = [b for b in bundles if b["status"] in query["status"][0].split(",")]
+        if "ordering" in query:
+            ordering = query["ordering"][0]
+            key = ordering.lstrip("-")
+            bundles.sort(key=lambda b: b.get(key) or "", reverse=ordering.startswith("-"))
+        self._send_page(query, bundles)
+
+    def _post_bundles(self, query, body):
+        data = self._json_body(body)
+        if not data.get("documents") or not data.get("packets"):
+            return self._send(400, {"documents": ["This field is required."], "packets": ["This field is required."]})
+        bundle_id = uuid.uuid4().hex[:10]
+        bundle = {**data, "id": bundle_id, "status": BUNDLE_STATUS.SENT, "created": _now()}
+        with self.server.state.lock:
+            self.server.state.bundles[bundle_id] = bundle
+        self._send(201, bundle)
+
+    def _get_bundle(self, query, body, id):
+        bundle = self.server.state.bundles.get(id)
+        self._send(200, bundle) if bundle else self._send(404, {"detail": "Not found."})
+
+    # Persons
+    def _get_persons(self, query, body):
+        with self.server.state.lock:
+            persons = list(self.server.state.persons.values())
+        self._send_page(query, persons)
+
+    def _post_persons(self, query, body):
+        data = self._json_body(body)
+        if not data.get("name"):
+            return self._send(400, {"name": ["This field is required."]})
+        person = {"metadata": {}, "channels": [], **data, "id": uuid.uuid4().hex[:10]}
+        with self.server.state.lock:
+            self.server.state.persons[person["id"]] = person
+        self._send(201, person)
+
+    def _get_person(self, query, body, id):
+        person = self.server.state.persons.get(id)
+        self._send(200, person) if person else self._send(404, {"detail": "Not found."})
+
+    def _put_person(self, query, body, id, partial=False):
+        data = self._json_body(body)
+        with self.server.state.lock:
+            person = self.server.state.persons.get(id)
+            if person is not None:
+                person = {**person, **data, "id": id} if partial else {"metadata": {}, "channels": [], **data, "id": id}
+                self.server.state.persons[id] = person
+        self._send(200, person) if person else self._send(404, {"detail": "Not found."})
+
+    def _patch_person(self, query, body, id):
+        self._put_person(query, body, id, partial=True)
+
+    def _delete_person(self, query, body, id):
+        with self.server.state.lock:
+            person = self.server.state.persons.pop(id, None)
+        self._send(204) if person else self._send(404, {"detail": "Not found."})
+
+    # Templates
+    def _get_templates(self, query, body):
+        with self.server.state.lock:
+            templates = list(self.server.state.templates.values())
+        etag = '"' + hashlib.sha1(json.dumps(templates, sort_keys=True).encode()).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, headers={"ETag": etag})
+        self._send(200, templates, headers={"ETag": etag})
+
+    def _get_template(self, query, body, id):
+        template = self.server.state.templates.get(id)
+        self._send(200, template) if template else self._send(404, {"detail": "Not found."})
+
+
+class MockBlueInkServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.2,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: float = 1,
+                 verbose: bool = False):
+        """ Local stand-in for the BlueInk API, implementing the bundle, person and template
+        endpoints used by these examples. Point a Client at it with Client(private_api_key="any", base_url=server.url)
+
+        :param latency: mean added latency per request, in seconds
+        :param jitter: standard deviation of the latency, as a fraction of it
+        :param error_rate: probability of answering HTTP 500
+        :param throttle_rate: probability of answering HTTP 429 with a Retry-After header
+        :param retry_after: Retry-After value sent with 429s, in seconds
+        """
+        super().__init__((host, port), MockRequestHandler)
+        self.state = MockState()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.verbose = verbose
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def start(self) -> "MockBlueInkServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-blueink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the BlueInk API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean added latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of HTTP 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Probability of HTTP 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After sent with 429s")
+    parser.add_argument("--seed-bundles", type=int, default=0)
+    parser.add_argument("--seed-persons", type=int, default=0)
+    parser.add_argument("--seed-templates", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    server = MockBlueInkServer(args.host, args.port,
+                               latency=args.latency,
+                               error_rate=args.error_rate,
+                               throttle_rate=args.throttle_rate,
+                               retry_after=args.retry_after,
+                               verbose=args.verbose)
+    server.state.seed(args.seed_bundles, args.seed_persons, args.seed_templates)
+    print(f"Mock BlueInk API at {server.url}")
+    print(f"  export BLUEINK_API_URL={server.url} BLUEINK_PRIVATE_API_KEY=test")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
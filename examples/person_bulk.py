@@ -0,0 +1,551 @@
+import argparse
+import csv
+import json
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from munch import Munch, munchify
+from requests import HTTPError, RequestException
+
+from examples.instrumentation import instrument_client
+from examples.job_journal import JobJournal, open_journal
+from examples.transport import use_pooled_transport
+from examples.person_mirror import CHANNEL_EMAIL, CHANNEL_PHONE, PersonMirror, normalize_email, normalize_phone, \
+    person_contacts
+from examples.rate_limit import TokenBucket
+from examples.retry import RetryPolicy
+from blueink import Client
+from blueink.person_helper import PersonHelper
+
+HTTP_NOT_FOUND = 404
+
+# CSV columns of a desired-state file holding lists, separated by ';'
+LIST_SEPARATOR = ";"
+METADATA_COLUMN_PREFIX = "metadata."
+
+
+def _bounded_map(pool: Executor, fn: Callable, items: Iterable, max_in_flight: int) -> Iterator:
+    """Like pool.map, in order, but with at most max_in_flight tasks submitted and not yet
+    collected, so a large input is streamed through the pool rather than queued up front.
+    """
+    in_flight = deque()
+    for item in items:
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft().result()
+        in_flight.append(pool.submit(fn, item))
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+def bulk_delete_persons(client: Client, person_ids: Iterable[str], max_workers: int = 8,
+                        policy: RetryPolicy = None,
+                        mirror: PersonMirror = None, on_result: Callable[[Munch], None] = None,
+                        journal: JobJournal = None) -> Munch:
+    """Delete many Persons through a worker pool sharing one retry policy and rate limiter.
+
+    A Person that is already gone (HTTP 404) counts as deleted. If a PersonMirror is given,
+    deletions are written through to it. With a JobJournal, every deletion's outcome is
+    journaled, and Persons deleted by an earlier, interrupted run of the job are skipped
+    without a request.
+
+    Returns:
+        Munch with deleted / failed / skipped counts, elapsed seconds, how often the pool was
+        throttled, and the per-Person results.
+    """
+    policy = policy or RetryPolicy(limiter=TokenBucket(rate=10))
+    skipped_before = journal.skipped if journal else 0
+
+    def delete_one(key: str, person_id: str) -> Munch:
+        # key is the journal key: the id, with a #<n> suffix for a repeated id
+        result = Munch(person_id=person_id, ok=False, status=None, error=None)
+        if journal:
+            journal.start(key)
+        try:
+            response = policy.call(client.persons.delete, person_id, endpoint="PERSONS.DELETE")
+            result.ok = True
+            result.status = response.status
+        except HTTPError as e:
+            result.status = e.response.status_code if e.response is not None else None
+            if result.status == HTTP_NOT_FOUND:
+                result.ok = True
+            else:
+                result.error = e.response.text if e.response is not None else str(e)
+        except RequestException as e:
+            # Connection failure or timeout that outlasted the retries
+            result.error = str(e)
+
+        if journal:
+            journal.finish(key, result.ok, status=result.status, error=result.error)
+        if result.ok and mirror:
+            mirror.remove(person_id)
+        if on_result:
+            on_result(result)
+        return result
+
+    work = journal.todo(person_ids, key=str) if journal else ((None, person_id) for person_id in person_ids)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(_bounded_map(pool, lambda kv: delete_one(*kv), work, max_workers * 2))
+    elapsed = time.perf_counter() - started
+
+    deleted = sum(1 for r in results if r.ok)
+    return Munch(deleted=deleted,
+                 failed=len(results) - deleted,
+                 skipped=(journal.skipped - skipped_before) if journal else 0,
+                 elapsed=elapsed,
+                 throttled=policy.limiter.throttled if policy.limiter else 0,
+                 results=results)
+
+
+def select_person_ids(mirror: PersonMirror, name_contains: str = None, email_domain: str = None) -> List[str]:
+    """Pick Person ids out of the local mirror by name substring and / or email domain.
+    """
+    if name_contains:
+        persons = mirror.search_name(name_contains)
+    else:
+        persons = list(mirror.all())
+
+    if email_domain:
+        suffix = "@" + email_domain.lower().lstrip("@")
+        persons = [p for p in persons
+                   if any((c.get("email") or "").lower().endswith(suffix) for c in p.get("channels") or [])]
+
+    return [p.id for p in persons]
+
+
+def read_desired_persons(path: str) -> Iterator[Munch]:
+    """Lazily read desired Person states from CSV or JSONL.
+
+    Each state has an id (except in import files) plus any of name, emails, phones and metadata.
+    Only the keys that are present are compared, so a file with just id and name never touches
+    contact channels. CSV files hold emails / phones as ';' separated lists and metadata as
+    'metadata.<key>' columns.
+    """
+    with open(path, newline="") as fh:
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(fh):
+                state = Munch()
+                for key, value in row.items():
+                    if value is None or value == "":
+                        continue
+                    if key.startswith(METADATA_COLUMN_PREFIX):
+                        state.setdefault("metadata", {})[key[len(METADATA_COLUMN_PREFIX):]] = value
+                    elif key in ("emails", "phones"):
+                        state[key] = [v.strip() for v in value.split(LIST_SEPARATOR) if v.strip()]
+                    else:
+                        state[key] = value
+                yield state
+        else:
+            for line in fh:
+                if line.strip():
+                    yield munchify(json.loads(line))
+
+
+def person_diff(current: dict, desired: dict) -> dict:
+    """Fields of `desired` that differ from `current`, shaped for a partial (PATCH) update.
+
+    Emails and phones are compared after normalization and order is ignored; if either differs,
+    the full channel list is sent. An empty dict means there is nothing to update.
+    """
+    changes = {}
+    if "name" in desired and desired["name"] != current.get("name"):
+        changes["name"] = desired["name"]
+
+    if "metadata" in desired:
+        metadata = {**(current.get("metadata") or {}), **desired["metadata"]}
+        if metadata != (current.get("metadata") or {}):
+            changes["metadata"] = metadata
+
+    if "emails" in desired or "phones" in desired:
+        channels = current.get("channels") or []
+        current_emails = {normalize_email(c.get("email")) for c in channels if c.get("email")}
+        current_phones = {normalize_phone(c.get("phone")) for c in channels if c.get("phone")}
+        emails = desired.get("emails", [c["email"] for c in channels if c.get("email")])
+        phones = desired.get("phones", [c["phone"] for c in channels if c.get("phone")])
+
+        if ({normalize_email(e) for e in emails} != current_emails
+                or {normalize_phone(p) for p in phones} != current_phones):
+            changes["channels"] = ([{"email": e, "kind": "em"} for e in emails]
+                                   + [{"phone": p, "kind": "mp"} for p in phones])
+
+    return changes
+
+
+def bulk_update_persons(client: Client, desired_states: Iterable[dict], max_workers: int = 8,
+                        policy: RetryPolicy = None,
+                        mirror: PersonMirror = None, on_result: Callable[[Munch], None] = None) -> Munch:
+    """Bring many Persons to their desired state, sending only changed fields as partial updates.
+
+    Current data comes from the mirror when given (falling back to a retrieve call for Persons
+    it doesn't know). States with no changes are skipped without any request.
+
+    Returns:
+        Munch with updated / unchanged / failed counts, elapsed seconds and per-Person results.
+    """
+    policy = policy or RetryPolicy(limiter=TokenBucket(rate=10))
+
+    def current_person(person_id: str) -> Optional[dict]:
+        person = mirror.get(person_id) if mirror else None
+        if person is None:
+            person = policy.call(client.persons.retrieve, person_id, endpoint="PERSONS.RETRIEVE").data
+        return person
+
+    def update_one(desired: dict) -> Munch:
+        result = Munch(person_id=desired.get("id"), ok=False, changed=[], status=None, error=None)
+        try:
+            if not result.person_id:
+                # e.g. a CSV row with a blank id cell; read_desired_persons drops empty columns
+                raise ValueError(f"Desired state {dict(desired)} has no id")
+            changes = person_diff(current_person(result.person_id), desired)
+            result.changed = sorted(changes)
+            if changes:
+                response = policy.call(client.persons.update,
+                                       person_id=result.person_id, data=changes, partial=True,
+                                       endpoint="PERSONS.UPDATE")
+                result.status = response.status
+                if mirror:
+                    mirror.upsert(response.data)
+            result.ok = True
+        except HTTPError as e:
+            result.status = e.response.status_code if e.response is not None else None
+            result.error = e.response.text if e.response is not None else str(e)
+        except (ValueError, RequestException) as e:
+            # No id, or a connection failure / timeout that outlasted the retries
+            result.error = str(e)
+
+        if on_result:
+            on_result(result)
+        return result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(_bounded_map(pool, update_one, desired_states, max_workers * 2))
+    elapsed = time.perf_counter() - started
+
+    updated = sum(1 for r in results if r.ok and r.changed)
+    failed = sum(1 for r in results if not r.ok)
+    return Munch(updated=updated,
+                 unchanged=len(results) - updated - failed,
+                 failed=failed,
+                 elapsed=elapsed,
+                 throttled=policy.limiter.throttled if policy.limiter else 0,
+                 results=results)
+
+
+class ContactIndex:
+    def __init__(self, persons: Iterable[dict] = ()):
+        """ In-memory hash index of normalized email / phone -> Person id, for O(1) duplicate checks.
+
+        Built once from the Persons in the local mirror; callers add Persons they create along
+        the way. Values are opaque, so an import can also register a not yet created Person.
+        """
+        self._owners = {}
+        for person in persons:
+            self.add(person["id"], person_contacts(person))
+
+    @classmethod
+    def from_mirror(cls, mirror: PersonMirror) -> "ContactIndex":
+        return cls(mirror.all())
+
+    def __len__(self):
+        return len(self._owners)
+
+    def add(self, owner, contacts: Iterable[tuple]):
+        """Point each (kind, normalized value) at owner, unless it already belongs to someone.
+        """
+        for contact in contacts:
+            self._owners.setdefault(contact, owner)
+
+    def match(self, contacts: Iterable[tuple]) -> list:
+        """Distinct owners of any of the contacts, in the order the contacts were given.
+        """
+        owners = []
+        for contact in contacts:
+            owner = self._owners.get(contact)
+            if owner is not None and owner not in owners:
+                owners.append(owner)
+        return owners
+
+
+def desired_contacts(desired: dict) -> List[tuple]:
+    """(kind, normalized value) for the emails and phones of a desired Person state
+    """
+    contacts = [(CHANNEL_EMAIL, normalize_email(e)) for e in desired.get("emails") or []]
+    contacts += [(CHANNEL_PHONE, normalize_phone(p)) for p in desired.get("phones") or []]
+    return [(kind, value) for kind, value in contacts if value]
+
+
+def find_existing_person(mirror: PersonMirror, record: dict) -> Optional[Munch]:
+    """First mirrored Person sharing a normalized email or phone with a record, if any.
+    """
+    for kind, value in desired_contacts(record):
+        matches = mirror.find_by_email(value) if kind == CHANNEL_EMAIL else mirror.find_by_phone(value)
+        if matches:
+            return matches[0]
+    return None
+
+
+def merged_state(current: dict, incoming: dict) -> dict:
+    """Desired state that adds an incoming record to an existing Person without losing anything.
+
+    New emails, phones and metadata keys are added, existing ones are kept. The name is only
+    filled in when the Person has none.
+    """
+    channels = current.get("channels") or []
+    emails = [c["email"] for c in channels if c.get("email")]
+    phones = [c["phone"] for c in channels if c.get("phone")]
+    known_emails = {normalize_email(e) for e in emails}
+    known_phones = {normalize_phone(p) for p in phones}
+
+    desired = {"emails": emails + [e for e in incoming.get("emails") or [] if normalize_email(e) not in known_emails],
+               "phones": phones + [p for p in incoming.get("phones") or [] if normalize_phone(p) not in known_phones],
+               "metadata": {**(incoming.get("metadata") or {}), **(current.get("metadata") or {})}}
+    if incoming.get("name") and not current.get("name"):
+        desired["name"] = incoming["name"]
+    return desired
+
+
+def import_persons(client: Client, records: Iterable[dict], mirror: PersonMirror, max_workers: int = 8,
+                   policy: RetryPolicy = None, on_result: Callable[[Munch], None] = None) -> Munch:
+    """Import contact records, merging them into existing Persons instead of creating duplicates.
+
+    Emails and phones are normalized and looked up in a ContactIndex built from the mirror
+    (sync it first). A record matching an existing Person is merged into it with a partial
+    update of only the missing details (see merged_state), or costs no request at all when
+    there is nothing new; only records matching nobody are created. Records in the same file
+    that share an email / phone end up on one Person, and tasks touching the same Person run one
+    after another, so concurrent merges never overwrite each other. The mirror is kept current.
+
+    Returns:
+        Munch with created / merged / unchanged / failed counts, elapsed seconds, how often the
+        pool was throttled and the per-record results
+    """
+    policy = policy or RetryPolicy(limiter=TokenBucket(rate=10))
+    index = ContactIndex.from_mirror(mirror)
+    # Latest task per Person (an id, or the future creating it), which the next task for it waits on
+    latest = {}
+
+    def person_id_of(owner) -> str:
+        if isinstance(owner, Future):
+            created = owner.result()
+            if not created.ok:
+                raise RuntimeError(f"Record {created.record}, which this one merges into, wasn't created")
+            return created.person_id
+        return owner
+
+    def create_one(number: int, record: dict) -> Munch:
+        result = Munch(record=number, action="created", ok=False, person_id=None, status=None, error=None)
+        try:
+            helper = PersonHelper(name=record.get("name"), metadata=dict(record.get("metadata") or {}),
+                                  phones=list(record.get("phones") or []), emails=list(record.get("emails") or []))
+            response = policy.call(client.persons.create_from_person_helper, helper,
+                                   idempotent=False, endpoint="PERSONS.CREATE")
+            mirror.upsert(response.data)
+            result.update(ok=True, person_id=response.data.id, status=response.status)
+        except HTTPError as e:
+            result.status = e.response.status_code if e.response is not None else None
+            result.error = e.response.text if e.response is not None else str(e)
+        except (ValueError, RequestException) as e:
+            # No name, a malformed email / phone, or a connection failure / timeout that outlasted the retries
+            result.error = str(e)
+
+        if on_result:
+            on_result(result)
+        return result
+
+    def merge_one(number: int, record: dict, owner, previous: Optional[Future]) -> Munch:
+        result = Munch(record=number, action="unchanged", ok=False, person_id=None, status=None, error=None)
+        try:
+            if previous is not None:
+                previous.result()
+            result.person_id = person_id_of(owner)
+            current = mirror.get(result.person_id)
+            if current is None:
+                current = policy.call(client.persons.retrieve, result.person_id, endpoint="PERSONS.RETRIEVE").data
+            changes = person_diff(current, merged_state(current, record))
+            if changes:
+                response = policy.call(client.persons.update,
+                                       person_id=result.person_id, data=changes, partial=True,
+                                       endpoint="PERSONS.UPDATE")
+                mirror.upsert(response.data)
+                result.action = "merged"
+                result.status = response.status
+            result.ok = True
+        except HTTPError as e:
+            result.status = e.response.status_code if e.response is not None else None
+            result.error = e.response.text if e.response is not None else str(e)
+        except (RuntimeError, RequestException) as e:
+            result.error = str(e)
+
+        if on_result:
+            on_result(result)
+        return result
+
+    started = time.perf_counter()
+    results = []
+    # (owner, future) of tasks submitted and not yet collected, at most 2 per worker
+    in_flight = deque()
+    max_in_flight = max_workers * 2
+
+    def collect():
+        owner, future = in_flight.popleft()
+        results.append(future.result())
+        # Later tasks for this Person needn't wait on a finished one
+        if latest.get(owner) is future:
+            del latest[owner]
+
+    # Matching happens here, in record order, so duplicates within the file are caught before any
+    # request for them is in flight. Tasks only wait on earlier tasks, which the pool runs first.
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for number, record in enumerate(records, start=1):
+            if len(in_flight) >= max_in_flight:
+                collect()
+            contacts = desired_contacts(record)
+            owners = index.match(contacts)
+            if owners:
+                owner = owners[0]
+                future = pool.submit(merge_one, number, record, owner, latest.get(owner))
+            else:
+                future = owner = pool.submit(create_one, number, record)
+            index.add(owner, contacts)
+            latest[owner] = future
+            in_flight.append((owner, future))
+        while in_flight:
+            collect()
+    elapsed = time.perf_counter() - started
+
+    counts = {action: sum(1 for r in results if r.ok and r.action == action)
+              for action in ("created", "merged", "unchanged")}
+    return Munch(**counts,
+                 failed=sum(1 for r in results if not r.ok),
+                 elapsed=elapsed,
+                 throttled=policy.limiter.throttled if policy.limiter else 0,
+                 results=results)
+
+
+def print_update_result(result: Munch):
+    if not result.ok:
+        print(f"  - Failed to update {result.person_id}, HTTP {result.status}: {result.error}")
+    elif result.changed:
+        print(f"  + Updated {result.person_id}: {', '.join(result.changed)}")
+
+
+def print_update_summary(summary: Munch):
+    print(f"Updated: {summary.updated}, Unchanged: {summary.unchanged}, Failed: {summary.failed}, "
+          f"Elapsed: {summary.elapsed:.1f}s, Throttled: {summary.throttled} times")
+
+
+def print_import_result(result: Munch):
+    if not result.ok:
+        print(f"  - Failed to import record {result.record}, HTTP {result.status}: {result.error}")
+    elif result.action != "unchanged":
+        print(f"  + Record {result.record}: {result.action} {result.person_id}")
+
+
+def print_import_failure(result: Munch):
+    if not result.ok:
+        print_import_result(result)
+
+
+def print_import_summary(summary: Munch):
+    print(f"Created: {summary.created}, Merged: {summary.merged}, Unchanged: {summary.unchanged}, "
+          f"Failed: {summary.failed}, Elapsed: {summary.elapsed:.1f}s, Throttled: {summary.throttled} times")
+
+
+def print_delete_result(result: Munch):
+    if result.ok:
+        print(f"  + Deleted {result.person_id}")
+    else:
+        print(f"  - Failed to delete {result.person_id}, HTTP {result.status}: {result.error}")
+
+
+def print_delete_summary(summary: Munch):
+    skipped = f"Skipped (already deleted): {summary.skipped}, " if summary.get("skipped") else ""
+    print(f"Deleted: {summary.deleted}, Failed: {summary.failed}, {skipped}"
+          f"Elapsed: {summary.elapsed:.1f}s, Throttled: {summary.throttled} times")
+
+
+def _read_ids(path: str) -> List[str]:
+    with open(path) as fh:
+        return [line.strip() for line in fh if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk operations on Persons")
+    parser.add_argument("--metrics", action="store_true", help="Print per-endpoint API call metrics at exit")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    delete_parser = subparsers.add_parser("delete", help="Delete Persons by id, or by a query on the local mirror")
+    delete_parser.add_argument("--ids", nargs="*", default=[], help="Person ids to delete")
+    delete_parser.add_argument("--ids-file", help="File with one Person id per line")
+    delete_parser.add_argument("--name-contains", help="Delete every Person whose name contains this text")
+    delete_parser.add_argument("--email-domain", help="Delete every Person with an email at this domain")
+    delete_parser.add_argument("--workers", type=int, default=8)
+    delete_parser.add_argument("--rate", type=float, default=10.0, help="Max requests per second (default 10)")
+    delete_parser.add_argument("--yes", action="store_true", help="Don't ask for confirmation")
+    delete_parser.add_argument("--journal", help="Journal file; re-running with it skips Persons already deleted")
+
+    update_parser = subparsers.add_parser("update", help="Apply desired Person states from a CSV / JSONL file")
+    update_parser.add_argument("file", help="Desired states, one Person per row / line")
+    update_parser.add_argument("--workers", type=int, default=8)
+    update_parser.add_argument("--rate", type=float, default=10.0, help="Max requests per second (default 10)")
+
+    import_parser = subparsers.add_parser("import", help="Import contacts from a CSV / JSONL file without "
+                                                         "creating duplicates")
+    import_parser.add_argument("file", help="Records with name, emails, phones and metadata, as for update")
+    import_parser.add_argument("--workers", type=int, default=8)
+    import_parser.add_argument("--rate", type=float, default=10.0, help="Max requests per second (default 10)")
+    import_parser.add_argument("--quiet", action="store_true", help="Only print failures and the summary")
+    args = parser.parse_args()
+
+    client = Client()
+    use_pooled_transport(client, pool_maxsize=args.workers, print_at_exit=True)
+    metrics = instrument_client(client) if args.metrics else None
+    policy = RetryPolicy(limiter=TokenBucket(rate=args.rate), metrics=metrics)
+    mirror = PersonMirror(client)
+
+    if args.command == "delete":
+        ids = list(args.ids)
+        if args.ids_file:
+            ids.extend(_read_ids(args.ids_file))
+        if args.name_contains or args.email_domain:
+            mirror.sync_if_stale()
+            ids.extend(select_person_ids(mirror, args.name_contains, args.email_domain))
+
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            parser.exit(message="No Persons selected\n")
+        if not args.yes and input(f"Delete {len(ids)} Persons? [n]: ").lower() != "y":
+            parser.exit(message="Aborted\n")
+
+        journal = open_journal(args.journal)
+        try:
+            summary = bulk_delete_persons(client, ids,
+                                          max_workers=args.workers,
+                                          policy=policy,
+                                          mirror=mirror,
+                                          on_result=print_delete_result,
+                                          journal=journal)
+        finally:
+            if journal:
+                journal.close()
+        print_delete_summary(summary)
+
+    elif args.command == "update":
+        mirror.sync_if_stale()
+        summary = bulk_update_persons(client, read_desired_persons(args.file),
+                                      max_workers=args.workers,
+                                      policy=policy,
+                                      mirror=mirror,
+                                      on_result=print_update_result)
+        print_update_summary(summary)
+
+    elif args.command == "import":
+        mirror.sync_if_stale()
+        summary = import_persons(client, read_desired_persons(args.file), mirror,
+                                 max_workers=args.workers,
+                                 policy=policy,
+                                 on_result=print_import_failure if args.quiet else print_import_result)
+        print_import_summary(summary)
@@ -1,4 +1,3 @@
-import copy
 from pprint import pprint
 from random import choice as random_choice
 from typing import List
@@ -8,8 +7,12 @@ from requests import HTTPError
 
 from examples.example_utils import (
     interactive_text_input, interactive_yes_no_input, input_choices,
-    interactive_list_entry, interactive_dict_entry, BaseExample
+    interactive_list_entry, interactive_dict_entry, BaseExample, EXIT
 )
+from examples.job_journal import open_journal
+from examples.person_bulk import bulk_delete_persons, select_person_ids, print_delete_result, \
+    print_delete_summary, find_existing_person, merged_state, person_diff
+from examples.person_mirror import PersonMirror
 from blueink import Client
 from blueink.person_helper import PersonHelper
 
@@ -22,6 +25,14 @@ class PersonExampleModel:
         """ Examples of using PersonHelper and some simple calls to retrieve/update/list Persons using the Client.
         """
         self._client = client
+        self._person_mirror = None
+
+    @property
+    def person_mirror(self) -> PersonMirror:
+        # Created on first use, so the model doesn't open a SQLite file until a Person is looked up
+        if self._person_mirror is None:
+            self._person_mirror = PersonMirror(self._client)
+        return self._person_mirror
 
     def setup_person_helper(self, name: str, phones: List[str], emails: List[str], metadata=None):
         """ One-liner example of setting up PersonHelper
@@ -31,16 +42,32 @@ class PersonExampleModel:
         else:
             return PersonHelper(name=name, phones=phones, emails=emails)
 
-    def call_create_person(self, helper: PersonHelper):
+    def call_create_person(self, helper: PersonHelper, merge_duplicates: bool = True):
         """Example network call to create a person via PersonHelper
+
+        With merge_duplicates, a Person already having one of the emails / phones (checked
+        against the local mirror) gets the new details as a partial update instead.
         """
+        if merge_duplicates:
+            self.person_mirror.sync_if_stale()
+            record = {"name": helper._name, "emails": helper.get_emails(), "phones": helper.get_phones(),
+                      "metadata": helper._metadata or {}}
+            existing = find_existing_person(self.person_mirror, record)
+            if existing is not None:
+                print(f"Person {existing.id} ({existing.name}) has the same email or phone")
+                changes = person_diff(existing, merged_state(existing, record))
+                if changes:
+                    self.call_update_person(existing.id, changes)
+                else:
+                    print("Nothing new to add to them")
+                return
+
         try:
             response = self._client.persons.create_from_person_helper(helper)
+            self.person_mirror.upsert(response.data)
             print(response.data)
         except HTTPError as e:
             print(f"Failed to create person, HTTP {e.errno}: {e.response.content}")
-        print("Example Concluded. To create a new Person, start the example script again.")
-        exit()
 
     def call_list_persons(self, show_metadata: bool, print_people_data=True):
         """Example call to list out Person data.
@@ -64,11 +91,21 @@ class PersonExampleModel:
 
         return resp.data
 
+    def mirrored_persons(self, max_age: float = 300) -> List[Munch]:
+        """Persons from the local mirror, syncing first only if the mirror is older than max_age seconds.
+        """
+        stats = self.person_mirror.sync_if_stale(max_age)
+        if stats:
+            print(f"Synced Person mirror: {stats.added} added, {stats.updated} updated, "
+                  f"{stats.removed} removed, {stats.unchanged} unchanged")
+        return list(self.person_mirror.all())
+
     def call_delete_person(self, person_id: str) -> bool:
         """Example call to delete a person by ID number
         """
         try:
             first_del_res = self._client.persons.delete(person_id)
+            self.person_mirror.remove(person_id)
             print(f"Successfully deleted person: {person_id}")
             return True
         except HTTPError as e:
@@ -76,6 +113,24 @@ class PersonExampleModel:
                   f" HTTP {e.errno}: {e.response.content}")
             return False
 
+    def call_bulk_delete_persons(self, person_ids: List[str], max_workers: int = 8, journal_path: str = None):
+        """Example of deleting many Persons concurrently, sharing one rate limiter that backs off on HTTP 429
+
+        With a journal_path, calling again after an interruption skips the Persons already deleted
+        """
+        journal = open_journal(journal_path)
+        try:
+            summary = bulk_delete_persons(self._client, person_ids,
+                                          max_workers=max_workers,
+                                          mirror=self.person_mirror,
+                                          on_result=print_delete_result,
+                                          journal=journal)
+        finally:
+            if journal:
+                journal.close()
+        print_delete_summary(summary)
+        return summary
+
     def call_update_person(self, person_id, data):
         """Example call to update a Person
         """
@@ -83,6 +138,7 @@ class PersonExampleModel:
             response = self._client.persons.update(person_id=person_id,
                                                    data=data,
                                                    partial=True)
+            self.person_mirror.upsert(response.data)
             print(f"Successfully updated person with id {person_id}")
 
             print(response.data)
@@ -98,12 +154,15 @@ class ClientPersonExample(BaseExample, PersonExampleModel):
         lst="List Persons",
         upd="Update a person",
         dlt="Delete a Person",
+        bdl="Bulk delete Persons",
     )
     TERMINAL_CHOICES = Munch(
         prt="Print Person Data",
         snd="Send Person to Server",
         ext="Exit to Main Menu",
     )
+    # Menu state for the Person Menu of a Person being built
+    PERSON_MENU = "person"
 
     def __init__(self, client: Client):
         """ CLI UI Controller for Person Example.
@@ -113,11 +172,13 @@ class ClientPersonExample(BaseExample, PersonExampleModel):
         BaseExample.__init__(self)
         PersonExampleModel.__init__(self, client)
 
+        self.person_helper: PersonHelper = None
+
     def start(self):
         print("BlueInk API Client Example: Person Helper")
         print("(C) BlueInk 2022")
         print("\n")
-        self.main_router()
+        self.run_menu()
 
     def main_router(self):
         choice = input_choices(
@@ -127,17 +188,19 @@ class ClientPersonExample(BaseExample, PersonExampleModel):
             default=1
         )
         print("Your choice: `" + choice + "`")
-
-        if choice == self.MAIN_CHOICES.crt:
-            self.create_person()
-        elif choice == self.MAIN_CHOICES.lst:
-            self.list_persons()
-        elif choice == self.MAIN_CHOICES.dlt:
-            self.delete_person()
-        elif choice == self.MAIN_CHOICES.upd:
-            self.update_person()
-
-    def person_menu(self, person_helper: PersonHelper):
+        return choice
+
+    def menu_states(self):
+        return {
+            self.MAIN_CHOICES.crt: self.create_person,
+            self.MAIN_CHOICES.lst: self.list_persons,
+            self.MAIN_CHOICES.dlt: self.delete_person,
+            self.MAIN_CHOICES.upd: self.update_person,
+            self.MAIN_CHOICES.bdl: self.bulk_delete_persons,
+            self.PERSON_MENU: self.person_menu,
+        }
+
+    def person_menu(self):
         choice = input_choices(
             header="\nPerson Menu",
             end_prompt="Your Selection",
@@ -147,11 +210,12 @@ class ClientPersonExample(BaseExample, PersonExampleModel):
         print("Your choice: `" + choice + "`")
 
         if choice == self.TERMINAL_CHOICES.prt:
-            self.print_person(person_helper)
+            self.print_person(self.person_helper)
+            return self.PERSON_MENU
         elif choice == self.TERMINAL_CHOICES.snd:
-            self.call_create_person(person_helper)
-        elif choice == self.TERMINAL_CHOICES.ext:
-            self.main_router()
+            self.call_create_person(self.person_helper)
+            print("Example Concluded. To create a new Person, start the example script again.")
+            return EXIT
 
     def create_person(self):
         fname = interactive_text_input("First Name", random_choice(FNAMES),
@@ -177,20 +241,19 @@ class ClientPersonExample(BaseExample, PersonExampleModel):
             metadata = interactive_dict_entry("Metadata Key",
                                               "Add more Metadata?",
                                               "key")
-        ph = self.setup_person_helper(name, phones, emails, metadata=metadata)
+        self.person_helper = self.setup_person_helper(name, phones, emails, metadata=metadata)
 
-        self.person_menu(ph)
+        return self.PERSON_MENU
 
     def list_persons(self):
         show_metadata = interactive_yes_no_input("Show Metadata?")
         self.call_list_persons(show_metadata)
-        self.main_router()
 
     def delete_person(self):
-        persons = self.call_list_persons(False, False)
+        persons = self.mirrored_persons()
         if len(persons) == 0:
             print("No Persons found. Returning to main menu")
-            self.main_router()
+            return
 
         people_by_id = {}
         for person in persons:
@@ -215,15 +278,24 @@ class ClientPersonExample(BaseExample, PersonExampleModel):
 
             another_id = another_delete[0]
             if self.call_delete_person(another_id):
-                people_by_id.pop(first_id)
+                people_by_id.pop(another_id)
+
+    def bulk_delete_persons(self):
+        self.mirrored_persons()
+        name_contains = interactive_text_input("Delete Persons whose name contains", allow_blank=False)
+        person_ids = select_person_ids(self.person_mirror, name_contains=name_contains)
+        if len(person_ids) == 0:
+            print("No matching Persons found. Returning to main menu")
+            return
 
-        self.main_router()
+        if interactive_yes_no_input(f"Delete {len(person_ids)} Persons", "n"):
+            self.call_bulk_delete_persons(person_ids)
 
     def update_person(self):
-        persons = self.call_list_persons(False, False)
+        persons = self.mirrored_persons()
         if len(persons) == 0:
             print("No Persons found. Returning to main menu")
-            self.main_router()
+            return
 
         person_name_by_id = {}
         person_data_by_id = {}
@@ -236,8 +308,8 @@ class ClientPersonExample(BaseExample, PersonExampleModel):
                                person_name_by_id,
                                default=1)
         update_id = choice[0]
-        update_name = choice[0]
-        data = copy.deepcopy(person_data_by_id[update_id])
+        update_name = choice[1]
+        data = person_data_by_id[update_id]
         print(f"Updating {update_id} ({update_name})")
 
         new_data = {}
@@ -276,13 +348,14 @@ class ClientPersonExample(BaseExample, PersonExampleModel):
                 if not any_further_changes:
                     break
 
-        self.call_update_person(update_id, new_data)
-        self.main_router()
+        if new_data:
+            self.call_update_person(update_id, new_data)
+        else:
+            print("Nothing changed, no update sent")
 
     def print_person(self, person_helper: PersonHelper):
         if person_helper is None:
             print("** Person not yet configured. Please build a person**")
-            self.main_router()
+            return
 
         pprint(person_helper.as_dict())
-        self.person_menu(person_helper)
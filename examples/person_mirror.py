@@ -0,0 +1,261 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from munch import Munch, munchify
+
+from examples.example_utils import DEFAULT_CACHE_DIR, account_key
+from examples.pagination import PrefetchingPagedIterator
+from blueink import Client
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS persons (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    digest TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS persons_name ON persons (name COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS person_channels (
+    person_id TEXT NOT NULL REFERENCES persons (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS person_channels_value ON person_channels (kind, value);
+CREATE INDEX IF NOT EXISTS person_channels_person ON person_channels (person_id);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+CHANNEL_EMAIL = "email"
+CHANNEL_PHONE = "phone"
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    if not email:
+        return None
+    return email.strip().lower() or None
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Reduce a phone number to its digits, e.g. '(505) 555-5555' and '505 555 5555' both
+    become '5055555555'. A leading US country code is dropped.
+    """
+    if not phone:
+        return None
+    digits = "".join(c for c in phone if c.isdigit())
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits or None
+
+
+def person_contacts(person: dict) -> List[tuple]:
+    """(kind, normalized value) for each email / phone channel of a Person
+    """
+    contacts = []
+    for channel in person.get("channels") or []:
+        email = normalize_email(channel.get("email"))
+        if email:
+            contacts.append((CHANNEL_EMAIL, email))
+        phone = normalize_phone(channel.get("phone"))
+        if phone:
+            contacts.append((CHANNEL_PHONE, phone))
+    return contacts
+
+
+class PersonMirror:
+    def __init__(self, client: Client, db_path: str = None):
+        """ Local SQLite mirror of the account's Persons, indexed by id, name, email and phone.
+
+        sync() re-lists every Person (the Persons list has no updated-since filter) and only
+        writes rows whose content changed; sync_if_stale() skips it while the mirror is recent.
+        Callers that create / update / delete Persons themselves should apply the result with
+        upsert() / remove() so the mirror stays current without another sync.
+        Lookups never touch the network. Safe to share between threads.
+        """
+        self._client = client
+        self.db_path = db_path or os.path.join(DEFAULT_CACHE_DIR, f"persons-{account_key(client)}.sqlite3")
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @property
+    def last_sync(self) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM sync_state WHERE key = 'last_sync'").fetchone()
+        return float(row["value"]) if row else None
+
+    def is_stale(self, max_age: float) -> bool:
+        last_sync = self.last_sync
+        return last_sync is None or time.time() - last_sync > max_age
+
+    def sync(self, per_page: int = 100, window: int = 4) -> Munch:
+        """Bring the mirror in line with the server.
+
+        This is a full re-list: every page of Persons is downloaded, since the API can't list only
+        the ones changed since the last sync. Only the local writes are diffed, so unchanged
+        Persons cost no SQLite writes but still cost their share of the list requests.
+
+        Returns:
+            Munch of added / updated / removed / unchanged counts
+        """
+        stats = Munch(added=0, updated=0, removed=0, unchanged=0)
+        # A failed page must abort the sync, otherwise every Person after it would be treated as deleted
+        pages = PrefetchingPagedIterator(self._client.persons.list, per_page=per_page, window=window,
+                                         raise_errors=True)
+
+        # One sync at a time: they share the connection's staging table
+        with self._sync_lock:
+            with self._lock, self._db:
+                self._db.execute("CREATE TEMP TABLE IF NOT EXISTS seen "
+                                 "(id TEXT PRIMARY KEY, digest TEXT NOT NULL, data TEXT NOT NULL)")
+                self._db.execute("DELETE FROM seen")
+
+            # Page through the server without holding the lock, so lookups and write-throughs
+            # aren't blocked on the network; each page is staged in a short transaction
+            for page in pages:
+                rows = [(person.id, self._digest(person), json.dumps(person, default=str))
+                        for person in page.data]
+                with self._lock, self._db:
+                    self._db.executemany("INSERT OR REPLACE INTO seen (id, digest, data) VALUES (?, ?, ?)", rows)
+
+            with self._lock, self._db:
+                changed = self._db.execute(
+                    "SELECT s.data, s.digest, p.id IS NULL AS added FROM seen s "
+                    "LEFT JOIN persons p ON p.id = s.id "
+                    "WHERE p.id IS NULL OR p.digest != s.digest").fetchall()
+                for row in changed:
+                    if row["added"]:
+                        stats.added += 1
+                    else:
+                        stats.updated += 1
+                    self._write(json.loads(row["data"]), row["digest"])
+                stats.unchanged = (self._db.execute("SELECT COUNT(*) FROM seen").fetchone()[0] -
+                                   stats.added - stats.updated)
+
+                stats.removed = self._db.execute(
+                    "DELETE FROM persons WHERE id NOT IN (SELECT id FROM seen)").rowcount
+                self._db.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('last_sync', ?)",
+                                 (str(time.time()),))
+                self._db.execute("DELETE FROM seen")
+
+        return stats
+
+    def sync_if_stale(self, max_age: float = 300) -> Optional[Munch]:
+        if self.is_stale(max_age):
+            return self.sync()
+        return None
+
+    def upsert(self, person: dict):
+        """Write-through for a Person the caller just created or updated.
+        """
+        with self._lock, self._db:
+            self._write(person, self._digest(person))
+
+    def remove(self, person_id: str):
+        """Write-through for a Person the caller just deleted.
+        """
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM persons WHERE id = ?", (person_id,))
+
+    def get(self, person_id: str) -> Optional[Munch]:
+        return self._one("SELECT data FROM persons WHERE id = ?", (person_id,))
+
+    def find_by_email(self, email: str) -> List[Munch]:
+        return self._find_by_contact(CHANNEL_EMAIL, normalize_email(email))
+
+    def find_by_phone(self, phone: str) -> List[Munch]:
+        return self._find_by_contact(CHANNEL_PHONE, normalize_phone(phone))
+
+    def search_name(self, text: str) -> List[Munch]:
+        return self._many("SELECT data FROM persons WHERE name LIKE ? ORDER BY name",
+                          (f"%{text}%",))
+
+    def all(self) -> Iterator[Munch]:
+        with self._lock:
+            rows = self._db.execute("SELECT data FROM persons ORDER BY name").fetchall()
+        for row in rows:
+            yield munchify(json.loads(row["data"]))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM persons").fetchone()[0]
+
+    def _find_by_contact(self, kind: str, value: Optional[str]) -> List[Munch]:
+        if not value:
+            return []
+        return self._many("SELECT DISTINCT p.data FROM persons p "
+                          "JOIN person_channels c ON c.person_id = p.id "
+                          "WHERE c.kind = ? AND c.value = ?", (kind, value))
+
+    def _one(self, sql, params) -> Optional[Munch]:
+        with self._lock:
+            row = self._db.execute(sql, params).fetchone()
+        return munchify(json.loads(row["data"])) if row else None
+
+    def _many(self, sql, params) -> List[Munch]:
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [munchify(json.loads(row["data"])) for row in rows]
+
+    @staticmethod
+    def _digest(person: dict) -> str:
+        return hashlib.sha1(json.dumps(person, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _write(self, person: dict, digest: str):
+        # Caller holds the lock and the transaction
+        self._db.execute("INSERT OR REPLACE INTO persons (id, name, digest, data) VALUES (?, ?, ?, ?)",
+                         (person["id"], person.get("name"), digest, json.dumps(person, default=str)))
+        self._db.execute("DELETE FROM person_channels WHERE person_id = ?", (person["id"],))
+        self._db.executemany("INSERT INTO person_channels (person_id, kind, value) VALUES (?, ?, ?)",
+                             [(person["id"], kind, value) for kind, value in person_contacts(person)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync and query the local Person mirror")
+    parser.add_argument("--db", help="SQLite file (default: per-account file under ~/.cache/blueink-examples)")
+    parser.add_argument("--sync", action="store_true", help="Sync with the server before querying")
+    parser.add_argument("--id")
+    parser.add_argument("--email")
+    parser.add_argument("--phone")
+    parser.add_argument("--name", help="Substring of the Person's name")
+    args = parser.parse_args()
+
+    mirror = PersonMirror(Client(), db_path=args.db)
+    if args.sync:
+        print(f"Synced: {mirror.sync()}")
+
+    if args.id:
+        found = [p for p in [mirror.get(args.id)] if p]
+    elif args.email:
+        found = mirror.find_by_email(args.email)
+    elif args.phone:
+        found = mirror.find_by_phone(args.phone)
+    elif args.name:
+        found = mirror.search_name(args.name)
+    else:
+        found = []
+        print(f"Persons in mirror: {mirror.count()}")
+
+    for person in found:
+        print(f"  - Person {person.id}: {person.name}")
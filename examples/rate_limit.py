@@ -0,0 +1,84 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+
+
+def retry_after_seconds(response: Optional[requests.Response], default: float = 1.0) -> float:
+    """Seconds to wait according to a response's Retry-After header (delta-seconds or HTTP date).
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return default
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    def __init__(self, rate: float = 10.0, capacity: float = None, min_rate: float = 0.5):
+        """ Token bucket rate limiter shared by any number of worker threads.
+
+        acquire() blocks until a token is available. When the server answers 429, call backoff():
+        every worker is paused until the Retry-After has passed and the refill rate is halved.
+        Each success then nudges the rate back up towards its configured maximum (AIMD), so a
+        burst of 429s slows the whole pool down rather than each worker retrying independently.
+
+        :param rate: max requests per second
+        :param capacity: max burst size (default: one second's worth of tokens)
+        :param min_rate: floor for the refill rate while backing off
+        """
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+        self.throttled = 0
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+
+                wait = max(self._paused_until - now, (tokens - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def backoff(self, delay: float):
+        """Pause every worker for `delay` seconds and halve the refill rate.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._paused_until = max(self._paused_until, now + delay)
+            self._tokens = 0.0
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.throttled += 1
+
+    def recover(self):
+        """Record a success; additively restores the refill rate after a backoff.
+        """
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+from requests import HTTPError
+from requests.exceptions import ConnectTimeout, ConnectionError, RequestException, Timeout
+from urllib3.exceptions import NewConnectionError
+
+from examples.example_utils import install_request_helper
+from examples.instrumentation import ClientMetrics, endpoint_name
+from examples.rate_limit import TokenBucket, retry_after_seconds
+from blueink import Client
+from blueink.request_helper import NormalizedResponse, RequestHelper
+
+HTTP_TOO_MANY_REQUESTS = 429
+RETRYABLE_STATUSES = (HTTP_TOO_MANY_REQUESTS, 500, 502, 503, 504)
+# Repeating one of these has the same effect as sending it once. PATCH is included because every
+# PATCH these examples make sets fields to given values.
+IDEMPOTENT_METHODS = ("get", "head", "options", "put", "patch", "delete")
+
+# Set while a thread is inside RetryPolicy.call, so retry loops don't nest (e.g. a bulk operation
+# retrying calls on a Client that retries them itself): only the outermost loop retries.
+_active = threading.local()
+
+
+def _is_connect_error(error: RequestException) -> bool:
+    """True if the request failed before it reached the server, so it cannot have been processed.
+    """
+    if isinstance(error, ConnectTimeout):
+        return True
+    if isinstance(error, ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0,
+                 limiter: TokenBucket = None, metrics: ClientMetrics = None):
+        """ When and how long to wait before retrying a failed API call.
+
+        - HTTP 429 and connection failures are always retried: the server did not act on the request.
+        - HTTP 5xx and timeouts are only retried for idempotent calls, since a create that timed out
+          may still have gone through.
+        - Delays grow exponentially with full jitter, and never undercut a Retry-After header.
+
+        With a limiter, every attempt takes a token from it and a 429 pauses and slows down every
+        worker sharing it, instead of each worker backing off on its own.
+
+        :param max_attempts: attempts per call, including the first
+        :param base_delay: delay cap before the second attempt; doubles with each further attempt
+        :param max_delay: upper bound for any single delay
+        :param limiter: TokenBucket shared by all workers
+        :param metrics: ClientMetrics to record retries in
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = limiter
+        self.metrics = metrics
+
+    def delay(self, attempt: int, response=None) -> float:
+        """Seconds to wait after failed attempt number `attempt` (1-based).
+        """
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if response is not None and "Retry-After" in response.headers:
+            return min(self.max_delay, max(backoff, retry_after_seconds(response)))
+        return backoff
+
+    def should_retry(self, error: RequestException, idempotent: bool) -> bool:
+        if isinstance(error, HTTPError):
+            status = error.response.status_code if error.response is not None else None
+            if status == HTTP_TOO_MANY_REQUESTS:
+                return True
+            return idempotent and status in RETRYABLE_STATUSES
+        if _is_connect_error(error):
+            return True
+        return idempotent and isinstance(error, (ConnectionError, Timeout))
+
+    def call(self, fn: Callable, *args, idempotent: bool = True, endpoint: str = None,
+             before_retry: Callable[[], bool] = None, **kwargs):
+        """Call fn(*args, **kwargs), retrying failures this policy allows.
+
+        :param idempotent: whether repeating the call is safe even if the server acted on it
+        :param endpoint: name to record retries under in metrics
+        :param before_retry: called before each retry, e.g. to rewind a request body; returning
+            False stops retrying
+        """
+        if getattr(_active, "retrying", False):
+            return fn(*args, **kwargs)
+
+        _active.retrying = True
+        try:
+            return self._call(fn, args, kwargs, idempotent, endpoint, before_retry)
+        finally:
+            _active.retrying = False
+
+    def _call(self, fn, args, kwargs, idempotent, endpoint, before_retry):
+        for attempt in range(1, self.max_attempts + 1):
+            if self.limiter:
+                self.limiter.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except RequestException as e:
+                if attempt == self.max_attempts or not self.should_retry(e, idempotent):
+                    raise
+                if before_retry is not None and before_retry() is False:
+                    raise
+                self._wait(attempt, e)
+                if self.metrics and endpoint:
+                    self.metrics.record_retry(endpoint)
+                continue
+
+            if self.limiter:
+                self.limiter.recover()
+            return result
+
+    def _wait(self, attempt: int, error: RequestException):
+        response = getattr(error, "response", None)
+        delay = self.delay(attempt, response)
+        if self.limiter and response is not None and response.status_code == HTTP_TOO_MANY_REQUESTS:
+            # Pauses every worker; this one then waits in acquire() like the rest
+            self.limiter.backoff(delay)
+        else:
+            time.sleep(delay)
+
+
+def _rewind(data, files) -> bool:
+    """Reset a request's body so it can be sent again. False if some part of it can't be.
+    """
+    if hasattr(data, "read"):
+        if not hasattr(data, "rewind"):
+            return False
+        data.rewind()
+
+    # files is a dict or a list of (name, value) pairs, as requests takes it; each value is a file
+    # object or a (filename, file object[, content type[, headers]]) tuple
+    for value in (files.values() if isinstance(files, dict) else (entry[1] for entry in files or ())):
+        fh = value[1] if isinstance(value, (tuple, list)) else value
+        if hasattr(fh, "read"):
+            if not fh.seekable():
+                return False
+            fh.seek(0)
+    return True
+
+
+class RetryingRequestHelper(RequestHelper):
+    def __init__(self, inner: RequestHelper, policy: RetryPolicy, idempotency_header: Optional[str] = None):
+        """ RequestHelper retrying the calls of an inner RequestHelper according to a RetryPolicy.
+
+        POSTs create objects and are only retried when the server certainly did not act on them,
+        unless idempotency_header is set: each POST then carries a fresh key in that header, the
+        same key on every attempt, and is retried like any idempotent call.
+        """
+        super().__init__(inner._private_api_key)
+        self._inner = inner
+        self.policy = policy
+        self.idempotency_header = idempotency_header
+
+    def _make_request(self, method, url, data=None, json=None, files=None, params=None, headers=None,
+                      content_type=None) -> NormalizedResponse:
+        idempotent = method.lower() in IDEMPOTENT_METHODS
+        if not idempotent and self.idempotency_header:
+            headers = {**(headers or {}), self.idempotency_header: uuid.uuid4().hex}
+            idempotent = True
+
+        return self.policy.call(self._inner._make_request, method, url,
+                                data=data, json=json, files=files, params=params,
+                                headers=headers, content_type=content_type,
+                                idempotent=idempotent,
+                                endpoint=endpoint_name(method, url),
+                                before_retry=lambda: _rewind(data, files))
+
+
+def use_retries(client: Client, policy: RetryPolicy = None,
+                idempotency_header: Optional[str] = None) -> RetryingRequestHelper:
+    """Retry the Client's calls from now on. Install this last, after use_pooled_transport and
+    instrument_client, so every attempt is timed.
+    """
+    helper = RetryingRequestHelper(client._request_helper, policy or RetryPolicy(), idempotency_header)
+    install_request_helper(client, helper)
+    return helper
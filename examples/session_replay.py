@@ -0,0 +1,148 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from munch import Munch
+
+from examples.benchmark import percentile
+from examples.bundle_example import ClientBundleExample
+from examples.input_source import (ConsoleInput, InputSource, RecordingInput, ReplayInput, load_script,
+                                   save_script, use_input_source)
+from examples.person_example import ClientPersonExample
+from blueink import Client
+
+EXAMPLES = {
+    "bundle": ClientBundleExample,
+    "person": ClientPersonExample,
+}
+
+
+def run_session(client: Client, example: str, source: InputSource) -> Munch:
+    """Run one whole menu session of an example, answering every prompt from `source`.
+
+    A source running out of answers (or Ctrl-D / Ctrl-C at the console) ends the session normally.
+
+    Returns:
+        Munch with ok, error (a traceback) if the session raised, elapsed seconds and the
+        timed steps (see RecordingInput)
+    """
+    recorder = RecordingInput(source)
+    result = Munch(ok=True, error=None, elapsed=0.0, steps=recorder.steps)
+    started = time.perf_counter()
+    try:
+        with use_input_source(recorder):
+            EXAMPLES[example](client).start()
+    except (EOFError, KeyboardInterrupt):
+        # ScriptExhausted is an EOFError
+        pass
+    except Exception:
+        result.ok = False
+        result.error = traceback.format_exc()
+    finally:
+        recorder.finish()
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def replay(client: Client, example: str, script: List[dict], runs: int = 1, max_workers: int = 1) -> Munch:
+    """Replay a recorded script `runs` times, `max_workers` sessions at a time.
+
+    Returns:
+        Munch with sessions / failed counts, elapsed seconds, sessions_per_sec, the first error
+        and per-step stats: p50 / p95 seconds from each answer to the next prompt
+    """
+    def one(_):
+        return run_session(client, example, ReplayInput(script))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(one, range(runs)))
+    elapsed = time.perf_counter() - started
+
+    work_by_step: Dict[int, List[float]] = {}
+    for result in results:
+        for step in result.steps:
+            work_by_step.setdefault(step.step, []).append(step.work or 0.0)
+
+    step_stats = []
+    for number, step in enumerate(script, start=1):
+        work = sorted(work_by_step.get(number, []))
+        step_stats.append(Munch(step=number, prompt=step["prompt"], answer=step["answer"], runs=len(work),
+                                p50=percentile(work, 50), p95=percentile(work, 95)))
+
+    failed = [r for r in results if not r.ok]
+    return Munch(sessions=runs,
+                 failed=len(failed),
+                 elapsed=elapsed,
+                 sessions_per_sec=runs / elapsed if elapsed else 0.0,
+                 first_error=failed[0].error if failed else None,
+                 steps=step_stats)
+
+
+def print_replay_summary(summary: Munch, slowest: int = 10):
+    print(f"Sessions: {summary.sessions}, Failed: {summary.failed}, Elapsed: {summary.elapsed:.1f}s "
+          f"({summary.sessions_per_sec:.1f} sessions/sec)")
+    if summary.first_error:
+        print(f"First failure:\n{summary.first_error}")
+
+    print(f"Slowest steps (seconds from answer to next prompt):")
+    print(f"{'step':>5} {'p50 ms':>9} {'p95 ms':>9}  prompt -> answer")
+    for step in sorted(summary.steps, key=lambda s: s.p95, reverse=True)[:slowest]:
+        print(f"{step.step:>5} {step.p50 * 1000:>9.1f} {step.p95 * 1000:>9.1f}  {step.prompt} -> {step.answer!r}")
+
+
+@contextlib.contextmanager
+def _client(use_mock: bool):
+    if not use_mock:
+        yield Client()
+        return
+
+    from examples.mock_server import MockBlueInkServer
+    with MockBlueInkServer() as server:
+        server.state.seed(bundles=50, persons=20, templates=5)
+        yield Client(private_api_key="replay", base_url=server.url)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record an interactive example session, or replay one unattended")
+    parser.add_argument("--mock", action="store_true", help="Run against a local mock BlueInk server")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Run an example at the console, saving every answer")
+    record_parser.add_argument("example", choices=sorted(EXAMPLES))
+    record_parser.add_argument("script", help="JSONL file to save the answers to")
+
+    replay_parser = subparsers.add_parser("replay", help="Replay a recorded session, e.g. as a load test")
+    replay_parser.add_argument("example", choices=sorted(EXAMPLES))
+    replay_parser.add_argument("script", help="JSONL file recorded with `record`")
+    replay_parser.add_argument("--runs", type=int, default=1)
+    replay_parser.add_argument("--workers", type=int, default=1, help="Sessions run concurrently")
+    replay_parser.add_argument("--echo", action="store_true", help="Show the sessions' output")
+    replay_parser.add_argument("--timings", help="Write per-step timings as JSON")
+    args = parser.parse_args()
+
+    with _client(args.mock) as client:
+        if args.command == "record":
+            result = run_session(client, args.example, ConsoleInput())
+            save_script(result.steps, args.script)
+            print(f"Recorded {len(result.steps)} answers to {args.script}")
+            if result.error:
+                print(result.error)
+            sys.exit(0 if result.ok else 1)
+
+        with contextlib.ExitStack() as stack:
+            if not args.echo:
+                stack.enter_context(contextlib.redirect_stdout(open(os.devnull, "w")))
+            summary = replay(client, args.example, load_script(args.script), args.runs, args.workers)
+
+    print_replay_summary(summary)
+    if args.timings:
+        with open(args.timings, "w") as fh:
+            json.dump(summary.steps, fh, indent=2)
+    sys.exit(1 if summary.failed else 0)
@@ -0,0 +1,134 @@
+import io
+import json
+import os
+import uuid
+from typing import List
+
+from blueink import Client, BundleHelper
+from blueink.endpoints import BUNDLES as BUNDLE_ENDPOINTS
+from blueink.request_helper import NormalizedResponse
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# Local files larger than this are streamed on send rather than read into memory
+STREAMING_THRESHOLD = 16 * 1024 * 1024
+
+
+class _FilePart:
+    def __init__(self, fh: io.BufferedIOBase, chunk_size: int):
+        """ One file of a multipart body, read from its handle one chunk at a time.
+
+        Plain reads are used rather than a memory map: mapped pages count towards RSS until the
+        kernel reclaims them, so a mapped 100 MB file shows up as 100 MB resident.
+        """
+        self._fh = fh
+        self._chunk_size = chunk_size
+        self._offset = 0
+
+        self._start = fh.tell()
+        self.length = fh.seek(0, io.SEEK_END) - self._start
+        fh.seek(self._start)
+
+    def rewind(self):
+        self._fh.seek(self._start)
+        self._offset = 0
+
+    def read(self, size: int) -> bytes:
+        size = min(size, self._chunk_size, self.length - self._offset)
+        if size <= 0:
+            return b""
+
+        chunk = self._fh.read(size)
+        self._offset += len(chunk)
+        return chunk
+
+
+class StreamingMultipartBody:
+    def __init__(self, fields: dict, files: List[tuple], chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """ multipart/form-data request body that is produced on demand, never held in memory whole.
+
+        requests sends any object with read() and __len__ as a streamed body with a Content-Length,
+        so at most one chunk of each file is resident at a time.
+
+        :param fields: plain form fields, name -> str
+        :param files: (field name, filename, open binary file handle, content type or None) tuples
+        :param chunk_size: max bytes read from a file per read() call
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+
+        # A mix of bytes (headers, small fields) and _FilePart parts, sent in order
+        self._parts = []
+        for name, value in fields.items():
+            self._parts.append(self._part_header(name) + value.encode() + b"\r\n")
+        for name, filename, fh, content_type in files:
+            self._parts.append(self._part_header(name, filename, content_type))
+            self._parts.append(_FilePart(fh, chunk_size))
+            self._parts.append(b"\r\n")
+        self._parts.append(f"--{self.boundary}--\r\n".encode())
+
+        self._length = sum(len(p) if isinstance(p, bytes) else p.length for p in self._parts)
+        self._index = 0
+        self._pending = b""
+
+    def _part_header(self, name: str, filename: str = None, content_type: str = None) -> bytes:
+        disposition = f'form-data; name="{name}"'
+        if filename:
+            disposition += f'; filename="{os.path.basename(filename)}"'
+        header = f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n"
+        if filename:
+            header += f"Content-Type: {content_type or 'application/octet-stream'}\r\n"
+        return (header + "\r\n").encode()
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(DEFAULT_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    def rewind(self):
+        """Start over from the first byte, e.g. to send the body again on a retry.
+        """
+        for part in self._parts:
+            if not isinstance(part, bytes):
+                part.rewind()
+        self._index = 0
+        self._pending = b""
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = DEFAULT_CHUNK_SIZE
+
+        while not self._pending and self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, bytes):
+                self._pending = part
+                self._index += 1
+            else:
+                self._pending = part.read(size)
+                if not self._pending:
+                    self._index += 1
+
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+
+def send_bundle_streaming(client: Client, helper: BundleHelper,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE) -> NormalizedResponse:
+    """Create a Bundle like client.bundles.create_from_bundle_helper, but stream any attached files.
+
+    Peak memory for the upload is bounded by chunk_size rather than by the size of the files.
+    """
+    data = helper.as_data()
+    if not helper.files:
+        return client.bundles.create(data=data)
+
+    files = [(f"files[{idx}]", f.get("filename"), f["file"], f.get("content_type"))
+             for idx, f in enumerate(helper.files)]
+    body = StreamingMultipartBody({"bundle_request": json.dumps(data)}, files, chunk_size)
+
+    url = client.bundles.build_url(BUNDLE_ENDPOINTS.CREATE)
+    return client.bundles._requests.post(url, data=body, headers={"Content-Type": body.content_type})
@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+
+from munch import Munch, munchify
+
+from examples.example_utils import DEFAULT_CACHE_DIR, account_key
+from blueink import Client
+from blueink.endpoints import TEMPLATES as TEMPLATE_ENDPOINTS
+
+DEFAULT_TTL = 60 * 60
+
+
+class TemplateCache:
+    def __init__(self, client: Client, cache_dir: str = None, ttl: float = DEFAULT_TTL):
+        """ Persistent, per-account cache of the templates list.
+
+        Entries younger than `ttl` seconds are served without any network I/O. Once stale, the
+        list is revalidated with If-None-Match / If-Modified-Since when the server supplied an
+        ETag / Last-Modified, so an unchanged list costs a 304 rather than a full download.
+        Safe to share between threads.
+        """
+        self._client = client
+        self.ttl = ttl
+        self.path = os.path.join(cache_dir or DEFAULT_CACHE_DIR, f"templates-{account_key(client)}.json")
+
+        self._lock = threading.Lock()
+        self._entry = None
+        self._templates = None
+
+    def templates(self, force_refresh: bool = False) -> List[Munch]:
+        """Return all templates, hitting the network only when the cache is stale or missing.
+        """
+        with self._lock:
+            if self._entry is None:
+                self._entry = self._load()
+                self._templates = None
+
+            fresh = self._entry and time.time() - self._entry["fetched_at"] < self.ttl
+            if force_refresh or not fresh:
+                previous = self._entry
+                self._entry = self._revalidate(previous)
+                self._save(self._entry)
+                if self._entry is not previous:
+                    self._templates = None
+
+            if self._templates is None:
+                self._templates = munchify(self._entry["templates"])
+            return self._templates
+
+    def get(self, template_id: str) -> Optional[Munch]:
+        for template in self.templates():
+            if template.id == template_id:
+                return template
+        return None
+
+    def roles(self, template_id: str) -> List[str]:
+        template = self.get(template_id)
+        return list(template.roles) if template else []
+
+    def invalidate(self):
+        """Drop both the in-memory and on-disk copies; the next read goes to the network.
+        """
+        with self._lock:
+            self._entry = None
+            self._templates = None
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def _revalidate(self, entry: Optional[dict]) -> dict:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        sub_client = self._client.templates
+        url = sub_client.build_url(TEMPLATE_ENDPOINTS.LIST)
+        resp = sub_client._requests.get(url, headers=headers or None)
+
+        if resp.status == 304 and entry:
+            entry["fetched_at"] = time.time()
+            return entry
+
+        response_headers = resp.original_response.headers
+        return {
+            "fetched_at": time.time(),
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+            "templates": resp.data,
+        }
+
+    def _load(self) -> Optional[dict]:
+        try:
+            with open(self.path) as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, entry: dict):
+        # Write then rename, so a concurrent reader never sees a half-written file
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(entry, fh)
+        os.replace(tmp_path, self.path)
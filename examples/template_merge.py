@@ -0,0 +1,254 @@
+import argparse
+import csv
+import json
+import re
+import time
+from typing import Dict, Iterable, Iterator, List, Mapping
+
+from munch import Munch
+from requests import HTTPError, RequestException
+
+from examples.bulk_send import BulkBundleSender, print_result, print_summary
+from examples.bundle_serializer import dumps
+from examples.bundle_validator import DEFAULT_VALIDATOR, BundleValidator, valid_email
+from examples.instrumentation import instrument_client
+from examples.job_journal import JobJournal, open_journal
+from examples.rate_limit import TokenBucket
+from examples.retry import RetryPolicy, use_retries
+from examples.template_cache import TemplateCache
+from examples.transport import use_pooled_transport
+from blueink import Client, BundleHelper
+from blueink.constants import DELIVER_VIA
+from blueink.endpoints import BUNDLES as BUNDLE_ENDPOINTS
+
+# {column} references in a label format, e.g. "NDA for {signer-1.name}"
+_LABEL_COLUMN = re.compile(r"{([^{}]+)}")
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def read_recipients(path: str) -> Iterator[Munch]:
+    """Lazily read mail merge recipients, one flat Munch per Bundle.
+
+    Files ending in .csv are read with csv.DictReader, anything else as JSONL. Columns are
+    <role>.name, <role>.email and <role>.phone for each template role, field.<key> for template
+    field values, and optionally label (used by the default label format), e.g.
+        {"signer-1.name": "Homer Simpson", "signer-1.email": "homer@example.com", "field.salary": "100"}
+    """
+    with open(path, newline="") as fh:
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(fh):
+                yield Munch(row)
+        else:
+            for line in fh:
+                if line.strip():
+                    yield Munch(json.loads(line))
+
+
+class CompiledTemplate:
+    def __init__(self, template_id: str, roles: Mapping[str, str], field_keys: Iterable[str] = (),
+                 defaults: Mapping[str, str] = None, label: str = None, email_subject: str = None,
+                 email_message: str = None, is_test: bool = True,
+                 validator: BundleValidator = DEFAULT_VALIDATOR):
+        """ A template Bundle compiled once into a JSON payload with holes, for mail merge.
+
+        The Bundle is built and validated once through BundleHelper, with one signer per role
+        (role -> deliver_via, "email" or "phone") and one value per template field key. Its JSON
+        is then split around every per-recipient value: signer names, emails / phones, field
+        values and the label. render() only JSON encodes a recipient's values and joins them
+        with the constant chunks, with no BundleHelper, pydantic models or payload dicts.
+
+        :param defaults: field key -> value, for recipients without a field.<key> column
+        :param label: format of each Bundle's label over recipient columns, e.g. "NDA for {signer-1.name}".
+            By default a recipient's label column, or "Template <template id>" when it has none
+        """
+        self.template_id = template_id
+        self.roles = dict(roles)
+        self.field_keys = list(field_keys)
+        self.defaults = {f"field.{key}": value for key, value in (defaults or {}).items()}
+
+        self._label_parts = _LABEL_COLUMN.split(label) if label is not None else None
+        self._default_label = f"Template {template_id}"
+        columns = []
+        placeholders = {}
+
+        def slot(column: str, placeholder: str = None) -> str:
+            placeholder = placeholder or f"merge-slot-{len(columns)}"
+            placeholders[placeholder] = len(columns)
+            columns.append(column)
+            return placeholder
+
+        helper = BundleHelper(label=slot("label"), email_subject=email_subject, email_message=email_message,
+                              is_test=is_test)
+        # BundleHelper.set_value appends to field_values, which is None unless given
+        doc_key = helper.add_document_template(template_id, field_values=[])
+        for role, deliver_via in self.roles.items():
+            contact = {}
+            if deliver_via == DELIVER_VIA.SMS:
+                contact["phone"] = slot(f"{role}.phone")
+            else:
+                contact["email"] = slot(f"{role}.email", f"merge-slot-{len(columns)}@example.com")
+            helper.add_signer(key=role, name=slot(f"{role}.name"), deliver_via=deliver_via, **contact)
+            helper.assign_role(doc_key, role, role)
+        for key in self.field_keys:
+            helper.set_value(doc_key, key, slot(f"field.{key}"))
+        if validator:
+            validator.check(helper)
+
+        payload = dumps(helper.as_data())
+        pattern = re.compile(b"|".join(re.escape(dumps(p)) for p in placeholders))
+        chunks, order, start = [], [], 0
+        for match in pattern.finditer(payload):
+            chunks.append(payload[start:match.start()])
+            order.append(columns[placeholders[json.loads(match.group())]])
+            start = match.end()
+        chunks.append(payload[start:])
+
+        self.columns = order
+        self._chunks = chunks
+        self._email_columns = {f"{role}.email" for role, deliver_via in self.roles.items()
+                               if deliver_via != DELIVER_VIA.SMS}
+
+    def label(self, recipient: Mapping[str, str]) -> str:
+        parts = self._label_parts
+        if parts is None:
+            return str(recipient.get("label") or self._default_label)
+
+        label = []
+        # Odd parts are column names, even parts literal text
+        for i, part in enumerate(parts):
+            if i % 2:
+                value = recipient.get(part)
+                if value is None:
+                    raise ValueError(f"Recipient has no value for {part}")
+                label.append(str(value))
+            else:
+                label.append(part)
+        return "".join(label)
+
+    def render(self, recipient: Mapping[str, str], label: str = None) -> bytes:
+        """The create Bundle request body for one recipient. Raises ValueError if a column is
+        missing or empty and has no default, or an email is malformed.
+        """
+        defaults = self.defaults
+        for column in self._email_columns:
+            if not valid_email(recipient.get(column)):
+                raise ValueError(f"Recipient {column} '{recipient.get(column)}' is not a valid email")
+        body = [self._chunks[0]]
+        try:
+            for column, chunk in zip(self.columns, self._chunks[1:]):
+                if column == "label":
+                    value = label if label is not None else self.label(recipient)
+                else:
+                    value = recipient.get(column)
+                    if value is None or value == "":
+                        value = defaults[column]
+                    elif not isinstance(value, str):
+                        # e.g. numbers from JSONL; the API takes names and field values as strings
+                        value = str(value)
+                body.append(dumps(value))
+                body.append(chunk)
+        except KeyError as e:
+            raise ValueError(f"Recipient has no value for {e.args[0]}")
+        return b"".join(body)
+
+
+def compile_template(client: Client, template_id: str, roles: Mapping[str, str] = None,
+                     template_cache: TemplateCache = None, **kwargs) -> CompiledTemplate:
+    """Compile a template for mail merge, checking its roles against the account's templates.
+
+    Without roles, every role of the template is delivered by email.
+    """
+    template_cache = template_cache or TemplateCache(client)
+    template = template_cache.get(template_id)
+    if template is None:
+        raise ValueError(f"No template with id {template_id}")
+
+    known = list(template.roles)
+    roles = dict(roles) if roles else {role: DELIVER_VIA.EMAIL for role in known}
+    unknown = [role for role in roles if role not in known]
+    if unknown:
+        raise ValueError(f"Template {template_id} has no roles {unknown}, only {known}")
+    return CompiledTemplate(template_id, roles, **kwargs)
+
+
+class MailMergeSender(BulkBundleSender):
+    def __init__(self, client: Client, template: CompiledTemplate, max_workers: int = 8,
+                 journal: JobJournal = None):
+        """ Sends one Bundle per recipient from a CompiledTemplate, through BulkBundleSender's
+        bounded thread pool, so recipients are streamed in and never all held in memory.
+        """
+        super(MailMergeSender, self).__init__(client, max_workers=max_workers, validator=None, journal=journal)
+        self.template = template
+        self._url = client.bundles.build_url(BUNDLE_ENDPOINTS.CREATE)
+
+    def send_one(self, recipient: Mapping[str, str]) -> Munch:
+        """Render and send a single recipient's Bundle. Never raises; the outcome is returned as a Munch.
+        """
+        result = Munch(label=None, ok=False, bundle_id=None, status=None, error=None)
+        started = time.perf_counter()
+        try:
+            result.label = self.template.label(recipient)
+            body = self.template.render(recipient, result.label)
+            response = self._client.bundles._requests.post(self._url, data=body, headers=_JSON_HEADERS)
+            result.ok = True
+            result.status = response.status
+            result.bundle_id = response.data.get("id")
+        except HTTPError as e:
+            result.status = e.response.status_code if e.response is not None else None
+            result.error = e.response.text if e.response is not None else str(e)
+        except (ValueError, RequestException) as e:
+            # Bad recipient row, or the request failed without a response (after any retries)
+            result.error = str(e)
+
+        result.elapsed = time.perf_counter() - started
+        return result
+
+
+def parse_roles(specs: List[str]) -> Dict[str, str]:
+    """role -> deliver_via from "role" / "role=phone" command line values.
+    """
+    roles = {}
+    for spec in specs:
+        role, _, deliver_via = spec.partition("=")
+        roles[role] = DELIVER_VIA.SMS if deliver_via in ("phone", DELIVER_VIA.SMS) else DELIVER_VIA.EMAIL
+    return roles
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send one templated Bundle per recipient (mail merge)")
+    parser.add_argument("template_id")
+    parser.add_argument("recipients", help="Path to a .csv or .jsonl file of recipients")
+    parser.add_argument("--role", action="append", default=[],
+                        help="role or role=phone, repeatable (default: every template role, by email)")
+    parser.add_argument("--field", action="append", default=[], help="Template field key to fill, repeatable")
+    parser.add_argument("--default", action="append", default=[], help="key=value default for a field")
+    parser.add_argument("--label", help='Label format, e.g. "NDA for {signer-1.name}" (default: the label column)')
+    parser.add_argument("--subject", help="Email subject")
+    parser.add_argument("--message", help="Email message")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent sends (default 8)")
+    parser.add_argument("--rate", type=float, default=10.0, help="Max requests per second (default 10)")
+    parser.add_argument("--live", action="store_true", help="Send as live bundles instead of test bundles")
+    parser.add_argument("--metrics", action="store_true", help="Print per-endpoint API call metrics at exit")
+    parser.add_argument("--journal", help="Journal file; re-running with it skips recipients already sent to")
+    args = parser.parse_args()
+
+    client = Client()
+    use_pooled_transport(client, pool_maxsize=args.workers, print_at_exit=True)
+    metrics = instrument_client(client) if args.metrics else None
+    use_retries(client, RetryPolicy(limiter=TokenBucket(rate=args.rate), metrics=metrics))
+
+    compiled = compile_template(client, args.template_id, parse_roles(args.role),
+                                field_keys=args.field,
+                                defaults=dict(d.partition("=")[::2] for d in args.default),
+                                label=args.label,
+                                email_subject=args.subject,
+                                email_message=args.message,
+                                is_test=not args.live)
+    journal = open_journal(args.journal)
+    try:
+        sender = MailMergeSender(client, compiled, max_workers=args.workers, journal=journal)
+        summary = sender.send_all(read_recipients(args.recipients), on_result=print_result)
+    finally:
+        if journal:
+            journal.close()
+    print_summary(summary)
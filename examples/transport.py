@@ -0,0 +1,179 @@
+import atexit
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from munch import Munch
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from examples.example_utils import install_request_helper
+from blueink import Client
+from blueink.request_helper import NormalizedResponse, RequestHelper
+
+DEFAULT_POOL_HOSTS = 10
+DEFAULT_POOL_MAXSIZE = 32
+DEFAULT_KEEP_ALIVE_TIMEOUT = 30.0
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connects = 0
+        self.expired = 0
+
+    def add(self, requests: int = 0, connects: int = 0, expired: int = 0):
+        with self._lock:
+            self.requests += requests
+            self.connects += connects
+            self.expired += expired
+
+    def as_munch(self) -> Munch:
+        with self._lock:
+            reused = max(0, self.requests - self.connects)
+            return Munch(requests=self.requests,
+                         connects=self.connects,
+                         expired=self.expired,
+                         hit_rate=reused / self.requests if self.requests else 0.0)
+
+
+def _counting_pool_classes(stats: PoolStats) -> dict:
+    """urllib3 pool classes whose connections count every (re)connect, i.e. every TCP / TLS handshake.
+    """
+    class CountingHTTPConnection(HTTPConnection):
+        def connect(self):
+            stats.add(connects=1)
+            super().connect()
+
+    class CountingHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            stats.add(connects=1)
+            super().connect()
+
+    class CountingHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = CountingHTTPConnection
+
+    class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = CountingHTTPSConnection
+
+    return {"http": CountingHTTPConnectionPool, "https": CountingHTTPSConnectionPool}
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    def __init__(self, stats: PoolStats, **kwargs):
+        self._stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _counting_pool_classes(self._stats)
+
+
+class PooledRequestHelper(RequestHelper):
+    def __init__(self, private_api_key, pool_hosts: int = DEFAULT_POOL_HOSTS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 keep_alive_timeout: float = DEFAULT_KEEP_ALIVE_TIMEOUT):
+        """ RequestHelper sending every request through one shared, pooled requests.Session.
+
+        The stock RequestHelper calls requests.request(), which opens (and TLS-handshakes) a new
+        connection for every call. Here connections are kept alive and reused across calls and
+        threads; when all pool_maxsize connections to a host are busy, further threads wait for
+        one instead of opening and then discarding extra connections ("pool is full" warnings).
+
+        :param pool_hosts: number of per-host pools to keep
+        :param pool_maxsize: max connections kept per host; size it to the number of worker threads
+        :param keep_alive_timeout: idle connections to a host older than this many seconds are closed
+            before reuse, instead of failing on a socket the server already dropped
+        """
+        super().__init__(private_api_key)
+        self.keep_alive_timeout = keep_alive_timeout
+        self.stats = PoolStats()
+
+        self._adapter = _CountingHTTPAdapter(self.stats,
+                                             pool_connections=pool_hosts,
+                                             pool_maxsize=pool_maxsize,
+                                             pool_block=True)
+        self._session = requests.Session()
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+    def _make_request(
+        self, method, url, data=None, json=None, files=None, params=None, headers=None, content_type=None
+    ) -> NormalizedResponse:
+        self._expire_idle(url)
+        response = self._session.request(
+            method,
+            url,
+            params=params,
+            data=data,
+            json=json,
+            headers=self._build_headers(content_type=content_type, more_headers=headers),
+            files=files,
+        )
+        self.stats.add(requests=1)
+        response.raise_for_status()
+        return NormalizedResponse(response)
+
+    def _expire_idle(self, url: str):
+        host = urlparse(url).netloc
+        now = time.monotonic()
+        with self._lock:
+            last_used = self._last_used.get(host)
+            self._last_used[host] = now
+        if last_used is None or now - last_used <= self.keep_alive_timeout:
+            return
+
+        # Close every idle connection to this host; closed connections reconnect on next use
+        pool = self._adapter.poolmanager.connection_from_url(url)
+        idle = []
+        while True:
+            try:
+                idle.append(pool.pool.get(block=False))
+            except (queue.Empty, AttributeError):
+                break
+        for conn in idle:
+            if conn is not None and conn.sock is not None:
+                conn.close()
+                self.stats.add(expired=1)
+            pool.pool.put(conn, block=False)
+
+    def pool_stats(self) -> Munch:
+        """requests, connects (handshakes), expired idle connections, and hit_rate: the share of
+        requests that reused an open connection.
+        """
+        return self.stats.as_munch()
+
+    def print_pool_stats(self):
+        stats = self.pool_stats()
+        if stats.requests:
+            print(f"Connection pool: {stats.requests} requests, {stats.connects} new connections, "
+                  f"{stats.expired} expired, {stats.hit_rate:.1%} reuse")
+
+    def close(self):
+        self._session.close()
+
+
+def use_pooled_transport(client: Client, pool_hosts: int = DEFAULT_POOL_HOSTS,
+                         pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                         keep_alive_timeout: float = DEFAULT_KEEP_ALIVE_TIMEOUT,
+                         print_at_exit: bool = False) -> PooledRequestHelper:
+    """Switch a Client to a pooled, keep-alive transport that is safe to share across worker threads.
+
+    Install this before wrapping the Client with instrumentation, so the instrumentation sees
+    the pooled transport's timings.
+    """
+    helper = PooledRequestHelper(client._request_helper._private_api_key,
+                                 pool_hosts=pool_hosts,
+                                 pool_maxsize=pool_maxsize,
+                                 keep_alive_timeout=keep_alive_timeout)
+    install_request_helper(client, helper)
+    if print_at_exit:
+        atexit.register(helper.print_pool_stats)
+    return helper
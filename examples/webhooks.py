@@ -0,0 +1,325 @@
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional
+
+import requests
+from munch import Munch
+
+from blueink.constants import BUNDLE_STATUS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEBHOOK_PATH = "/webhooks/blueink"
+# Header carrying the hex HMAC-SHA256 of the request body, when the receiver has a secret.
+# Match it to how the webhook is configured on the BlueInk account.
+DEFAULT_SIGNATURE_HEADER = "X-Blueink-Signature"
+
+TERMINAL_STATUSES = (BUNDLE_STATUS.COMPLETE, BUNDLE_STATUS.CANCELLED, BUNDLE_STATUS.EXPIRED,
+                     BUNDLE_STATUS.FAILED)
+# Bundle status implied by an event type, for events whose payload carries no status
+EVENT_STATUS = Munch(
+    bundle_sent=BUNDLE_STATUS.SENT,
+    bundle_started=BUNDLE_STATUS.STARTED,
+    bundle_complete=BUNDLE_STATUS.COMPLETE,
+    bundle_cancelled=BUNDLE_STATUS.CANCELLED,
+    bundle_expired=BUNDLE_STATUS.EXPIRED,
+    bundle_error=BUNDLE_STATUS.FAILED,
+)
+# Event ids remembered to drop redeliveries
+SEEN_EVENTS = 10000
+
+
+def sign(secret: str, body: bytes) -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def parse_event(payload: dict) -> Optional[Munch]:
+    """Bundle id, status and event metadata from a webhook payload, or None if it isn't about a Bundle.
+
+    Accepts the Bundle either at the top level of the payload or nested under "bundle" / "data".
+    """
+    event_type = payload.get("event_type") or payload.get("event") or payload.get("type")
+    if not isinstance(event_type, str):
+        event_type = None
+    bundle = payload.get("bundle") or payload.get("data") or {}
+    if not isinstance(bundle, dict):
+        bundle = {}
+    if isinstance(bundle.get("bundle"), dict):
+        bundle = bundle["bundle"]
+
+    bundle_id = bundle.get("id") or payload.get("bundle_id")
+    status = bundle.get("status") or EVENT_STATUS.get(event_type)
+    if not isinstance(bundle_id, str) or not bundle_id or not isinstance(status, str) or not status:
+        return None
+    event_id = payload.get("id") or payload.get("event_id")
+    return Munch(event_id=str(event_id) if event_id is not None else None,
+                 event_type=event_type,
+                 bundle_id=bundle_id,
+                 status=status,
+                 bundle=bundle)
+
+
+class BundleStatusStore:
+    def __init__(self):
+        """ Latest known status of each Bundle, fed by webhook events (or anything else).
+
+        Callers can block until a Bundle reaches a status, or subscribe to changes. A Bundle
+        in a terminal status (complete, cancelled, expired, failed) doesn't go back to an earlier
+        one when an event arrives out of order.
+        """
+        self._statuses: Dict[str, Munch] = {}
+        self._changed = threading.Condition()
+        self._subscribers: List[tuple] = []
+
+    def update(self, bundle_id: str, status: str, event_type: str = None) -> bool:
+        """Record a Bundle's status. Returns True if it changed.
+        """
+        with self._changed:
+            current = self._statuses.get(bundle_id)
+            if current is not None and (current.status == status or
+                                        (current.status in TERMINAL_STATUSES and status not in TERMINAL_STATUSES)):
+                return False
+
+            entry = Munch(bundle_id=bundle_id, status=status, event_type=event_type, updated=time.time())
+            self._statuses[bundle_id] = entry
+            self._changed.notify_all()
+            subscribers = list(self._subscribers)
+
+        for callback, bundle_ids in subscribers:
+            if bundle_ids is None or bundle_id in bundle_ids:
+                # One broken subscriber mustn't skip the others, or fail the webhook request feeding us
+                try:
+                    callback(entry)
+                except Exception:
+                    logger.exception("Bundle status subscriber %r failed on %s", callback, bundle_id)
+        return True
+
+    def status(self, bundle_id: str) -> Optional[str]:
+        entry = self._statuses.get(bundle_id)
+        return entry.status if entry else None
+
+    def wait_for(self, bundle_id: str, statuses: Iterable[str] = TERMINAL_STATUSES,
+                 timeout: float = None) -> Optional[str]:
+        """Block until the Bundle has one of `statuses`. Returns that status, or None on timeout.
+        """
+        statuses = set(statuses)
+        with self._changed:
+            if self._changed.wait_for(lambda: self.status(bundle_id) in statuses, timeout):
+                return self.status(bundle_id)
+        return None
+
+    def wait_all(self, bundle_ids: Iterable[str], statuses: Iterable[str] = TERMINAL_STATUSES,
+                 timeout: float = None) -> Dict[str, Optional[str]]:
+        """Block until every Bundle has one of `statuses`, or the timeout passes.
+
+        Returns:
+            bundle id -> status, None for Bundles that didn't get there in time
+        """
+        bundle_ids, statuses = list(bundle_ids), set(statuses)
+        with self._changed:
+            self._changed.wait_for(lambda: all(self.status(b) in statuses for b in bundle_ids), timeout)
+            return {b: self.status(b) if self.status(b) in statuses else None for b in bundle_ids}
+
+    def subscribe(self, callback: Callable[[Munch], None], bundle_ids: Iterable[str] = None) -> Callable[[], None]:
+        """Call callback(entry) on every status change, optionally only for some Bundles.
+
+        Callbacks run on the thread that recorded the change, e.g. a webhook request thread, so
+        keep them short. Returns a function that unsubscribes.
+        """
+        subscription = (callback, set(bundle_ids) if bundle_ids is not None else None)
+        with self._changed:
+            self._subscribers.append(subscription)
+
+        def unsubscribe():
+            with self._changed:
+                if subscription in self._subscribers:
+                    self._subscribers.remove(subscription)
+        return unsubscribe
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    server: "WebhookReceiver"
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.split("?")[0] != self.server.path:
+            return self._reply(404)
+
+        secret = self.server.secret
+        if secret and not hmac.compare_digest(sign(secret, body),
+                                              self.headers.get(self.server.signature_header, "")):
+            return self._reply(401)
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self._reply(400)
+        if not isinstance(payload, dict):
+            return self._reply(400)
+
+        # Acknowledge anything well-formed, even events about other objects, so they aren't redelivered
+        self.server.ingest(payload)
+        self._reply(200)
+
+    def _reply(self, status: int):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class WebhookReceiver(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, store: BundleStatusStore = None, host: str = "127.0.0.1", port: int = 0,
+                 path: str = DEFAULT_WEBHOOK_PATH, secret: str = None,
+                 signature_header: str = DEFAULT_SIGNATURE_HEADER, verbose: bool = False):
+        """ Small embeddable HTTP listener for BlueInk webhook events, feeding a BundleStatusStore.
+
+        Point the account's webhook at `url` (through a tunnel or reverse proxy when running
+        locally). Redelivered events, recognised by their id, are ignored.
+
+        :param secret: if set, requests must carry the HMAC-SHA256 of their body in signature_header
+        """
+        super().__init__((host, port), _WebhookHandler)
+        self.store = store or BundleStatusStore()
+        self.path = path
+        self.secret = secret
+        self.signature_header = signature_header
+        self.verbose = verbose
+
+        self.received = 0
+        self.duplicates = 0
+        self._seen = OrderedDict()
+        self._seen_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def ingest(self, payload: dict) -> bool:
+        """Apply one event to the store. Returns True if it changed a Bundle's status.
+        """
+        event = parse_event(payload)
+        with self._seen_lock:
+            self.received += 1
+            if event is None:
+                return False
+            if event.event_id is not None:
+                if event.event_id in self._seen:
+                    self.duplicates += 1
+                    return False
+                self._seen[event.event_id] = True
+                if len(self._seen) > SEEN_EVENTS:
+                    self._seen.popitem(last=False)
+        return self.store.update(event.bundle_id, event.status, event.event_type)
+
+    def start(self) -> "WebhookReceiver":
+        self._thread = threading.Thread(target=self.serve_forever, name="blueink-webhooks", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def make_event(bundle_id: str, event_type: str, **bundle_data) -> dict:
+    """A Bundle event payload, as parse_event() reads it.
+    """
+    return {"id": uuid.uuid4().hex,
+            "event_type": event_type,
+            "bundle": {"id": bundle_id, "status": EVENT_STATUS.get(event_type), **bundle_data}}
+
+
+def send_event(url: str, payload: dict, secret: str = None, signature_header: str = DEFAULT_SIGNATURE_HEADER,
+               session: requests.Session = None) -> int:
+    """Test sender: POST one event to a webhook receiver. Returns the HTTP status.
+    """
+    body = json.dumps(payload).encode()
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers[signature_header] = sign(secret, body)
+    return (session or requests).post(url, data=body, headers=headers).status_code
+
+
+def replay_events(url: str, events: Iterable[dict], secret: str = None, delay: float = 0.0) -> Munch:
+    """Test sender: POST a sequence of events, e.g. read from a JSONL file, in order.
+
+    Returns:
+        Munch with sent count and a status code -> count histogram
+    """
+    statuses = {}
+    sent = 0
+    with requests.Session() as session:
+        for payload in events:
+            status = send_event(url, payload, secret=secret, session=session)
+            statuses[status] = statuses.get(status, 0) + 1
+            sent += 1
+            if delay:
+                time.sleep(delay)
+    return Munch(sent=sent, statuses=statuses)
+
+
+def _read_events(path: str):
+    with open(path) as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Receive BlueInk webhook events, or send test events")
+    parser.add_argument("--secret", help="Shared secret for HMAC-SHA256 request signatures")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    listen_parser = subparsers.add_parser("listen", help="Run a receiver, printing every Bundle status change")
+    listen_parser.add_argument("--host", default="127.0.0.1")
+    listen_parser.add_argument("--port", type=int, default=8765)
+
+    send_parser = subparsers.add_parser("send", help="Send test events to a receiver")
+    send_parser.add_argument("url")
+    send_parser.add_argument("--events", help="JSONL file of event payloads to replay in order")
+    send_parser.add_argument("--bundle-id", help="Send one event for this Bundle")
+    send_parser.add_argument("--event-type", default="bundle_complete", choices=sorted(EVENT_STATUS))
+    send_parser.add_argument("--delay", type=float, default=0.0, help="Seconds between events")
+    args = parser.parse_args()
+
+    if args.command == "listen":
+        receiver = WebhookReceiver(host=args.host, port=args.port, secret=args.secret, verbose=True)
+        receiver.store.subscribe(lambda e: print(f"Bundle {e.bundle_id}: {e.status} ({e.event_type})"))
+        print(f"Listening for BlueInk webhooks at {receiver.url}")
+        try:
+            receiver.serve_forever()
+        except KeyboardInterrupt:
+            receiver.server_close()
+    else:
+        if args.events:
+            events = _read_events(args.events)
+        elif args.bundle_id:
+            events = [make_event(args.bundle_id, args.event_type)]
+        else:
+            parser.error("send needs --events or --bundle-id")
+        result = replay_events(args.url, events, secret=args.secret, delay=args.delay)
+        print(f"Sent {result.sent} events, responses: {result.statuses}")
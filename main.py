@@ -1,9 +1,15 @@
+from os import environ
+
 from munch import Munch
 
 from examples.example_utils import input_choices
 from examples.person_example import ClientPersonExample
 from blueink import Client
 from examples.bundle_example import ClientBundleExample
+from examples.instrumentation import instrument_client
+from examples.retry import use_retries, RetryPolicy
+from examples.transport import use_pooled_transport
+from examples.webhooks import WebhookReceiver
 
 MAIN_CHOICES = Munch(
     bdl="Bundle Example",
@@ -11,13 +17,26 @@ MAIN_CHOICES = Munch(
 )
 
 client = Client()
+use_pooled_transport(client)
+# Prints per-endpoint call counts / latency when the example exits
+metrics = instrument_client(client) if environ.get("BLUEINK_EXAMPLES_METRICS") else None
+use_retries(client, RetryPolicy(metrics=metrics))
+
 main_choice = input_choices("BlueInk Python Client Examples",
                             "Your Selection",
                             MAIN_CHOICES,
                             1)
 
 if main_choice == MAIN_CHOICES.bdl:
-    example = ClientBundleExample(client)
+    bundle_status = None
+    if environ.get("BLUEINK_WEBHOOK_PORT"):
+        # Follow sent Bundles through webhook events
+        receiver = WebhookReceiver(port=int(environ["BLUEINK_WEBHOOK_PORT"]),
+                                   host=environ.get("BLUEINK_WEBHOOK_HOST", "127.0.0.1"),
+                                   secret=environ.get("BLUEINK_WEBHOOK_SECRET")).start()
+        print(f"Receiving BlueInk webhooks at {receiver.url}")
+        bundle_status = receiver.store
+    example = ClientBundleExample(client, bundle_status)
 elif main_choice == MAIN_CHOICES.prs:
     example = ClientPersonExample(client)
 
@@ -0,0 +1,72 @@
+import pytest
+
+from examples.bundle_index import BundleIndex
+from examples.mock_server import MockBlueInkServer
+from blueink import Client
+from blueink.constants import BUNDLE_STATUS
+
+
+def _bundle(bundle_id, label, status, created):
+    return {"id": bundle_id, "label": label, "status": status, "created": created}
+
+
+@pytest.fixture
+def index():
+    index = BundleIndex(Client(private_api_key="test-key", base_url="http://127.0.0.1:9"), persist=False)
+    index.upsert(_bundle("a", "Q3 NDA", BUNDLE_STATUS.SENT, "2024-07-01T10:00:00Z"))
+    index.upsert(_bundle("b", "q3 Offer", BUNDLE_STATUS.STARTED, "2024-07-15T10:00:00Z"))
+    index.upsert(_bundle("c", "Q4 NDA", BUNDLE_STATUS.SENT, "2024-10-01T10:00:00Z"))
+    index.upsert(_bundle("d", "Q3 Lease", BUNDLE_STATUS.COMPLETE, "2024-08-01T10:00:00Z"))
+    return index
+
+
+def _ids(bundles):
+    return [bundle.id for bundle in bundles]
+
+
+def test_compound_query_is_newest_first(index):
+    assert _ids(index.query(statuses=[BUNDLE_STATUS.SENT, BUNDLE_STATUS.STARTED], label_prefix="q3")) == ["b", "a"]
+    assert _ids(index.query(label_prefix="Q3", created_after="2024-07-10", created_before="2024-08-01")) == ["b"]
+    assert _ids(index.query(created_after="2024-07-15T10:00:00+00:00")) == ["c", "d", "b"]
+    assert _ids(index.query(limit=2)) == ["c", "d"]
+    assert index.count(statuses=[BUNDLE_STATUS.CANCELLED]) == 0
+
+
+def test_updates_move_bundles_between_indexes(index):
+    index.upsert(_bundle("a", "Renewal", BUNDLE_STATUS.SENT, "2024-07-01T10:00:00Z"))
+    index.set_status("c", BUNDLE_STATUS.COMPLETE)
+    index.remove("d")
+
+    assert _ids(index.query(label_prefix="q3")) == ["b"]
+    assert _ids(index.query(label_prefix="ren")) == ["a"]
+    assert _ids(index.query(statuses=[BUNDLE_STATUS.COMPLETE])) == ["c"]
+    assert index.status_counts() == {BUNDLE_STATUS.SENT: 1, BUNDLE_STATUS.STARTED: 1, BUNDLE_STATUS.COMPLETE: 1}
+
+
+def test_refresh_follows_the_server():
+    with MockBlueInkServer() as server:
+        server.state.seed(bundles=25)
+        index = BundleIndex(Client(private_api_key="test-key", base_url=server.url), persist=False)
+        stats = index.refresh(per_page=10)
+        assert stats.full and stats.added == 25 and len(index) == 25
+
+        bundles = server.state.bundles
+        open_id = next(i for i, b in bundles.items() if b["status"] == BUNDLE_STATUS.SENT)
+        bundles[open_id] = {**bundles[open_id], "status": BUNDLE_STATUS.COMPLETE}
+        stats = index.refresh(per_page=10)
+        assert not stats.full and stats.updated == 1
+        assert index.get(open_id).status == BUNDLE_STATUS.COMPLETE
+
+        del bundles[open_id]
+        assert index.refresh(full=True, per_page=10).removed == 1
+        assert index.get(open_id) is None
+
+
+def test_unreadable_cache_is_discarded(tmp_path):
+    client = Client(private_api_key="test-key", base_url="http://127.0.0.1:9")
+    index = BundleIndex(client, cache_dir=str(tmp_path))
+    with open(index.path, "w") as fh:
+        fh.write('{"bundles": [{"id": "a", "status": "se"}]}')
+
+    index = BundleIndex(client, cache_dir=str(tmp_path))
+    assert len(index) == 0 and index.refreshed_at is None
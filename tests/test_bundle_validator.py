@@ -0,0 +1,71 @@
+import pytest
+
+from examples.bundle_validator import ERROR, WARNING, BundleValidationError, check_bundle, validate_bundle
+from blueink import BundleHelper
+from blueink.constants import DELIVER_VIA
+
+
+def _valid_helper():
+    helper = BundleHelper(label="Valid", is_test=True)
+    helper.add_cc("cc@example.com")
+    doc_key = helper.add_document_by_url("https://example.com/a.pdf")
+    helper.add_signer(key="signer-1", name="Homer Simpson", email="homer@example.com")
+    helper.add_field(doc_key, 10, 10, 20, 5, 1, "sig", editors=["signer-1"], key="sig-1")
+    return helper, doc_key
+
+
+def _codes(problems, severity=ERROR):
+    return sorted(p.code for p in problems if p.severity == severity)
+
+
+def test_valid_bundle_has_no_problems():
+    helper, _ = _valid_helper()
+    assert validate_bundle(helper) == []
+    assert check_bundle(helper) == []
+
+
+def test_empty_bundle():
+    assert _codes(validate_bundle(BundleHelper(label="Empty"))) == ["no_documents", "no_signers"]
+
+
+def test_field_rules():
+    helper, doc_key = _valid_helper()
+    helper.add_field(doc_key, 10, 50, 0, 5, 1, "inp", editors=["signer-1"], key="empty")
+    helper.add_field(doc_key, 90, 50, 20, 5, 1, "inp", editors=["signer-1"], key="off-page")
+    helper.add_field(doc_key, 10, 70, 10, 5, 0, "inp", editors=["signer-1"], key="page-0")
+    helper.add_field(doc_key, 10, 80, 10, 5, 1, "inp", editors=["signer-2"], key="sig-1")
+    helper.add_field(doc_key, 40, 80, 10, 5, 1, "inp", editors=[], key="no-editors")
+
+    problems = validate_bundle(helper)
+    assert _codes(problems) == ["field_bad_page", "field_duplicate_key", "field_off_page",
+                                "field_unknown_editor", "field_zero_size"]
+    assert _codes(problems, WARNING) == ["field_no_editors"]
+    with pytest.raises(BundleValidationError) as e:
+        check_bundle(helper)
+    assert e.value.problems == problems
+
+
+def test_signer_and_document_rules():
+    helper = BundleHelper(label="Signers", is_test=True)
+    helper.add_cc("not-an-email")
+    helper.add_document_by_url("https://example.com/a.pdf")
+    helper.add_signer(key="by-email", name="No Email", deliver_via=DELIVER_VIA.EMAIL, phone="505-555-0100")
+    helper.add_signer(key="by-phone", name="No Phone", deliver_via=DELIVER_VIA.SMS, email="a@example.com")
+
+    problems = validate_bundle(helper)
+    assert _codes(problems) == ["cc_email_invalid", "signer_no_email", "signer_no_phone"]
+    # Neither signer has a field to fill in
+    assert _codes(problems, WARNING) == ["signer_no_fields", "signer_no_fields"]
+
+
+def test_template_roles_must_be_assigned_to_signers():
+    helper = BundleHelper(label="Template", is_test=True)
+    doc_key = helper.add_document_template("template-1", field_values=[])
+    helper.add_signer(key="signer-1", name="Homer Simpson", email="homer@example.com")
+    helper.add_signer(key="signer-2", name="Marge Simpson", email="marge@example.com")
+    helper.assign_role(doc_key, "signer-1", "role-1")
+    helper.assign_role(doc_key, "signer-2", "role-2")
+    # BundleHelper checks assignments as they are made, but not when a signer is dropped later
+    del helper._packets["signer-2"]
+
+    assert _codes(validate_bundle(helper)) == ["template_unknown_signer"]
@@ -0,0 +1,77 @@
+import pytest
+
+from examples.field_layout import FieldLayout, LayoutError
+from blueink import BundleHelper
+
+
+def _helper():
+    helper = BundleHelper(label="Layout", is_test=True)
+    doc_key = helper.add_document_by_url("https://example.com/a.pdf")
+    helper.add_signer(key="signer-1", name="Homer Simpson", email="homer@example.com")
+    return helper, doc_key
+
+
+def test_check_reports_overlaps_out_of_bounds_and_invalid_rows():
+    report = FieldLayout().check("doc", {"x": [10, 20, 50, 90, 5], "y": [10, 12, 50, 90, 5],
+                                         "w": [20, 20, 10, 20, 0], "h": 5, "kind": "inp"})
+    assert report.overlaps == [(1, 0)]
+    assert report.out_of_bounds == [3]
+    assert report.invalid == [(4, "width and height must be positive")]
+
+
+def test_touching_edges_and_other_pages_do_not_overlap():
+    report = FieldLayout().check("doc", {"x": [10, 30, 10], "y": 10, "w": 20, "h": 5, "page": [1, 1, 2],
+                                         "kind": "inp"})
+    assert report.overlaps == []
+
+
+def test_later_batches_are_checked_against_placed_fields():
+    helper, doc_key = _helper()
+    layout = FieldLayout()
+    placed = layout.add_fields(helper, doc_key, {"x": [10], "y": [10], "w": 30, "h": 4, "kind": "sig",
+                                                 "editors": "signer-1"})
+
+    with pytest.raises(LayoutError) as e:
+        layout.add_fields(helper, doc_key, {"x": [20, 60], "y": [12, 60], "w": 10, "h": 4, "kind": "inp"})
+    assert e.value.report.overlaps == [(0, placed.field_keys[0])]
+    assert len(helper._documents[doc_key].fields) == 1
+
+    # A different document has its own index
+    assert layout.check("other-doc", {"x": [20], "y": [12], "w": 10, "h": 4, "kind": "inp"}).overlaps == []
+
+
+def test_non_strict_adds_everything_and_reports():
+    helper, doc_key = _helper()
+    report = FieldLayout().add_fields(helper, doc_key, {"x": [10, 15], "y": 10, "w": 10, "h": 4, "kind": "inp",
+                                                        "editors": "signer-1"}, strict=False)
+    assert report.overlaps == [(1, 0)]
+    assert len(report.field_keys) == 2
+    assert [f.editors for f in helper._documents[doc_key].fields] == [["signer-1"], ["signer-1"]]
+
+
+def test_huge_and_non_finite_sizes_dont_hang():
+    report = FieldLayout().check("doc", {"x": [10, -1e12, 0], "y": [10, 0, 0], "w": [1e12, 1e13, float("inf")],
+                                         "h": [1e12, 5, 1], "kind": "inp"})
+    assert report.out_of_bounds == [0, 1]
+    assert report.overlaps == []
+    assert report.invalid == [(2, "position and size must be finite numbers")]
+
+
+def test_scalar_columns_and_editors():
+    helper, doc_key = _helper()
+    helper.add_signer(key="signer-2", name="Marge Simpson", email="marge@example.com")
+    layout = FieldLayout()
+
+    report = layout.add_fields(helper, doc_key, {"x": 10, "y": 10, "w": 20, "h": 4, "kind": "sig",
+                                                 "editors": "signer-1"})
+    assert len(report.field_keys) == 1
+    layout.add_fields(helper, doc_key, {"x": [10, 40], "y": 50, "w": 20, "h": 4, "kind": "inp",
+                                        "editors": [["signer-1"], ["signer-1", "signer-2"]]})
+    assert [f.editors for f in helper._documents[doc_key].fields] == [["signer-1"], ["signer-1"],
+                                                                      ["signer-1", "signer-2"]]
+
+    with pytest.raises(ValueError, match="ambiguous"):
+        layout.check(doc_key, {"x": [10, 40], "y": 80, "w": 5, "h": 4, "kind": "inp",
+                               "editors": ["signer-1", "signer-2"]})
+    with pytest.raises(ValueError, match="expected 2"):
+        layout.check(doc_key, {"x": [10, 40], "y": [80], "w": 5, "h": 4, "kind": "inp"})
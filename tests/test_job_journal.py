@@ -0,0 +1,59 @@
+from examples.job_journal import DONE, FAILED, STARTED, JobJournal
+
+
+def test_resume_skips_done_keys_and_retries_failed_and_in_doubt(tmp_path):
+    path = str(tmp_path / "job.journal")
+    with JobJournal(path) as journal:
+        for key in ("a", "b", "c"):
+            journal.start(key)
+        journal.finish("a", True, bundle_id="bundle-a")
+        journal.finish("b", False, error="HTTP 500")
+        # c was in flight when the job died
+
+    with JobJournal(path) as journal:
+        assert journal.counts() == {DONE: 1, FAILED: 1, STARTED: 1}
+        assert journal.entry("a").bundle_id == "bundle-a"
+        assert journal.entry("b").attempts == 1
+        assert [key for key, _ in journal.todo(["a", "b", "c", "d"], key=str)] == ["b", "c", "d"]
+        assert journal.skipped == 1
+
+
+def test_repeated_keys_are_journaled_separately(tmp_path):
+    with JobJournal(str(tmp_path / "job.journal")) as journal:
+        assert [key for key, _ in journal.todo(["x", "x", "y", "x"], key=str)] == ["x", "x#1", "y", "x#2"]
+        journal.finish("x#1", True)
+        assert [key for key, _ in journal.todo(["x", "x", "y", "x"], key=str)] == ["x", "y", "x#2"]
+
+
+def test_torn_last_line_is_dropped_on_replay(tmp_path):
+    path = tmp_path / "job.journal"
+    with JobJournal(str(path)) as journal:
+        journal.finish("a", True)
+    with open(path, "ab") as fh:
+        fh.write(b'{"key": "b", "sta')
+
+    with JobJournal(str(path)) as journal:
+        assert journal.done("a")
+        assert journal.state("b") is None
+        journal.finish("b", True)
+
+    with JobJournal(str(path)) as journal:
+        assert journal.done("a") and journal.done("b")
+
+
+def test_compact_keeps_one_line_per_key_with_its_latest_state(tmp_path):
+    path = tmp_path / "job.journal"
+    with JobJournal(str(path)) as journal:
+        for attempt in range(3):
+            journal.start("a")
+            journal.finish("a", attempt == 2)
+        journal.start("b")
+        journal.compact()
+        journal.finish("b", False, error="timeout")
+
+    assert len(path.read_text().splitlines()) == 3
+    with JobJournal(str(path)) as journal:
+        assert journal.done("a")
+        assert journal.entry("a").attempts == 3
+        assert journal.state("b") == FAILED
+        assert journal.entry("b").error == "timeout"
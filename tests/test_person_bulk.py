@@ -0,0 +1,39 @@
+from examples.person_bulk import merged_state, person_diff
+
+HOMER = {"id": "p1", "name": "Homer Simpson", "metadata": {"plant": "sector 7G"},
+         "channels": [{"email": "homer@example.com", "kind": "em"},
+                      {"phone": "505-555-0100", "kind": "mp"}]}
+
+
+def test_diff_ignores_normalization_and_order():
+    desired = {"name": "Homer Simpson", "emails": [" HOMER@example.com"], "phones": ["(505) 555 0100"],
+               "metadata": {"plant": "sector 7G"}}
+    assert person_diff(HOMER, desired) == {}
+
+
+def test_diff_sends_only_changed_fields():
+    assert person_diff(HOMER, {"name": "Homer J. Simpson"}) == {"name": "Homer J. Simpson"}
+    assert person_diff(HOMER, {"metadata": {"town": "Springfield"}}) == {
+        "metadata": {"plant": "sector 7G", "town": "Springfield"}}
+
+
+def test_diff_sends_full_channel_list_when_contacts_change():
+    changes = person_diff(HOMER, {"emails": ["homer@example.com", "hjs@example.com"]})
+    assert changes == {"channels": [{"email": "homer@example.com", "kind": "em"},
+                                    {"email": "hjs@example.com", "kind": "em"},
+                                    {"phone": "505-555-0100", "kind": "mp"}]}
+
+
+def test_merged_state_adds_without_losing_anything():
+    incoming = {"name": "H. Simpson", "emails": ["Homer@Example.com", "hjs@example.com"],
+                "phones": ["+1 505 555 0100"], "metadata": {"plant": "sector 8", "town": "Springfield"}}
+    merged = merged_state(HOMER, incoming)
+
+    assert merged == {"emails": ["homer@example.com", "hjs@example.com"],
+                      "phones": ["505-555-0100"],
+                      "metadata": {"plant": "sector 7G", "town": "Springfield"}}
+    assert person_diff(HOMER, merged_state(HOMER, {"emails": ["homer@example.com"]})) == {}
+
+
+def test_merged_state_fills_in_a_missing_name():
+    assert merged_state({"id": "p2", "channels": []}, {"name": "Marge"})["name"] == "Marge"
@@ -0,0 +1,57 @@
+import pytest
+from requests import HTTPError
+
+from examples.mock_server import MockBlueInkServer
+from examples.person_mirror import PersonMirror, normalize_phone
+from blueink import Client
+
+
+@pytest.fixture
+def server():
+    with MockBlueInkServer() as server:
+        server.state.seed(persons=30)
+        yield server
+
+
+@pytest.fixture
+def mirror(server):
+    mirror = PersonMirror(Client(private_api_key="test-key", base_url=server.url), db_path=":memory:")
+    yield mirror
+    mirror.close()
+
+
+def test_sync_only_writes_what_changed(server, mirror):
+    assert mirror.sync(per_page=7).added == 30
+    assert mirror.sync(per_page=7) == {"added": 0, "updated": 0, "removed": 0, "unchanged": 30}
+
+    persons = server.state.persons
+    renamed, deleted = list(persons)[:2]
+    persons[renamed] = {**persons[renamed], "name": "Renamed Person"}
+    del persons[deleted]
+    persons["new-person"] = {"id": "new-person", "name": "New Person", "metadata": {},
+                             "channels": [{"phone": "+1 (505) 555-0100", "kind": "mp"}]}
+
+    assert mirror.sync(per_page=7) == {"added": 1, "updated": 1, "removed": 1, "unchanged": 28}
+    assert mirror.count() == 30
+    assert mirror.get(renamed).name == "Renamed Person"
+    assert mirror.get(deleted) is None
+
+
+def test_failed_page_aborts_sync_without_removing_persons(server, mirror):
+    mirror.sync(per_page=7)
+    server.error_rate = 1.0
+    with pytest.raises(HTTPError):
+        mirror.sync(per_page=7)
+    assert mirror.count() == 30
+
+
+def test_lookups_match_normalized_contacts(server, mirror):
+    server.state.persons["p"] = {"id": "p", "name": "Homer Simpson", "metadata": {},
+                                 "channels": [{"email": "Homer@Example.com", "kind": "em"},
+                                              {"phone": "1-505-555-0199", "kind": "mp"}]}
+    mirror.sync()
+
+    assert [p.id for p in mirror.find_by_email(" homer@example.COM ")] == ["p"]
+    assert [p.id for p in mirror.find_by_phone("(505) 555 0199")] == ["p"]
+    assert [p.id for p in mirror.search_name("simpson")] == ["p"]
+    assert normalize_phone("+1 505 555 0199") == "5055550199"
@@ -0,0 +1,45 @@
+import io
+
+import requests
+from requests import HTTPError
+
+from examples.retry import RetryPolicy, RetryingRequestHelper, _rewind
+from blueink.request_helper import RequestHelper
+
+
+class _ThrottledOnceHelper(RequestHelper):
+    """Reads every uploaded file to the end, like requests does, and answers the first call with HTTP 429.
+    """
+    def __init__(self):
+        super().__init__("test-key")
+        self.positions = []
+
+    def _make_request(self, method, url, data=None, json=None, files=None, params=None, headers=None,
+                      content_type=None):
+        self.positions.append([value[1].tell() for _, value in files])
+        for _, value in files:
+            value[1].read()
+        if len(self.positions) == 1:
+            response = requests.Response()
+            response.status_code = 429
+            raise HTTPError(response=response)
+        return "created"
+
+
+def test_rewind_seeks_files_given_as_name_and_tuple():
+    fh = io.BytesIO(b"%PDF")
+    fh.read(3)
+    assert _rewind(None, [("files[0]", ("a.pdf", fh, "application/pdf"))])
+    assert fh.tell() == 0
+
+
+def test_retried_multipart_upload_resends_file_from_the_start():
+    fh = io.BytesIO(b"%PDF-1.4 document")
+    inner = _ThrottledOnceHelper()
+    helper = RetryingRequestHelper(inner, RetryPolicy(base_delay=0.0))
+
+    result = helper.post("https://example.com/api/v2/bundles/", data={"bundle_request": "{}"},
+                         files=[("files[0]", ("a.pdf", fh, "application/pdf"))])
+
+    assert result == "created"
+    assert inner.positions == [[0], [0]]
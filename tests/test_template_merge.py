@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from examples.template_merge import CompiledTemplate
+from blueink import BundleHelper
+from blueink.constants import DELIVER_VIA
+
+RECIPIENT = {"signer-1.name": "Homer \"Max\" Power", "signer-1.email": "homer@example.com",
+             "signer-2.name": "Marge Simpson", "signer-2.phone": "505-555-0100",
+             "field.salary": 100, "label": "Offer"}
+
+
+def _compiled(**kwargs):
+    return CompiledTemplate("template-1", {"signer-1": DELIVER_VIA.EMAIL, "signer-2": DELIVER_VIA.SMS},
+                            field_keys=["salary", "start"], defaults={"start": "Monday"}, **kwargs)
+
+
+def test_render_matches_bundle_helper():
+    helper = BundleHelper(label="Offer", is_test=True)
+    doc_key = helper.add_document_template("template-1", field_values=[])
+    helper.add_signer(key="signer-1", name="Homer \"Max\" Power", email="homer@example.com",
+                      deliver_via=DELIVER_VIA.EMAIL)
+    helper.add_signer(key="signer-2", name="Marge Simpson", phone="505-555-0100", deliver_via=DELIVER_VIA.SMS)
+    for role in ("signer-1", "signer-2"):
+        helper.assign_role(doc_key, role, role)
+    helper.set_value(doc_key, "salary", "100")
+    helper.set_value(doc_key, "start", "Monday")
+    expected = helper.as_data()
+
+    rendered = json.loads(_compiled().render(RECIPIENT))
+    # Document keys are random per BundleHelper
+    for bundle in (expected, rendered):
+        for document in bundle["documents"]:
+            document.pop("key")
+    assert rendered == expected
+
+
+def test_label_format_and_fallbacks():
+    assert _compiled(label="Offer for {signer-1.name}").label(RECIPIENT) == "Offer for Homer \"Max\" Power"
+    assert _compiled().label(RECIPIENT) == "Offer"
+    assert _compiled().label({}) == "Template template-1"
+    with pytest.raises(ValueError):
+        _compiled(label="{missing}").label(RECIPIENT)
+
+
+def test_missing_or_blank_values_use_defaults_or_fail():
+    blank_start = dict(RECIPIENT, **{"field.start": ""})
+    assert json.loads(_compiled().render(blank_start))["documents"][0]["field_values"][1]["initial_value"] == "Monday"
+
+    with pytest.raises(ValueError, match="field.salary"):
+        _compiled().render(dict(RECIPIENT, **{"field.salary": ""}))
+    with pytest.raises(ValueError, match="signer-1.email"):
+        _compiled().render(dict(RECIPIENT, **{"signer-1.email": "not-an-email"}))